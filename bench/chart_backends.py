@@ -0,0 +1,62 @@
+"""
+Сравнение бэкендов графиков: время построения и размер PNG.
+
+    python -m bench.chart_backends [--runs 20] [--bars 200] [--save out_dir]
+"""
+import argparse
+import os
+import statistics
+import time
+import numpy as np
+import pandas as pd
+from monitor.charts import CHART_BACKENDS
+from monitor.logger import start_logging
+
+
+def sample_frame(bars=200, seed=7):
+    """Синтетические свечи с памп-движением в конце"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.004, bars)
+    returns[-5:] += 0.01
+    close = 0.29 * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.003, bars)) * close
+    index = pd.date_range('2025-10-24 20:00', periods=bars, freq='5min', name='timestamp')
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.lognormal(12, 0.6, bars)
+    }, index=index)
+
+
+def run(runs, bars, save_dir=None):
+    df = sample_frame(bars)
+    print(f"{'backend':<12}{'first, ms':>12}{'median, ms':>12}{'p95, ms':>10}{'PNG, KB':>10}")
+    for name, renderer in CHART_BACKENDS.items():
+        start = time.perf_counter()
+        buf = renderer(df, 'BENCHUSDT', '5m')
+        first = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            buf = renderer(df, 'BENCHUSDT', '5m')
+            timings.append((time.perf_counter() - start) * 1000)
+        size = len(buf.getvalue()) / 1024 if buf is not None else float('nan')
+        p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+        print(f"{name:<12}{first:>12.1f}{statistics.median(timings):>12.1f}{p95:>10.1f}{size:>10.1f}")
+        if save_dir and buf is not None:
+            os.makedirs(save_dir, exist_ok=True)
+            with open(os.path.join(save_dir, f"{name}.png"), 'wb') as f:
+                f.write(buf.getvalue())
+
+
+if __name__ == '__main__':
+    start_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--bars', type=int, default=200)
+    parser.add_argument('--save', help='каталог для сохранения PNG каждого бэкенда')
+    args = parser.parse_args()
+    run(args.runs, args.bars, args.save)
@@ -0,0 +1,151 @@
+"""
+Проверка очереди доставки Telegram (monitor.delivery) вместе с дедупликацией сигналов.
+
+    python -m bench.delivery
+
+Вместо Telegram — бот-заглушка, который записывает отправленные сообщения и по
+запросу отвечает сетевой ошибкой. Проверяется:
+  - сигнал фиксируется в состоянии дедупликации только после отправки, а не при
+    постановке в очередь;
+  - сигнал, вытесненный из переполненной очереди, откатывается, и та же монета
+    может сработать снова;
+  - неудачная отправка откатывает сигнал;
+  - свободный чат получает сообщение без ожидания, а сообщения, пришедшие, пока чат
+    ждёт лимита, уходят одним альбомом.
+
+Завершается с кодом 1, если хотя бы одна проверка не прошла.
+"""
+import asyncio
+import sys
+import time
+from telegram.error import NetworkError
+from bench.chart_backends import sample_frame
+
+CHAT_ID = 1
+MIN_INTERVAL = 0.5
+COINS = ('AAAUSDT', 'BBBUSDT', 'CCCUSDT', 'DDDUSDT', 'EEEUSDT')
+
+
+class FakeBot:
+    """Записывает сообщения: (метод, время, подписи); монеты из failing отвечают NetworkError"""
+
+    def __init__(self):
+        self.sent = []
+        self.failing = set()
+
+    def _record(self, method, texts):
+        if any(name in text for name in self.failing for text in texts):
+            raise NetworkError("stub: сеть недоступна")
+        self.sent.append((method, time.monotonic(), texts))
+
+    async def send_photo(self, chat_id, photo, caption, **kwargs):
+        self._record('send_photo', [caption])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._record('send_message', [text])
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self._record('send_media_group', [item.caption for item in media])
+
+
+def sent_coins(fake):
+    return [name for _, _, texts in fake.sent for text in texts for name in COINS if f"<code>{name}</code>" in text]
+
+
+async def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def check_delivery():
+    import bot
+    from monitor import delivery, signals
+    from monitor.signal_state import SignalState
+    errors = []
+    fake = FakeBot()
+    signals.bot_instance = fake
+    bot.config = {'telegram_token': 'stub', 'chat_id': CHAT_ID, 'timeframe': '5m', 'chart_backend': 'fast'}
+    bot.signal_state = state = SignalState()
+    queue = delivery.queue = delivery.DeliveryQueue(fake, {'delivery_queue_size': 1, 'delivery_retries': 0,
+                                                           'delivery_min_interval': MIN_INTERVAL})
+    df = sample_frame()
+
+    def info(count):
+        return {'type': 'pump', 'count_triggered': count, 'total_indicators': 10, 'comment': '', 'debug': ''}
+
+    try:
+        # Очередь на одно сообщение, воркер ещё не запущен: AAA ждёт, BBB с большим приоритетом вытесняет его
+        await bot.deliver_signal('AAAUSDT', df, info(3))
+        if 'AAAUSDT' not in state._pending or state.dirty:
+            errors.append("сигнал зафиксирован при постановке в очередь, до отправки")
+        await bot.deliver_signal('BBBUSDT', df, info(5))
+        if 'AAAUSDT' in state or 'AAAUSDT' in state._pending:
+            errors.append("вытесненный из очереди сигнал не откатан")
+
+        queue.start()
+        if not await wait_for(lambda: 'BBBUSDT' not in state._pending):
+            errors.append("отправленный сигнал не зафиксирован")
+        elif 'BBBUSDT' not in state or sent_coins(fake) != ['BBBUSDT']:
+            errors.append(f"после отправки: состояние {'BBBUSDT' in state}, отправлено {sent_coins(fake)}")
+
+        # Та же монета после вытеснения срабатывает снова и отправляется
+        await bot.deliver_signal('AAAUSDT', df, info(3))
+        if not await wait_for(lambda: 'AAAUSDT' in sent_coins(fake)):
+            errors.append("монета после вытеснения не сработала снова")
+        await wait_for(lambda: not state._pending)
+        if 'AAAUSDT' not in state:
+            errors.append("повторный сигнал после отправки не зафиксирован")
+
+        # Неудачная отправка откатывает сигнал
+        fake.failing.add('CCCUSDT')
+        await bot.deliver_signal('CCCUSDT', df, info(4))
+        if not await wait_for(lambda: 'CCCUSDT' not in state._pending):
+            errors.append("неудачная отправка не завершила сигнал")
+        elif 'CCCUSDT' in state:
+            errors.append("неудачная отправка не откатила сигнал")
+        fake.failing.clear()
+        if not state.claim('CCCUSDT', 'pump', 4):
+            errors.append("монета после неудачной отправки не может сработать снова")
+        state.release('CCCUSDT')
+
+        # Свободный чат — без ожидания; пока чат ждёт лимита, сообщения копятся в альбом
+        await asyncio.sleep(MIN_INTERVAL * 2)
+        queue.maxsize = 10
+        sends = len(fake.sent)
+        start = time.monotonic()
+        await bot.deliver_signal('DDDUSDT', df, info(4))
+        if not await wait_for(lambda: len(fake.sent) > sends):
+            errors.append("сообщение в свободный чат не отправлено")
+        elif fake.sent[-1][1] - start > MIN_INTERVAL:
+            errors.append(f"свободный чат ждал {fake.sent[-1][1] - start:.2f} сек перед отправкой")
+        await bot.deliver_signal('EEEUSDT', df, info(4))
+        await bot.deliver_signal('CCCUSDT', df, info(4))
+        if not await wait_for(lambda: len(fake.sent) > sends + 1):
+            errors.append("сообщения при лимите чата не отправлены")
+        else:
+            await asyncio.sleep(MIN_INTERVAL * 2)
+            method, _, texts = fake.sent[-1]
+            if len(fake.sent) != sends + 2 or method != 'send_media_group' or len(texts) != 2:
+                errors.append(f"сообщения при лимите чата не объединены: {[m for m, _, _ in fake.sent[sends:]]}")
+    finally:
+        await delivery.stop_delivery()
+    return errors
+
+
+def main():
+    from monitor.logger import start_logging
+    start_logging()
+    errors = asyncio.run(check_delivery())
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    if errors:
+        sys.exit(1)
+    print("Очередь доставки прошла проверку")
+
+
+if __name__ == '__main__':
+    main()
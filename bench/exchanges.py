@@ -0,0 +1,221 @@
+"""
+Проверка адаптеров бирж на записанных ответах, которые отдаёт локальный сервер.
+
+    python -m bench.exchanges record [--symbol BTCUSDT] [--timeframe 5m]
+    python -m bench.exchanges check [--timeframe 5m]
+
+record сохраняет в bench/fixtures/exchanges/{биржа}/ ответы tickers и klines каждой
+биржи как есть. check поднимает aiohttp-сервер, который отдаёт эти ответы по путям
+REST-адаптера, направляет на него rest_url и прогоняет их через фетчер бота
+(fetch_exchange_tickers, fetch_ohlcv). Свечи сверяются с разбором того же ответа
+стандартным json, символы — с обратным преобразованием resolve. Если записи нет,
+используются синтетические ответы в формате биржи. Сообщения WebSocket проверяются
+через parse_stream на синтетических примерах.
+
+Завершается с кодом 1, если хотя бы одна проверка не прошла.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import numpy as np
+from aiohttp import web
+from bench.pipeline import synthetic_series
+
+FIXTURES_DIR = os.path.join('bench', 'fixtures', 'exchanges')
+
+
+# === Фикстуры ===
+
+def synthetic_responses(exchange, symbol, timeframe, bars=300):
+    """(тело tickers, тело klines) в формате биржи для symbol (вид Bybit: BTCUSDT)"""
+    rows = synthetic_series(1, bars=bars)[0]
+    native = exchange.native(symbol)
+    last = rows[-1][4]
+    if exchange.name == 'binance':
+        tickers = [{"symbol": native, "lastPrice": last, "priceChangePercent": "3.5", "quoteVolume": "90000000"},
+                   {"symbol": f"{native}_250627", "lastPrice": last, "priceChangePercent": "1", "quoteVolume": "1"}]
+        klines = [[int(r[0]), *r[1:6], int(r[0]) + 59_999, r[6], 100, "0", "0", "0"] for r in rows]
+    elif exchange.name == 'okx':
+        tickers = {"code": "0", "msg": "", "data": [
+            {"instId": native, "last": last, "open24h": rows[0][1], "volCcy24h": "250000"},
+            {"instId": native.replace('-USDT-', '-USD-'), "last": last, "open24h": last, "volCcy24h": "1"}]}
+        klines = {"code": "0", "msg": "", "data": [[r[0], *r[1:5], "1", r[5], r[6], "1"] for r in reversed(rows)]}
+    else:
+        tickers = {"retCode": 0, "retMsg": "OK", "result": {"category": "linear", "list": [
+            {"symbol": native, "lastPrice": last, "prevPrice1h": rows[-12][4], "price24hPcnt": "0.035",
+             "turnover24h": "90000000", "openInterest": "1000"}]}}
+        klines = {"retCode": 0, "retMsg": "OK", "result": {"category": "linear", "symbol": native,
+                                                           "list": rows[::-1]}}
+    # Компактный JSON, как в ответах бирж: так проверяется быстрый разбор, а не запасной
+    return json.dumps(tickers, separators=(',', ':')).encode(), json.dumps(klines, separators=(',', ':')).encode()
+
+
+def load_responses(directory, exchange, symbol, timeframe):
+    """Записанные ответы биржи или синтетические, если записи нет"""
+    paths = [os.path.join(directory, exchange.name, f"{kind}.json") for kind in ('tickers', 'klines')]
+    if all(os.path.exists(path) for path in paths):
+        bodies = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                bodies.append(f.read())
+        return tuple(bodies), 'запись'
+    return synthetic_responses(exchange, symbol, timeframe), 'синтетика'
+
+
+def reference_klines(exchange, body):
+    """(ts, ohlcv) из ответа со свечами через стандартный json — эталон для быстрого разбора"""
+    payload = json.loads(body)
+    if exchange.name == 'binance':
+        rows, columns = payload, (1, 2, 3, 4, 5)
+    elif exchange.name == 'okx':
+        rows, columns = payload['data'], (1, 2, 3, 4, 6)
+    else:
+        rows, columns = payload['result']['list'], (1, 2, 3, 4, 5)
+    rows = sorted(rows, key=lambda r: int(r[0]))
+    return (np.array([int(r[0]) for r in rows], dtype=np.int64),
+            np.array([[float(r[i]) for i in columns] for r in rows], dtype=np.float64))
+
+
+def stream_message(exchange, symbol, timeframe):
+    """(сообщение WebSocket с одной закрытой свечой, свеча) в формате биржи"""
+    native = exchange.native(symbol)
+    start, values = 1_700_000_000_000, [1.5, 1.75, 1.25, 1.625, 1234.5]
+    text = [str(v) for v in values]
+    interval = exchange.intervals[timeframe]
+    if exchange.name == 'binance':
+        msg = {"e": "kline", "s": native, "k": {"t": start, "i": interval, "o": text[0], "h": text[1],
+                                                "l": text[2], "c": text[3], "v": text[4], "x": True}}
+    elif exchange.name == 'okx':
+        msg = {"arg": {"channel": f"candle{interval}", "instId": native},
+               "data": [[str(start), *text[:4], "9", text[4], "0", "1"]]}
+    else:
+        msg = {"topic": f"kline.{interval}.{native}", "type": "snapshot",
+               "data": [{"start": start, "open": text[0], "high": text[1], "low": text[2], "close": text[3],
+                         "volume": text[4], "confirm": True}]}
+    return json.dumps(msg), (start, values, True)
+
+
+async def record_responses(directory, symbol, timeframe):
+    """Записывает ответы tickers и klines каждой биржи для symbol"""
+    from monitor.exchanges import EXCHANGES
+    from monitor.fetcher import FetcherClient
+    for exchange in EXCHANGES.values():
+        http = FetcherClient({}, exchange)
+        try:
+            bodies = {}
+            path, params = exchange.tickers_request()
+            bodies['tickers'] = await http.get(path, params=params, parse=bytes)
+            path, params = exchange.kline_request(exchange.native(symbol), timeframe, 200)
+            bodies['klines'] = await http.get(path, params=params, parse=bytes)
+        finally:
+            await http.close()
+        failed = {kind: status for kind, (status, _) in bodies.items() if status != 200}
+        if failed:
+            print(f"{exchange.title}: ошибка записи {failed}")
+            continue
+        os.makedirs(os.path.join(directory, exchange.name), exist_ok=True)
+        for kind, (_, body) in bodies.items():
+            with open(os.path.join(directory, exchange.name, f"{kind}.json"), 'wb') as f:
+                f.write(body)
+        print(f"{exchange.title}: записаны tickers и klines {symbol} в {directory}")
+
+
+# === Проверка ===
+
+class StubExchanges:
+    """Локальный сервер: /{биржа}/{путь tickers} — ответ тикеров, любой другой путь — ответ свечей"""
+
+    def __init__(self, responses):
+        self.responses = responses  # {биржа: (путь tickers, тело tickers, тело klines)}
+        self.runner = None
+
+    async def _handle(self, request):
+        tickers_path, tickers, klines = self.responses[request.match_info['exchange']]
+        body = tickers if request.match_info['path'] == tickers_path else klines
+        return web.Response(body=body, content_type='application/json')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{exchange}/{path:.+}', self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def check_exchanges(directory, symbol, timeframe):
+    """Прогоняет адаптеры через фетчер на локальном сервере; возвращает список ошибок"""
+    from monitor import fetcher
+    from monitor.exchanges import EXCHANGES, resolve
+    responses, sources, errors = {}, {}, []
+    for exchange in EXCHANGES.values():
+        (tickers, klines), sources[exchange.name] = load_responses(directory, exchange, symbol, timeframe)
+        responses[exchange.name] = (exchange.tickers_request()[0], tickers, klines)
+    stub = StubExchanges(responses)
+    url = await stub.start()
+    saved = {name: exchange.rest_url for name, exchange in EXCHANGES.items()}
+    try:
+        for exchange in EXCHANGES.values():
+            exchange.rest_url = f"{url}/{exchange.name}"
+            _, tickers_body, klines_body = responses[exchange.name]
+            name = f"{exchange.title} ({sources[exchange.name]})"
+
+            items = await fetcher.fetch_exchange_tickers(exchange, 0)
+            if not items:
+                errors.append(f"{name}: нет тикеров")
+            for item in items:
+                owner, native = resolve(item['symbol'])
+                if owner is not exchange or exchange.symbol(native) != item['symbol']:
+                    errors.append(f"{name}: символ {item['symbol']} не сопоставляется с биржей")
+                if not np.isfinite(float(item['turnover24h'])):
+                    errors.append(f"{name}: {item['symbol']} без оборота")
+
+            symbol_id = exchange.symbol(exchange.native(symbol))
+            df = await fetcher.fetch_ohlcv(symbol_id, timeframe, limit=exchange.max_kline_limit, use_cache=False)
+            ts, ohlcv = reference_klines(exchange, klines_body)
+            if df.empty or not np.array_equal(df.index.asi8 // 1_000_000, ts) or \
+                    not np.allclose(df.to_numpy(), ohlcv, rtol=0, atol=0):
+                errors.append(f"{name}: свечи {symbol_id} не совпадают с эталонным разбором")
+
+            raw, expected = stream_message(exchange, symbol, timeframe)
+            parsed = exchange.parse_stream(raw)
+            if parsed is None or exchange.symbol(parsed[0]) != symbol_id or parsed[1] != [expected]:
+                errors.append(f"{name}: сообщение потока разобрано неверно: {parsed}")
+
+            print(f"{name}: тикеров {len(items)}, свечей {len(df)}")
+    finally:
+        for name, rest_url in saved.items():
+            EXCHANGES[name].rest_url = rest_url
+        await fetcher.close_client()
+        await stub.stop()
+    return errors
+
+
+def main():
+    from monitor.logger import start_logging
+    start_logging()
+    parser = argparse.ArgumentParser(description="Проверка адаптеров бирж на локальных фикстурах")
+    parser.add_argument('command', choices=['record', 'check'])
+    parser.add_argument('--symbol', default='BTCUSDT')
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    args = parser.parse_args()
+    if args.command == 'record':
+        asyncio.run(record_responses(args.fixtures, args.symbol, args.timeframe))
+        return
+    errors = asyncio.run(check_exchanges(args.fixtures, args.symbol, args.timeframe))
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    if errors:
+        sys.exit(1)
+    print("Все адаптеры прошли проверку")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Инкрементальные индикаторы против TA-Lib: расхождение и время обновления.
+
+Состояние прогоняется по синтетической истории свеча за свечой, с правками
+незакрытой свечи перед закрытием; значения на каждом баре сравниваются с TA-Lib
+по той же истории. Затем info сигнала analyze, пакетного analyze_frames и
+IncrementalEngine сравниваются на окнах 200 свечей, на коротких историях (полосы
+Боллинджера и хвост паттернов ещё не посчитаны) и на свечах с NaN: ключи,
+читаемые сообщением сигнала, и их значения должны совпадать. В конце замеряется полный пересчёт 200
+свечей через analyze и одно обновление инкрементального состояния.
+
+    python -m bench.incremental_indicators [--bars 1000] [--revisions 3] [--runs 200] [--windows 100]
+"""
+import argparse
+import time
+import numpy as np
+import talib
+from bench.chart_backends import sample_frame
+from monitor.analyzer import analyze
+from monitor.batch import TRIGGER_NAMES, analyze_frames, compute_batch, summarize_batch, trigger_matrix
+from monitor.candles import CandleBuffer
+from monitor.incremental import IncrementalEngine, IndicatorState
+from monitor.logger import start_logging
+
+TOLERANCE = 1e-6
+
+
+def reference(df):
+    close, high, low, volume = (df[c].to_numpy() for c in ('close', 'high', 'low', 'volume'))
+    upper, middle, lower = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+    return {
+        'rsi': talib.RSI(close, timeperiod=14),
+        'macd': talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)[0],
+        'upper': upper, 'sma20': middle, 'lower': lower,
+        'adx': talib.ADX(high, low, close, timeperiod=14),
+        'vol_surge': volume / talib.SMA(volume, timeperiod=20),
+    }
+
+
+def validate(bars, revisions, seed=7):
+    df = sample_frame(bars, seed)
+    rows = df[['open', 'high', 'low', 'close', 'volume']].to_numpy()
+    expected = reference(df)
+    rng = np.random.default_rng(seed)
+    state = IndicatorState()
+    worst = {name: 0.0 for name in expected}
+    for i, row in enumerate(rows):
+        for _ in range(revisions):
+            state.update(i, row * (1 + rng.normal(0, 0.01, len(row))))  # Правки открытой свечи
+            state.values()
+        state.update(i, row)
+        values = state.values()
+        for name, series in expected.items():
+            if np.isnan(series[i]):
+                continue
+            error = abs(values[name] - series[i]) / max(abs(series[i]), 1.0)
+            worst[name] = max(worst[name], error)
+    print(f"{'индикатор':<12}{'макс. отн. ошибка':>20}")
+    for name, error in worst.items():
+        print(f"{name:<12}{error:>20.2e}{'' if error < TOLERANCE else '  > допуска'}")
+    return all(error < TOLERANCE for error in worst.values())
+
+
+def same(a, b):
+    if isinstance(a, (float, np.floating)) or isinstance(b, (float, np.floating)):
+        return (np.isnan(a) and np.isnan(b)) or abs(a - b) <= TOLERANCE * max(abs(a), 1.0)
+    return a == b
+
+
+def parity(windows, seed=7):
+    """
+    info движков по одним и тем же свечам; True — совпали. Пакет сравнивается с analyze
+    на окнах 200 свечей, инкрементальный движок — на всей истории, как он её и видит.
+    """
+    df = sample_frame(200 + windows, seed)
+    ts = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    rows = df.to_numpy()
+    config = {'price_change_threshold': 0.5, 'min_indicators': 1}
+    buf = CandleBuffer(len(rows))
+    buf.merge(ts[:199], rows[:199])
+    engine = IncrementalEngine()
+    frames, pairs = {}, []
+    for i in range(199, len(rows)):
+        buf.merge(ts[i:i + 1], rows[i:i + 1])
+        history = buf.frame()
+        symbol = f"W{i:04d}USDT"
+        frames[symbol] = history.iloc[-200:]
+        info = engine.analyze(symbol, '5m', buf, config)[1]
+        pairs.append((symbol, 'инкрементальный', analyze(history, config, symbol=symbol)[1], info))
+    batch = analyze_frames(frames, config)
+    pairs += [(symbol, 'пакетный', analyze(frame, config, symbol=symbol)[1], batch[symbol][1])
+              for symbol, frame in frames.items()]
+    return report(pairs)
+
+
+def edge_cases(seed=7):
+    """То же сравнение на коротких историях и на свечах с NaN, где движки расходились проще всего"""
+    config = {'price_change_threshold': 0.5, 'min_indicators': 1}
+    frames = {f"S{n:03d}USDT": sample_frame(n, seed) for n in (40, 50, 55, 60, 79, 120, 199)}
+    for n, row, column in ((60, 30, 'close'), (200, 199, 'volume'), (200, 0, 'high')):
+        df = sample_frame(n, seed)
+        df.iloc[row, df.columns.get_loc(column)] = np.nan
+        frames[f"N{n:03d}R{row:03d}USDT"] = df
+    batch = analyze_frames(frames, config)
+    pairs = []
+    for symbol, df in frames.items():
+        scalar = analyze(df, config, symbol=symbol)[1]
+        buf = CandleBuffer(len(df))
+        buf.merge(df.index.values.astype('datetime64[ms]').astype(np.int64), df.to_numpy())
+        pairs.append((symbol, 'пакетный', scalar, batch[symbol][1]))
+        pairs.append((symbol, 'инкрементальный', scalar, IncrementalEngine().analyze(symbol, '5m', buf, config)[1]))
+    return report(pairs) and bollinger_missing(config, seed)
+
+
+def bollinger_missing(config, seed=7):
+    """
+    Полосы ещё не посчитаны (меньше 20 свечей): как и в analyze, ключа bollinger в info нет,
+    а индикатор считается сработавшим — одинаково в пакетном и инкрементальном движке
+    """
+    column = TRIGGER_NAMES.index('bollinger')
+    indicators = dict.fromkeys(TRIGGER_NAMES, False) | {'price_change': True, 'bollinger': True}
+    mismatches = []
+    for n in (10, 19, 20, 30):
+        rows = sample_frame(n, seed)[['open', 'high', 'low', 'close', 'volume']].to_numpy()
+        state = IndicatorState()
+        for i, row in enumerate(rows):
+            state.update(i, row)
+        engines = {'пакетный': compute_batch(*rows[None, :, 1:].transpose(2, 0, 1), indicators),
+                   'инкрементальный': {name: np.array([value]) for name, value in state.values(indicators).items()}}
+        for name, values in engines.items():
+            matrix = trigger_matrix(values, indicators, config)
+            info = summarize_batch(['SHORTUSDT'], values, matrix, [n], indicators, config)[0][1]
+            triggered, label = bool(matrix[0, column]), info.get('bollinger')
+            if (label is None) != (n < 20) or triggered != (label != 'inside'):
+                mismatches.append(f"{n} свечей, {name}: сработал {triggered}, bollinger={label}")
+    for line in mismatches:
+        print(f"Bollinger без полос не по правилу analyze: {line}")
+    return not mismatches
+
+
+def report(pairs):
+    mismatches = []
+    for symbol, name, scalar, info in pairs:
+        keys = set(scalar) ^ set(info)
+        keys |= {key for key in set(scalar) & set(info) if not same(scalar[key], info[key])}
+        if keys:
+            mismatches.append(f"{symbol}, {name}: {', '.join(sorted(keys))}")
+    for line in mismatches[:10]:
+        print(f"info не совпадает с analyze: {line}")
+    print(f"info движков: {len(pairs) - len(mismatches)} из {len(pairs)} сравнений совпали")
+    return not mismatches
+
+
+def timing(runs, seed=7):
+    df = sample_frame(400, seed)
+    ts = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    rows = df.to_numpy()
+    config = {'price_change_threshold': 0.5, 'min_indicators': 1}
+    buf = CandleBuffer(200)
+    buf.merge(ts[:200], rows[:200])
+    engine = IncrementalEngine()
+    engine.analyze('BENCHUSDT', '5m', buf, config)
+
+    full, step = [], []
+    for i in range(200, 200 + runs):
+        buf.merge(ts[i:i + 1], rows[i:i + 1])
+        frame = buf.frame()
+        start = time.perf_counter()
+        analyze(frame, config, symbol='BENCHUSDT')
+        full.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        engine.analyze('BENCHUSDT', '5m', buf, config)
+        step.append(time.perf_counter() - start)
+    print(f"analyze по 200 свечам: {np.median(full) * 1e6:.0f} мкс, инкрементально: {np.median(step) * 1e6:.0f} мкс")
+
+
+if __name__ == '__main__':
+    start_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--revisions', type=int, default=3, help='правок открытой свечи перед закрытием')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--windows', type=int, default=100, help='окон для сравнения info движков')
+    args = parser.parse_args()
+    ok = validate(args.bars, args.revisions)
+    ok = parity(args.windows) and ok
+    ok = edge_cases() and ok
+    timing(min(args.runs, 200))
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,501 @@
+"""
+Бенчмарк конвейера сканирования на записанных ответах Bybit и локальном stub-сервере.
+
+    python -m bench.pipeline record [--symbols 50] [--timeframe 5m]
+    python -m bench.pipeline run [--universe 300 1000 3000] [--engine per_symbol|batch|incremental] [--shards N]
+                                 [--executor none|thread|process]
+                                 [--profile cprofile|pyinstrument] [--save out.json]
+                                 [--baseline out.json --max-regression 0.2]
+
+record сохраняет снимок тикеров и свечи самых ликвидных символов в bench/fixtures.
+В репозитории лежит небольшой замороженный снимок (8 символов по 400 свечей 5m в
+формате ответов Bybit), поэтому прогоны из чистой копии на разных машинах идут на
+одних и тех же данных; record заменяет его свежими ответами биржи.
+run поднимает stub-сервер с API /v5/market/tickers и /v5/market/kline, направляет
+на него фетчер и прогоняет run_monitor из bot.py: холодный цикл (полная загрузка
+свечей) и тёплый (только новые свечи). Символы вселенной нужного размера
+получаются копированием записанных рядов; без записи используются синтетические
+свечи в формате Bybit. С --shards N циклы идут через N процессов-воркеров
+(monitor.shards), stub-сервер передаётся им через exchange_urls. --executor выбирает пул
+анализа (monitor.analysis_pool). Дополнительно меряется пропускная способность этапов
+(разбор JSON, analyze, график — символов в секунду), пиковый RSS и блокировки
+event loop. Каждый размер вселенной считается в отдельном процессе.
+
+С --baseline сравнивает результат с сохранённым (run --save) и завершается с кодом 1,
+если время цикла выросло или пропускная способность упала больше чем на
+--max-regression. Базовая линия в репозитории не хранится — она зависит от машины;
+если файла нет или в нём нет прогона с теми же параметрами и тем же источником свечей
+(фикстуры или синтетика), run завершается ошибкой, а не пропускает сравнение.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join('bench', 'fixtures')
+DEFAULT_UNIVERSES = (300, 1000, 3000)
+SERIES_BARS = 400
+CHART_SAMPLE = 10
+LAG_INTERVAL = 0.005
+LAG_THRESHOLD = 0.05  # Блокировкой считается задержка event loop больше 50 мс
+
+# Больше — хуже: время; меньше — хуже: пропускная способность
+LOWER_IS_BETTER = ('cold_cycle_s', 'warm_cycle_s', 'loop_blocked_s', 'peak_rss_mb')
+HIGHER_IS_BETTER = ('parse_per_s', 'analyze_per_s', 'batch_per_s', 'incremental_per_s', 'chart_per_s')
+
+
+# === Фикстуры ===
+
+def synthetic_series(count, bars=SERIES_BARS, step=300_000, seed=11):
+    """Ряды свечей в формате строк Bybit [ts, open, high, low, close, volume, turnover] по возрастанию"""
+    rng = np.random.default_rng(seed)
+    end = int(time.time() * 1000) // step * step
+    ts = end - step * np.arange(bars - 1, -1, -1)
+    series = []
+    for i in range(count):
+        returns = rng.normal(0, 0.004, bars)
+        if i % 7 == 0:
+            returns[-3:] += rng.choice([-1, 1]) * 0.01  # Часть символов с пампом/дампом, чтобы были сигналы
+        close = rng.uniform(0.01, 500) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.003, bars)) * close
+        volume = rng.lognormal(12, 0.6, bars)
+        volume[-1] *= 3 if i % 7 == 0 else 1
+        high, low = np.maximum(open_, close) + spread, np.minimum(open_, close) - spread
+        series.append([[str(int(t)), f"{o:.6g}", f"{h:.6g}", f"{lo:.6g}", f"{c:.6g}", f"{v:.2f}", f"{v * c:.2f}"]
+                       for t, o, h, lo, c, v in zip(ts, open_, high, low, close, volume)])
+    return series
+
+
+def has_fixtures(directory):
+    return all(os.path.exists(os.path.join(directory, name)) for name in ('tickers.json', 'klines.json'))
+
+
+def load_fixtures(directory, universe):
+    """(тикеры, {symbol: ряд}) на universe символов: записанные ряды, копии с новыми именами или синтетика"""
+    tickers_path = os.path.join(directory, 'tickers.json')
+    klines_path = os.path.join(directory, 'klines.json')
+    if has_fixtures(directory):
+        with open(tickers_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)['result']['list']
+        with open(klines_path, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        by_symbol = {item['symbol']: item for item in items}
+        base = [(by_symbol[s], rows[::-1]) for s, rows in recorded.items() if s in by_symbol and rows]
+    else:
+        base = [({'symbol': '', 'lastPrice': rows[-1][4], 'turnover24h': '50000000', 'price24hPcnt': '0.01'}, rows)
+                for rows in synthetic_series(min(universe, 64))]
+    tickers, series = [], {}
+    for i in range(universe):
+        item, rows = base[i % len(base)]
+        symbol = item['symbol'] if i < len(base) and item['symbol'] else f"BENCH{i:04d}USDT"
+        tickers.append({**item, 'symbol': symbol, 'turnover24h': item.get('turnover24h') or '50000000'})
+        series[symbol] = rows
+    return tickers, series
+
+
+async def record_fixtures(directory, count, timeframe):
+    """Записывает снимок тикеров и до 1000 свечей для count самых ликвидных символов"""
+    from monitor.fetcher import INTERVAL_MAP, MAX_KLINE_LIMIT, init_client, close_client
+    http = await init_client({})
+    try:
+        status, tickers = await http.get("tickers", params={"category": "linear"})
+        if status != 200:
+            raise SystemExit(f"Bybit tickers: HTTP {status}")
+        items = [i for i in tickers['result']['list'] if i['symbol'].endswith('USDT')]
+        items.sort(key=lambda i: float(i.get('turnover24h', 0)), reverse=True)
+        klines = {}
+        for item in items[:count]:
+            status, data = await http.get("kline", params={"category": "linear", "symbol": item['symbol'],
+                                                           "interval": INTERVAL_MAP[timeframe], "limit": MAX_KLINE_LIMIT})
+            if status == 200:
+                klines[item['symbol']] = data['result']['list']
+        tickers['result']['list'] = items
+    finally:
+        await close_client()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'tickers.json'), 'w', encoding='utf-8') as f:
+        json.dump(tickers, f)
+    with open(os.path.join(directory, 'klines.json'), 'w', encoding='utf-8') as f:
+        json.dump(klines, f)
+    print(f"Записано {len(items)} тикеров и свечи {len(klines)} символов в {directory}")
+
+
+# === Stub-сервер Bybit ===
+
+class StubBybit:
+    """Локальный /v5/market: ряды сдвигаются так, чтобы последняя свеча была текущей"""
+
+    def __init__(self, tickers, series, step, latency=0.0):
+        self.latency = latency
+        self.tickers_body = json.dumps({"retCode": 0, "result": {"category": "linear", "list": tickers}})
+        self.series = {}
+        shifts = {}
+        now_bar = int(time.time() * 1000) // step * step
+        for symbol, rows in series.items():
+            key = id(rows)
+            if key not in shifts:
+                shift = now_bar - int(rows[-1][0])
+                ts = [int(r[0]) + shift for r in rows]
+                shifts[key] = (ts, [json.dumps([str(t)] + r[1:]) for t, r in zip(ts, rows)])
+            self.series[symbol] = shifts[key]
+        self.requests = 0
+        self.runner = None
+        self.loop = None
+        self.thread = None
+        self.url = None
+
+    async def _tickers(self, request):
+        self.requests += 1
+        return web.Response(text=self.tickers_body, content_type='application/json')
+
+    async def _kline(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        ts, rows = self.series.get(request.query.get('symbol'), ([], []))
+        limit = int(request.query.get('limit', 200))
+        lo = bisect.bisect_left(ts, int(request.query['start'])) if 'start' in request.query else 0
+        selected = rows[max(lo, len(rows) - limit):]
+        body = '{"retCode":0,"result":{"category":"linear","list":[' + ','.join(reversed(selected)) + ']}}'
+        return web.Response(text=body, content_type='application/json')
+
+    def start(self):
+        """Запускает сервер в отдельном потоке со своим event loop, чтобы он не влиял на замеры бота"""
+        ready = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self._start())
+            ready.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.url
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/v5/market/tickers', self._tickers)
+        app.router.add_get('/v5/market/kline', self._kline)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v5/market"
+
+
+# === Замеры ===
+
+class LoopLag:
+    """Фоновый замер задержек event loop: максимум и суммарное время блокировок"""
+
+    def __init__(self, interval=LAG_INTERVAL, threshold=LAG_THRESHOLD):
+        self.interval, self.threshold = interval, threshold
+        self.max = 0.0
+        self.blocked = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.max = max(self.max, lag)
+            if lag > self.threshold:
+                self.blocked += lag
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def throughput(func, items, repeat=3):
+    """Элементов в секунду — лучший из repeat проходов"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best if best > 0 else float('inf')
+
+
+def parse_kline_body(body):
+    """Прежний разбор ответа kline: json.loads и список строк в np.array"""
+    klines = json.loads(body)['result']['list']
+    return np.array(klines[::-1], dtype=np.float64)
+
+
+def bench_config(args, config_path, api_url):
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config.update({
+        'telegram_token': '', 'chat_id': '', 'timeframe': args.timeframe, 'volume_filter': 0,
+        'bot_status': True, 'log_level': 'WARNING', 'cache_tickers': True, 'kline_cache': True,
+        'analysis_engine': args.engine, 'prefilter_enabled': False, 'metrics_enabled': False,
+        'rate_limit_rps': 100_000, 'rate_limit_burst': 10_000, 'initial_concurrency': args.concurrency,
+        'max_concurrency': args.concurrency, 'http_pool_per_host': args.concurrency,
+        'shard_workers': args.shards, 'exchange_urls': {'bybit': api_url}, 'analysis_executor': args.executor,
+    })
+    config['candle_store_dir'] = None  # Без архива: холодный цикл всегда загружает свечи целиком
+    config['signal_state_path'] = None
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return config
+
+
+async def measure_cycles(bot, fetcher, config, args, result):
+    """Холодный и тёплый run_monitor с замером времени и блокировок event loop; возвращает число сигналов"""
+    from monitor.signal_state import SignalState
+    signals = []
+
+    async def record_signal(symbol, df, info, cfg, on_done=None):
+        signals.append(symbol)
+        if on_done is not None:
+            on_done(True)
+        return True
+
+    bot.send_signal = record_signal  # Без Telegram: сигнал только учитывается
+    await fetcher.init_client(config)
+    bot.start_analysis_pool(config)
+    if args.shards > 1:
+        from monitor.shards import ShardPool
+        from monitor.settings import config_service
+        bot.shard_pool = ShardPool(args.shards, bot.shard_worker, bot.deliver_signal, config_service.path)
+        await bot.shard_pool.start()
+    profiler = start_profiler(args.profile)
+    try:
+        for name in ('cold', 'warm'):
+            with LoopLag() as lag:
+                start = time.perf_counter()
+                await bot.run_monitor()
+                result[f'{name}_cycle_s'] = time.perf_counter() - start
+            result[f'{name}_loop_max_lag_s'] = lag.max
+            result['loop_blocked_s'] = result.get('loop_blocked_s', 0.0) + lag.blocked
+            bot.signal_state = SignalState()  # Тёплый цикл отправляет сигналы заново, как после истечения TTL
+    finally:
+        stop_profiler(profiler, args.profile, args.universe)
+        if bot.shard_pool is not None:
+            await bot.shard_pool.stop()
+        bot.stop_analysis_pool()
+        await fetcher.close_client()
+    return len(signals)
+
+
+async def load_frames(fetcher, config, symbols, timeframe):
+    """Загрузка свечей в этом процессе: при шардинге они остались в воркерах, а замеры этапов идут здесь"""
+    await fetcher.init_client(config)
+    try:
+        await asyncio.gather(*(fetcher.fetch_ohlcv(s, timeframe, limit=config.get('candle_history', 200))
+                               for s in symbols))
+    finally:
+        await fetcher.close_client()
+
+
+def run_universe(args):
+    """Один размер вселенной; вызывается в отдельном процессе"""
+    from monitor import settings
+    from monitor import fetcher
+    from monitor.candles import TIMEFRAME_MS
+    tickers, series = load_fixtures(args.fixtures, args.universe)
+    stub = StubBybit(tickers, series, TIMEFRAME_MS[args.timeframe], latency=args.latency)
+    config_path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'config.json')
+    config = bench_config(args, config_path, stub.start())
+    settings.config_service.path = config_path
+
+    import bot  # Читает конфигурацию бенчмарка через config_service
+    from monitor.analyzer import analyze
+    from monitor.batch import analyze_frames
+    from monitor.charts import get_renderer
+    from monitor.incremental import IncrementalEngine
+    from monitor.klines import parse_klines
+
+    result = {'universe': args.universe, 'engine': args.engine, 'shards': args.shards, 'executor': args.executor,
+              'fixtures': 'recorded' if has_fixtures(args.fixtures) else 'synthetic'}
+    try:
+        result['signals'] = asyncio.run(measure_cycles(bot, fetcher, config, args, result))
+        result['requests'] = stub.requests
+        if args.shards > 1:
+            asyncio.run(load_frames(fetcher, config, list(series), args.timeframe))
+    finally:
+        stub.stop()
+
+    frames = {}
+    for symbol in series:
+        buf = fetcher.candle_store.get(symbol, args.timeframe)
+        if buf is not None and len(buf):
+            frames[symbol] = buf.frame()
+    bodies = [('{"retCode":0,"result":{"list":[' + ','.join(reversed(stub.series[s][1][-200:])) + ']}}').encode()
+              for s in frames]
+    result['parse_per_s'] = throughput(parse_klines, bodies)
+    result['parse_json_per_s'] = throughput(parse_kline_body, bodies)
+    result['analyze_per_s'] = throughput(lambda item: analyze(item[1], config, symbol=item[0]), list(frames.items()))
+    start = time.perf_counter()
+    analyze_frames(frames, config)
+    result['batch_per_s'] = len(frames) / (time.perf_counter() - start)
+    engine = IncrementalEngine()
+    buffers = [(s, fetcher.candle_store.get(s, args.timeframe)) for s in frames]
+    for symbol, buf in buffers:
+        engine.sync(symbol, args.timeframe, buf)  # Затравка; замеряется установившееся обновление
+    result['incremental_per_s'] = throughput(
+        lambda item: engine.analyze(item[0], args.timeframe, item[1], config), buffers)
+    renderer = get_renderer(config.get('chart_backend', 'mplfinance'))
+    sample = list(frames.items())[:CHART_SAMPLE]
+    result['chart_per_s'] = throughput(lambda item: renderer(item[1], item[0], args.timeframe), sample, repeat=1)
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def start_profiler(kind):
+    if kind == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == 'pyinstrument':
+        from pyinstrument import Profiler
+        profiler = Profiler(async_mode='enabled')
+        profiler.start()
+        return profiler
+    return None
+
+
+def stop_profiler(profiler, kind, universe):
+    if profiler is None:
+        return
+    if kind == 'cprofile':
+        import pstats
+        profiler.disable()
+        path = f"bench-pipeline-{universe}.prof"
+        profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+    else:
+        profiler.stop()
+        path = f"bench-pipeline-{universe}.html"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+        sys.stderr.write(profiler.output_text(unicode=True))
+    sys.stderr.write(f"Профиль сохранён в {path}\n")
+
+
+# === Запуск и сравнение ===
+
+def result_key(r):
+    """Параметры прогона, по которым результат сопоставляется с базовой линией"""
+    return r['universe'], r['engine'], r.get('shards', 0), r.get('executor', 'none'), r.get('fixtures', 'synthetic')
+
+
+def run_all(args):
+    if args.baseline and not os.path.exists(args.baseline):
+        raise SystemExit(f"Нет базовой линии {args.baseline}: сохраните её прогоном "
+                         f"run --save {args.baseline} на этой машине")
+    if args.baseline and not has_fixtures(args.fixtures):
+        print(f"Нет фикстур в {args.fixtures}: сравнение идёт на синтетических свечах "
+              f"(записать фикстуры — python -m bench.pipeline record)")
+    results = []
+    for universe in args.universe:
+        cmd = [sys.executable, '-m', 'bench.pipeline', 'run-one', '--universe', str(universe),
+               '--engine', args.engine, '--timeframe', args.timeframe, '--fixtures', args.fixtures,
+               '--latency', str(args.latency), '--concurrency', str(args.concurrency), '--shards', str(args.shards),
+               '--executor', args.executor]
+        if args.profile:
+            cmd += ['--profile', args.profile]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"Прогон на {universe} символов завершился с кодом {proc.returncode}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    print_table(results)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = {result_key(r): r for r in json.load(f)}
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+def print_table(results):
+    columns = [('universe', 'символов', 'd'), ('shards', 'воркеров', 'd'), ('cold_cycle_s', 'холодный, с', '.2f'), ('warm_cycle_s', 'тёплый, с', '.2f'),
+               ('parse_per_s', 'разбор/с', '.0f'), ('analyze_per_s', 'analyze/с', '.0f'),
+               ('batch_per_s', 'пакет/с', '.0f'), ('incremental_per_s', 'инкр./с', '.0f'),
+               ('chart_per_s', 'графиков/с', '.1f'), ('loop_blocked_s', 'блок. loop, с', '.2f'),
+               ('peak_rss_mb', 'RSS, МБ', '.0f')]
+    print(''.join(f"{title:>15}" for _, title, _ in columns))
+    for r in results:
+        print(''.join(f"{r[key]:>15{fmt}}" for key, _, fmt in columns))
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for r in results:
+        base = baseline.get(result_key(r))
+        if base is None:
+            universe, engine, shards, executor, fixtures = result_key(r)
+            regressions.append(f"{universe} символов: нет прогона в базовой линии (engine {engine}, "
+                               f"shards {shards}, executor {executor}, свечи: {fixtures})")
+            continue
+        for key in LOWER_IS_BETTER:
+            if key in base and base[key] > 0 and r[key] > base[key] * (1 + max_regression):
+                regressions.append(f"{r['universe']} символов, {key}: {base[key]:.3f} → {r[key]:.3f}")
+        for key in HIGHER_IS_BETTER:
+            if key in base and r[key] < base[key] * (1 - max_regression):
+                regressions.append(f"{r['universe']} символов, {key}: {base[key]:.1f} → {r[key]:.1f}")
+    return regressions
+
+
+def main():
+    from monitor.logger import start_logging
+    start_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record', 'run', 'run-one'])
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='каталог фикстур')
+    parser.add_argument('--symbols', type=int, default=50, help='record: сколько символов записать')
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--universe', type=int, nargs='*', default=list(DEFAULT_UNIVERSES))
+    parser.add_argument('--engine', default='per_symbol', choices=['per_symbol', 'batch', 'incremental'])
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа stub-сервера на свечи, сек')
+    parser.add_argument('--concurrency', type=int, default=64, help='параллельность запросов фетчера')
+    parser.add_argument('--shards', type=int, default=0, help='процессов-воркеров шардинга (0 — без шардинга)')
+    parser.add_argument('--executor', default='thread', choices=['none', 'thread', 'process'], help='пул анализа')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'])
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='JSON с прошлыми результатами для сравнения')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='допустимое ухудшение, доля')
+    args = parser.parse_args()
+    if args.command == 'record':
+        asyncio.run(record_fixtures(args.fixtures, args.symbols, args.timeframe))
+    elif args.command == 'run-one':
+        args.universe = args.universe[0]
+        print(json.dumps(run_universe(args)))
+    else:
+        raise SystemExit(run_all(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Проверка потокового режима (monitor.stream) на локальных WebSocket- и REST-серверах.
+
+    python -m bench.stream
+
+WebSocket-сервер в формате Bybit принимает подписки и по команде проверки шлёт
+свечи или закрывает соединения; REST-сервер отдаёт свечи из той же синтетической
+ленты, что растёт со временем проверки. Проверяется:
+  - догрузка разрыва: свеча через одну в потоке догружает пропущенную через REST;
+  - переподключение: после закрытия сервером соединение восстанавливается,
+    подписка повторяется, а свечи, пришедшие за время простоя, догружаются;
+  - update_symbols переподключает только соединения с изменившимся списком символов;
+  - stop() отменяет догрузки и соединения.
+
+Завершается с кодом 1, если хотя бы одна проверка не прошла.
+"""
+import asyncio
+import json
+import sys
+import time
+import websockets
+from aiohttp import web
+
+TIMEFRAME = '1m'
+STEP = 60_000
+HISTORY = 50
+
+
+def candle(ts):
+    """Детерминированная свеча по времени: по ней проверяется, что в буфере нужные значения"""
+    price = 100 + ts // STEP % 97
+    return [price, price + 1, price - 1, price + 0.5, 1000 + ts // STEP % 13]
+
+
+class FakeBybit:
+    """REST /kline и WebSocket kline.1.* со свечами до end включительно"""
+
+    def __init__(self, end):
+        self.end = end
+        self.connections = []  # [(ws, подписанные символы)]
+        self.opened = 0
+        self.rest_requests = 0
+        self.delay = 0  # Задержка ответа REST, сек
+        self._runner = None
+        self._ws_server = None
+
+    async def _kline(self, request):
+        self.rest_requests += 1
+        await asyncio.sleep(self.delay)
+        limit = int(request.query.get('limit', 200))
+        start = request.query.get('start')
+        first = int(start) if start is not None else self.end - (limit - 1) * STEP
+        rows = [[str(ts), *map(str, candle(ts)), '0'] for ts in range(first, self.end + 1, STEP)][:limit]
+        body = {"retCode": 0, "retMsg": "OK",
+                "result": {"category": "linear", "symbol": request.query['symbol'], "list": rows[::-1]}}
+        return web.Response(text=json.dumps(body, separators=(',', ':')), content_type='application/json')
+
+    async def _ws(self, ws):
+        self.opened += 1
+        entry = [ws, set()]
+        self.connections.append(entry)
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get('op') == 'subscribe':
+                    entry[1].update(topic.rsplit('.', 1)[-1] for topic in msg['args'])
+                    await ws.send(json.dumps({"op": "subscribe", "success": True}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.remove(entry)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/kline', self._kline)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self._ws_server = await websockets.serve(self._ws, '127.0.0.1', 0)
+        rest_port = site._server.sockets[0].getsockname()[1]
+        ws_port = next(iter(self._ws_server.sockets)).getsockname()[1]
+        return f"http://127.0.0.1:{rest_port}", f"ws://127.0.0.1:{ws_port}"
+
+    async def stop(self):
+        self._ws_server.close()
+        await self._ws_server.wait_closed()
+        await self._runner.cleanup()
+
+    def subscribed(self):
+        return [frozenset(symbols) for _, symbols in self.connections]
+
+    async def send(self, symbol, ts, confirm=True):
+        o, h, l, c, v = candle(ts)
+        msg = {"topic": f"kline.1.{symbol}", "type": "snapshot",
+               "data": [{"start": ts, "open": str(o), "high": str(h), "low": str(l), "close": str(c),
+                         "volume": str(v), "confirm": confirm}]}
+        for ws, symbols in self.connections:
+            if symbol in symbols:
+                await ws.send(json.dumps(msg))
+
+    async def drop(self):
+        for ws, _ in list(self.connections):
+            await ws.close()
+
+
+async def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+def contiguous(buf, until):
+    ts = buf.timestamps
+    return len(ts) and ts[-1] == until and bool((ts[1:] - ts[:-1] == STEP).all()) and \
+        all(list(buf.values[i]) == candle(int(t)) for i, t in enumerate(ts))
+
+
+async def check_stream():
+    from monitor import fetcher
+    from monitor.exchanges import BYBIT
+    from monitor.stream import KlineStream
+    errors = []
+    now = int(time.time() * 1000) // STEP * STEP
+    server = FakeBybit(end=now - 3 * STEP)
+    rest_url, ws_url = await server.start()
+    saved_url = BYBIT.rest_url
+    BYBIT.rest_url = rest_url
+    seen = []
+    fills = set()
+
+    async def on_candle(symbol, confirmed):
+        seen.append((symbol, confirmed))
+
+    config = {'candle_history': HISTORY, 'stream_symbols_per_connection': 2, 'stream_max_reconnect_delay': 1}
+    stream = KlineStream(['AUSDT', 'BUSDT', 'CUSDT'], TIMEFRAME, on_candle, config, BYBIT, url=ws_url)
+    try:
+        await stream.start()
+        if not await wait_for(lambda: len(server.connections) == 2 and
+                              all(fetcher.candle_store.get(s, TIMEFRAME) for s in stream.symbols)):
+            errors.append(f"нет подписки или истории: {server.subscribed()}")
+            return errors
+        if sorted(map(sorted, server.subscribed())) != [['AUSDT', 'BUSDT'], ['CUSDT']]:
+            errors.append(f"символы по соединениям: {server.subscribed()}")
+        buf = fetcher.candle_store.get('AUSDT', TIMEFRAME)
+
+        # Разрыв: свеча end + 2 без end + 1
+        server.end = now - STEP
+        requests = server.rest_requests
+        await server.send('AUSDT', now - STEP)
+        if not await wait_for(lambda: buf.last_timestamp == now - STEP) or not contiguous(buf, now - STEP):
+            errors.append("разрыв в потоке не догружен через REST")
+        if server.rest_requests == requests:
+            errors.append("догрузка разрыва не обратилась к REST")
+        await wait_for(lambda: not stream._fills)
+        if stream._fills or stream._gaps:
+            errors.append("задача догрузки не удалена после завершения")
+
+        # Переподключение: свеча, вышедшая за время простоя, догружается после подписки
+        opened = server.opened
+        await server.drop()
+        server.end = now
+        if not await wait_for(lambda: server.opened >= opened + 2 and len(server.connections) == 2):
+            errors.append(f"нет переподключения: открыто {server.opened - opened} соединений")
+        if not await wait_for(lambda: buf.last_timestamp == now) or not contiguous(buf, now):
+            errors.append("после переподключения история не догружена")
+        if sorted(map(sorted, server.subscribed())) != [['AUSDT', 'BUSDT'], ['CUSDT']]:
+            errors.append(f"после переподключения подписки: {server.subscribed()}")
+        seen.clear()
+        await server.send('BUSDT', now)
+        if not await wait_for(lambda: ('BUSDT', True) in seen):
+            errors.append("после переподключения свеча не передана в on_candle")
+
+        # update_symbols: меняется только соединение с CUSDT
+        first = next(ws for ws, symbols in server.connections if 'AUSDT' in symbols)
+        opened = server.opened
+        await stream.update_symbols(['AUSDT', 'BUSDT', 'DUSDT'])
+        if not await wait_for(lambda: frozenset({'DUSDT'}) in server.subscribed()):
+            errors.append(f"update_symbols: нет подписки на новый символ: {server.subscribed()}")
+        if server.opened - opened != 1 or first not in [ws for ws, _ in server.connections]:
+            errors.append(f"update_symbols переподключил лишние соединения: открыто {server.opened - opened}")
+
+        # stop() отменяет догрузку, которая ещё ждёт ответа REST
+        server.delay = 30
+        await server.send('AUSDT', now + 2 * STEP)
+        if not await wait_for(lambda: stream._fills):
+            errors.append("разрыв не запустил догрузку")
+        fills = set(stream._fills)
+    finally:
+        started = time.monotonic()
+        await stream.stop()
+        if stream._fills or stream._tasks or not all(task.cancelled() for task in fills):
+            errors.append("stop() не отменил задачи догрузки или соединений")
+        if time.monotonic() - started > 5:
+            errors.append("stop() ждал завершения догрузки вместо отмены")
+        BYBIT.rest_url = saved_url
+        await fetcher.close_client()
+        await server.stop()
+    return errors
+
+
+def main():
+    from monitor.logger import start_logging
+    start_logging()
+    errors = asyncio.run(check_stream())
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    if errors:
+        sys.exit(1)
+    print("Потоковый режим прошёл проверку")
+
+
+if __name__ == '__main__':
+    main()
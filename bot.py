@@ -2,109 +2,435 @@ import asyncio
 import sys
 import traceback
 import telegram
+import pandas as pd
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import pytz
-from monitor.fetcher import get_all_futures_tickers, fetch_ohlcv_bybit
-from monitor.analyzer import analyze
-from monitor.logger import log, logger
-from monitor.settings import load_config
-from monitor.signals import send_signal
+from monitor.fetcher import (get_all_futures_tickers, fetch_ohlcv, fetch_tickers_snapshot, init_client,
+                             close_client, clients, candle_store, load_candle_archive,
+                             flush_candle_archive, fetch_timeframes)
+from monitor.analyzer import analyze, confirm
+from monitor.batch import analyze_frames
+from monitor.incremental import IncrementalEngine
+from monitor import metrics
+from monitor.logger import log, configure_logging, begin_cycle, start_logging, stop_logging
+from monitor.settings import get_config, config_service
+from monitor.screener import TickerScreener
+from monitor.signals import send_signal, get_bot
+from monitor.delivery import start_delivery, stop_delivery
+from monitor.signal_state import SignalState
+from monitor.charts import start_chart_pool, stop_chart_pool
+from monitor.analysis_pool import (AnalysisStage, analysis_enabled, run_analysis, start_analysis_pool,
+                                   stop_analysis_pool)
+from monitor.stream import KlineStream
+from monitor.exchanges import coin, get_exchange, group_symbols
+from monitor.shards import ShardPool
 from monitor.handlers import start, test_telegram, handle_message, toggle_indicator
+from monitor.runtime import Runtime, interval_schedule, candle_schedule, hot_schedule
+from monitor.candles import TIMEFRAME_MS
 import time
-import logging
 
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-config = asyncio.run(load_config())  # Load config synchronously at startup
-logger.setLevel(getattr(logging, config.get('log_level', 'INFO').upper(), logging.INFO))
-for handler in logger.handlers:
-    handler.setLevel(getattr(logging, config.get('log_level', 'INFO').upper(), logging.INFO))
-
-scheduler = AsyncIOScheduler(timezone=pytz.UTC)
-semaphore = asyncio.Semaphore(25)
+config = None  # Снимок конфигурации; загружается в start_bot и обновляется подписчиком ConfigService
 
 EXCLUDED_KEYWORDS = ["ALPHA", "WEB3"]
 
-previous_signals = {}  # {symbol: {'count': count_triggered, 'time': time.time()}}
+signal_state = SignalState()
 
 cached_tickers = None
 cache_time = 0
 
+streams = {}  # {биржа: KlineStream} в потоковом режиме
+screener = TickerScreener()
+indicator_engine = IncrementalEngine()
+
+shard_pool = None  # ShardPool при shard_workers > 1: скан идёт в процессах-воркерах
+signal_sink = None  # В процессе-воркере: передача найденного сигнала координатору
+
+hot_symbols = set()  # Символы, близкие к сигналу на последней закрытой свече: для сканов внутри свечи
+scan_lock = asyncio.Lock()  # Скан по закрытию и скан горячих символов не идут одновременно
+
+
+async def get_tickers():
+    """Список тикеров с учётом кэша и исключённых ключевых слов"""
+    global cached_tickers, cache_time
+    current_time = time.time()
+    if config.get('cache_tickers', True) and cached_tickers and (current_time - cache_time < config.get('cache_duration', 300)):
+        log("Использование кэшированных тикеров", level="INFO")
+        return cached_tickers
+    tickers = await get_all_futures_tickers()
+    tickers = [t for t in tickers if not any(k in t.upper() for k in EXCLUDED_KEYWORDS)]
+    cached_tickers = tickers
+    cache_time = current_time
+    retain_symbols(tickers)
+    return tickers
+
+
+def retain_symbols(tickers):
+    """Освобождает буферы свечей и индикаторов символов, которых нет в tickers"""
+    timeframes = [config['timeframe'], *(config.get('confirm_timeframes') or {})]
+    dropped = candle_store.retain(tickers, timeframes)
+    indicator_engine.retain(tickers, timeframes)
+    if dropped:
+        log(f"Удалено {dropped} буферов свечей неактивных тикеров", level="DEBUG")
+
+
+def cleanup_signals():
+    removed = signal_state.evict()
+    log(f"Очищено {removed} старых сигналов", level="DEBUG")
+
+
+def save_signals():
+    try:
+        if signal_state.save():
+            log(f"Состояние сигналов сохранено: {len(signal_state)}", level="DEBUG")
+    except Exception as e:
+        log(f"Ошибка сохранения состояния сигналов: {str(e)}", level="ERROR")
+
+
+async def load_frames(symbol):
+    """Свечи символа {таймфрейм: DataFrame}: рабочий таймфрейм и старшие из confirm_timeframes"""
+    rules = config.get('confirm_timeframes') or {}
+    limit = config.get('candle_history', 200)
+    if rules:
+        return await fetch_timeframes(symbol, config['timeframe'], list(rules), limit=limit)
+    df = await fetch_ohlcv(symbol, config['timeframe'], limit=limit, use_cache=config.get('kline_cache', True))
+    return {config['timeframe']: df}
+
+
+def closed_frame(df, cutoff):
+    """Свечи df, открытые раньше cutoff (мс): без текущей незакрытой свечи; cutoff=None — все"""
+    if cutoff is None or df.empty:
+        return df
+    return df.iloc[:df.index.searchsorted(pd.to_datetime(cutoff, unit='ms'))]
+
+
+def scan_cutoff():
+    """Время открытия текущей свечи рабочего таймфрейма, если скан идёт по закрытию свечей"""
+    if config.get('scan_schedule', 'interval') != 'candle_close':
+        return None
+    step = TIMEFRAME_MS[config['timeframe']]
+    return int(time.time() * 1000) // step * step
+
+
+def analyze_symbol(symbol, df, cutoff=None):
+    """analyze или, в режиме analysis_engine=incremental, обновление инкрементальных индикаторов по буферу свечей"""
+    if config.get('analysis_engine') == 'incremental' and config.get('kline_cache', True):
+        buf = candle_store.get(symbol, config['timeframe'])
+        if buf is not None and len(buf):
+            return indicator_engine.analyze(symbol, config['timeframe'], buf, config, until=cutoff)
+    return analyze(df, config, symbol=symbol)
+
+
+async def check_symbol(symbol, df, result=None, frames=None, cutoff=None):
+    """
+    Анализирует свечи символа (или берёт готовый result), подтверждает сигнал на старших таймфреймах
+    из frames и отправляет его, если он новый или усилился.
+    cutoff — анализ только свечей, закрытых к этому моменту (мс)
+    """
+    df = closed_frame(df, cutoff)
+    if result is None:
+        with metrics.analyze_symbol_seconds.time():
+            result = analyze_symbol(symbol, df, cutoff)
+    if frames:
+        result = confirm(result, frames, config, symbol)
+    is_signal, info = result
+    metrics.symbols_total.inc()
+    if info.get('count_triggered', 0) >= config.get('hot_min_indicators', max(1, config.get('min_indicators', 1) - 1)):
+        hot_symbols.add(symbol)
+    if is_signal:
+        if signal_sink is not None:
+            signal_sink(symbol, df, info)  # Процесс-воркер: повторы проверяет и отправляет координатор
+        else:
+            metrics.signals_total.inc(type=info.get('type', ''))
+            await deliver_signal(symbol, df, info)
+    else:
+        log("[%s] Нет сигнала. %s", symbol, info.get('debug', 'Нет дополнительной информации'), level="DEBUG")
+    return is_signal
+
+
+async def deliver_signal(symbol, df, info):
+    """Отправляет сигнал, если он новый или усилился"""
+    count_triggered = info.get('count_triggered', 0)
+    # Проверка и запись без await между ними: параллельные задачи не отправят сигнал дважды.
+    # Ключ — монета без биржи: памп одной монеты на нескольких биржах даёт один сигнал
+    key = coin(symbol)
+    if signal_state.claim(key, info.get('type', ''), count_triggered):
+        # Захват фиксируется после фактической отправки, а не постановки в очередь:
+        # вытесненный или не отправленный сигнал монеты может сработать снова
+        def settle(sent):
+            if sent:
+                signal_state.commit(key)
+            else:
+                signal_state.release(key)
+
+        try:
+            await send_signal(symbol, df, info, config, on_done=settle)
+        except Exception:
+            signal_state.release(key)
+            raise
+    else:
+        # === ПОДТВЕРЖДЕНИЯ ОТКЛЮЧЕНЫ ===
+        # await send_confirmation(symbol, info, config, count_triggered, prev_data['count'])
+        pass
+
+
+def on_config_change(new, old):
+    """Подписчик ConfigService: новый снимок конфигурации и уровень логов"""
+    global config
+    config = new
+    signal_state.configure(new)
+    if any(new.get(key) != old.get(key) for key in ('log_level', 'log_format', 'log_debug_every')):
+        configure_logging(new)
+        log("Уровень логирования: %s", new.get('log_level', 'INFO'), level="INFO")
+
+
+config_service.subscribe(on_config_change)
+
+
 async def run_monitor():
-    global config, cached_tickers, cache_time
-    config = await load_config()
+    """Скан всех тикеров; в режиме scan_schedule=candle_close — по только что закрытой свече"""
+    async with scan_lock:
+        await scan()
+
+
+async def run_hot_scan():
+    """Скан внутри свечи только по горячим символам; пропускается, если идёт основной скан"""
+    if scan_lock.locked() or not hot_symbols:
+        return
+    async with scan_lock:
+        await scan(only=set(hot_symbols))
+
+
+async def process_tickers(tickers, cutoff=None):
+    """Загрузка свечей, анализ и сигналы по списку тикеров; возвращает (обработано, сигналов)"""
+    total, signals = 0, 0
+
+    # Параллельность запросов ограничивает планировщик лимитов фетчера
+    async def process_symbol(symbol):
+        nonlocal total, signals
+        symbol_start_time = asyncio.get_event_loop().time()
+        try:
+            log("Начало обработки %s", symbol, level="DEBUG")
+            symbol_frames = await load_frames(symbol)
+            df = symbol_frames[config['timeframe']]
+            if df.empty:
+                log(f"{symbol} - пустой DataFrame после fetch_ohlcv", level="WARNING")
+                metrics.empty_frames_total.inc()
+                return
+            total += 1
+            if await check_symbol(symbol, df, frames=symbol_frames, cutoff=cutoff):
+                signals += 1
+            symbol_end_time = asyncio.get_event_loop().time()
+            log("Обработка %s завершена за %.2f сек", symbol, symbol_end_time - symbol_start_time, level="DEBUG")
+        except Exception as e:
+            log(f"Ошибка обработки {symbol}: {str(e)}", level="ERROR")
+            metrics.errors_total.inc(stage='process')
+
+    async def fetch_symbol(symbol):
+        """(закрытые свечи рабочего таймфрейма, свечи всех таймфреймов) или None"""
+        try:
+            symbol_frames = await load_frames(symbol)
+            df = symbol_frames[config['timeframe']]
+            if df.empty:
+                log(f"{symbol} - пустой DataFrame после fetch_ohlcv", level="WARNING")
+                metrics.empty_frames_total.inc()
+                return None
+            return closed_frame(df, cutoff), symbol_frames
+        except Exception as e:
+            log(f"Ошибка обработки {symbol}: {str(e)}", level="ERROR")
+            metrics.errors_total.inc(stage='process')
+            return None
+
+    async def on_result(symbol, df, result, symbol_frames):
+        nonlocal total, signals
+        total += 1
+        if await check_symbol(symbol, df, result, symbol_frames):
+            signals += 1
+
+    async def stage_symbol(symbol):
+        loaded = await fetch_symbol(symbol)
+        if loaded is not None:
+            await stage.put(symbol, *loaded)
+
+    engine = config.get('analysis_engine', 'per_symbol')
+    if engine == 'batch':
+        # Сначала все свечи, затем один векторизованный проход по всем символам (в пуле анализа, если он есть)
+        loaded = await asyncio.gather(*(fetch_symbol(symbol) for symbol in tickers))
+        frames = {symbol: item[0] for symbol, item in zip(tickers, loaded) if item is not None}
+        all_frames = {symbol: item[1] for symbol, item in zip(tickers, loaded) if item is not None}
+        analyze_start = asyncio.get_event_loop().time()
+        with metrics.analyze_batch_seconds.time():
+            results = await run_analysis(analyze_frames, frames, config=config)
+        log(f"Пакетный анализ {len(frames)} тикеров за {asyncio.get_event_loop().time() - analyze_start:.2f} сек", level="DEBUG")
+        total = len(results)
+        for symbol, result in results.items():
+            try:
+                if await check_symbol(symbol, frames[symbol], result, all_frames[symbol]):
+                    signals += 1
+            except Exception as e:
+                log(f"Ошибка обработки {symbol}: {str(e)}", level="ERROR")
+                metrics.errors_total.inc(stage='process')
+    elif engine == 'per_symbol' and analysis_enabled():
+        # Загрузка и анализ перекрываются: свечи уходят в пул пакетами, полная очередь притормаживает загрузку
+        stage = AnalysisStage(config, on_result).start()
+        try:
+            await asyncio.gather(*(stage_symbol(symbol) for symbol in tickers))
+        finally:
+            await stage.close()
+    else:
+        tasks = [process_symbol(symbol) for symbol in tickers]
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return total, signals
+
+
+async def scan(only=None):
+    global config
+    config = await get_config()
     if not config.get('bot_status', False):
         log("Мониторинг отключен по конфигу.", level="WARNING")
         return
 
+    begin_cycle()
     try:
-        log("Запуск мониторинга...")
+        log("Запуск мониторинга..." if only is None else f"Скан горячих символов: {len(only)}")
         start_time = asyncio.get_event_loop().time()
 
-        # Cache tickers
-        current_time = time.time()
-        if config.get('cache_tickers', True) and cached_tickers and (current_time - cache_time < config.get('cache_duration', 300)):
-            tickers = cached_tickers
-            log("Использование кэшированных тикеров", level="INFO")
-        else:
-            tickers = await get_all_futures_tickers()
-            tickers = [t for t in tickers if not any(k in t.upper() for k in EXCLUDED_KEYWORDS)]
-            cached_tickers = tickers
-            cache_time = current_time
+        tickers = universe = await get_tickers()
+        if only is not None:
+            tickers = [t for t in tickers if t in only]
         log(f"Получено {len(tickers)} тикеров для обработки", level="INFO")
 
         if not tickers:
             log("Тикеры не найдены, проверка остановлена.", level="WARNING")
             return
 
-        # Cleanup previous_signals
-        ttl = 3600  # 1 hour
-        to_remove = [sym for sym, data in previous_signals.items() if current_time - data['time'] > ttl]
-        for sym in to_remove:
-            del previous_signals[sym]
-        log(f"Очищено {len(to_remove)} старых сигналов", level="DEBUG")
-
-        total, signals = 0, 0
-
-        async def process_symbol(symbol):
-            nonlocal total, signals
-            async with semaphore:
-                symbol_start_time = asyncio.get_event_loop().time()
-                try:
-                    log(f"Начало обработки {symbol}", level="DEBUG")
-                    df = await fetch_ohlcv_bybit(symbol, config['timeframe'])
-                    if df.empty:
-                        log(f"{symbol} - пустой DataFrame после fetch_ohlcv_bybit", level="WARNING")
-                        return
-                    is_signal, info = analyze(df, config, symbol=symbol)
-                    total += 1
-                    if is_signal:
-                        signals += 1
-                        count_triggered = info.get('count_triggered', 0)
-                        prev_data = previous_signals.get(symbol, {'count': 0, 'time': 0})
-                        if symbol not in previous_signals or count_triggered > prev_data['count']:
-                            log(f"Начало отправки сигнала для {symbol}", level="INFO")
-                            await send_signal(symbol, df, info, config)
-                            previous_signals[symbol] = {'count': count_triggered, 'time': time.time()}
-                        else:
-                            # === ПОДТВЕРЖДЕНИЯ ОТКЛЮЧЕНЫ ===
-                            # await send_confirmation(symbol, info, config, count_triggered, prev_data['count'])
-                            pass
-                    else:
-                        log(f"[{symbol}] Нет сигнала. {info.get('debug', 'Нет дополнительной информации')}", level="DEBUG")
-                    symbol_end_time = asyncio.get_event_loop().time()
-                    log(f"Обработка {symbol} завершена за {symbol_end_time - symbol_start_time:.2f} сек", level="DEBUG")
-                except Exception as e:
-                    log(f"Ошибка обработки {symbol}: {str(e)}", level="ERROR")
+        cutoff = None
+        if only is None:
+            cutoff = scan_cutoff()
+            hot_symbols.clear()
 
-        tasks = [process_symbol(symbol) for symbol in tickers]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        if config.get('prefilter_enabled', False) and only is None:
+            # Дешёвый первый этап: свечи грузятся только для символов, заметно изменившихся по снимку тикеров
+            screener.configure(config)
+            snapshot = await fetch_tickers_snapshot()
+            if snapshot is not None:
+                tickers = screener.select(snapshot.subset(tickers))
+
+        cleanup_signals()
+
+        if shard_pool is not None:
+            total, signals, hot = await shard_pool.scan(tickers, cutoff, universe if only is None else None)
+            hot_symbols.update(hot)
+        else:
+            total, signals = await process_tickers(tickers, cutoff)
         end_time = asyncio.get_event_loop().time()
+        metrics.cycle_seconds.observe(end_time - start_time)
         log(f"Обработано {total} тикеров, сигналов: {signals}, время обработки: {end_time - start_time:.2f} сек", level="INFO")
+        await flush_candle_archive()
+        save_signals()
+        for http in clients.values():
+            log("Планировщик запросов %s: %s", http.exchange.title, http.scheduler.metrics(), level="DEBUG")
     except Exception as e:
         log(f"Ошибка в run_monitor: {str(e)} | Traceback: {traceback.format_exc()}", level="ERROR")
+        metrics.errors_total.inc(stage='cycle')
+
+
+async def shard_worker(index, workers, jobs, results, config_path=None):
+    """
+    Цикл процесса-воркера шардинга: сканирует присланные координатором части вселенной.
+    Лимит запросов к бирже делится между воркерами поровну (rate_limit_share);
+    найденные сигналы уходят координатору, он же проверяет повторы и отправляет их.
+    """
+    global config, signal_sink
+    if config_path:
+        config_service.path = config_path
+    config = await get_config()
+    configure_logging(config)
+    loop = asyncio.get_running_loop()
+    cycle = 0
+    signal_sink = lambda symbol, df, info: results.put(('signal', cycle, symbol, df, info))
+    await init_client({**config, 'rate_limit_share': 1 / workers})
+    await load_candle_archive(config)
+    executor = config.get('analysis_executor', 'thread')
+    if executor == 'process':
+        # Воркер шардинга — daemon-процесс: своих дочерних процессов у него быть не может
+        log("analysis_executor=process недоступен в воркере шардинга, используются потоки", level="WARNING")
+        executor = 'thread'
+    start_analysis_pool({**config, 'analysis_executor': executor})
+    results.put(('ready', 0, index))
+    log(f"Воркер shard-{index} запущен", level="INFO")
+    try:
+        while True:
+            job = await loop.run_in_executor(None, jobs.get)
+            if job is None:
+                break
+            cycle, tickers, universe, cutoff = job
+            config = await get_config()
+            begin_cycle()
+            if universe is not None:  # Полный скан: горячие символы заново, буферы — только своей части
+                hot_symbols.clear()
+                retain_symbols(universe)
+            try:
+                total, _ = await process_tickers(tickers, cutoff)
+            except Exception as e:
+                log(f"Ошибка воркера shard-{index}: {str(e)} | Traceback: {traceback.format_exc()}", level="ERROR")
+                total = 0
+            results.put(('metrics', cycle, metrics.collect()))
+            results.put(('done', cycle, index, total, list(hot_symbols)))
+            await flush_candle_archive()
+    finally:
+        stop_analysis_pool()
+        await flush_candle_archive()
+        await close_client()
+        results.put(('metrics', cycle, metrics.collect()))
+        log(f"Воркер shard-{index} остановлен", level="INFO")
+
+
+async def on_stream_candle(symbol, confirmed):
+    """Анализ символа сразу после обновления или закрытия свечи в потоке"""
+    if not config.get('bot_status', False):
+        return
+    buf = candle_store.get(symbol, config['timeframe'])
+    if buf is None or len(buf) < 2:
+        return
+    frames = None
+    rules = config.get('confirm_timeframes') or {}
+    if rules:
+        frames = await fetch_timeframes(symbol, config['timeframe'], list(rules),
+                                        limit=config.get('candle_history', 200), fetch_base=False)
+    await check_symbol(symbol, buf.frame(), frames=frames)
+
+
+async def sync_streams(tickers):
+    """Поток свечей на каждую биржу из tickers: запуск новых, переподписка и смена таймфрейма"""
+    groups = group_symbols(tickers)
+    for name, symbols in groups.items():
+        current = streams.get(name)
+        if current is not None and current.timeframe != config['timeframe']:
+            await current.stop()
+            current = None
+        if current is None:
+            streams[name] = KlineStream(symbols, config['timeframe'], on_stream_candle, config, get_exchange(name))
+            await streams[name].start()
+        elif await current.update_symbols(symbols):
+            log(f"Подписки потока {current.exchange.title} обновлены: {len(symbols)} тикеров", level="INFO")
+    if tickers:
+        for name in set(streams) - set(groups):
+            await streams.pop(name).stop()  # Биржа выключена в конфигурации
+
+
+async def refresh_stream():
+    """Периодически обновляет конфиг и список подписок потокового режима"""
+    global config
+    try:
+        config = await get_config()
+        await sync_streams(await get_tickers())
+        cleanup_signals()
+        await flush_candle_archive()
+        save_signals()
+    except Exception as e:
+        log(f"Ошибка обновления потока: {str(e)} | Traceback: {traceback.format_exc()}", level="ERROR")
 
 
 # === ФУНКЦИЯ ОСТАВЛЕНА, НО НЕ ИСПОЛЬЗУЕТСЯ ===
@@ -132,36 +458,84 @@ async def run_monitor():
 #         log(f"Ошибка отправки подтверждения для {symbol}: {e}")
 
 
-async def reload_bot(app):
-    """Reload config and reschedule jobs"""
-    global config
-    log("Перезагрузка бота...")
-    scheduler.remove_all_jobs()
-    config = await load_config()
-    # Update log level
-    logger.setLevel(getattr(logging, config.get('log_level', 'INFO').upper(), logging.INFO))
-    for handler in logger.handlers:
-        handler.setLevel(getattr(logging, config.get('log_level', 'INFO').upper(), logging.INFO))
-    scheduler.add_job(run_monitor, 'interval', seconds=60, misfire_grace_time=30)
-    scheduler.start()
-    log("Бот перезапущен")
+async def stop_stream():
+    for current in streams.values():
+        await current.stop()
+    streams.clear()
 
 
-async def main():
+async def persist_state():
+    """Сохранение закрытых свечей и состояния сигналов при остановке"""
+    await flush_candle_archive()
+    save_signals()
+
+
+async def start_bot(runtime):
+    """Открывает ресурсы бота по порядку; при остановке runtime закрывает их в обратном"""
+    global config, shard_pool
+    start_logging()
+    config = await get_config()
+    configure_logging(config)
+    runtime.drain_timeout = config.get('shutdown_timeout', 30)
     app = ApplicationBuilder().token(config['telegram_token']).build()
     app.add_handler(CommandHandler('start', start))
     app.add_handler(CommandHandler('test', test_telegram))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(CallbackQueryHandler(toggle_indicator))
 
-    scheduler.add_job(run_monitor, 'interval', seconds=60, misfire_grace_time=30)
-    scheduler.start()
-    log("Бот запущен. Используй /start или /test в Telegram.")
+    await init_client(config)
+    runtime.stack.push_async_callback(close_client)
+    await load_candle_archive(config)
+    signal_state.configure(config)
+    loaded = signal_state.load()
+    if loaded:
+        log(f"Восстановлено {loaded} недавних сигналов", level="INFO")
+    runtime.stack.push_async_callback(persist_state)
+    start_chart_pool(config)
+    runtime.stack.callback(stop_chart_pool)
+    start_analysis_pool(config)
+    runtime.stack.callback(stop_analysis_pool)
+    start_delivery(await get_bot(config['telegram_token']), config)
+    runtime.stack.push_async_callback(stop_delivery)
+    metrics_runner = await metrics.start_metrics_server(config)
+    if metrics_runner is not None:
+        runtime.stack.push_async_callback(metrics_runner.cleanup)
+    runtime.spawn(metrics.monitor_loop_lag(), 'loop_lag')
+    if config.get('shard_workers', 0) > 1:
+        if config.get('ingest_mode', 'rest') == 'stream':
+            log("shard_workers не используется в потоковом режиме", level="WARNING")
+        else:
+            shard_pool = ShardPool(config['shard_workers'], shard_worker, deliver_signal, config_service.path)
+            await shard_pool.start()
+            runtime.stack.push_async_callback(shard_pool.stop)
+    if config.get('ingest_mode', 'rest') == 'stream':
+        await sync_streams(await get_tickers())
+        runtime.stack.push_async_callback(stop_stream)
+        runtime.every('refresh_stream', interval_schedule(lambda: config.get('cache_duration', 300)), refresh_stream)
+    elif config.get('scan_schedule', 'interval') == 'candle_close':
+        # Скан через scan_close_delay_ms после закрытия каждой свечи; между закрытиями — только горячие символы
+        delay = lambda: config.get('scan_close_delay_ms', 300) / 1000
+        runtime.every('scan', candle_schedule(lambda: config['timeframe'], delay), run_monitor)
+        if config.get('hot_scan_interval', 0):
+            runtime.every('hot_scan', hot_schedule(lambda: config['hot_scan_interval'], lambda: config['timeframe'], delay),
+                          run_hot_scan)
+    else:
+        runtime.every('scan', interval_schedule(lambda: config.get('scan_interval', 60)), run_monitor)
 
     await app.initialize()
+    runtime.stack.push_async_callback(app.shutdown)
     await app.start()
+    runtime.stack.push_async_callback(app.stop)
     await app.updater.start_polling(allowed_updates=['message', 'callback_query'])
-    await asyncio.Event().wait()
+    runtime.stack.push_async_callback(app.updater.stop)
+    log("Бот запущен. Используй /start или /test в Telegram.")
+
+
+async def main():
+    try:
+        await Runtime().run(start_bot)
+    finally:
+        stop_logging()  # Дописать очередь логов, включая записи об остановке
 
 
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+"""
+Анализ свечей вне event loop.
+
+analyze() — синхронный расчёт TA-Lib и pandas; внутри корутины он задерживает все
+HTTP-ответы и обновления Telegram на время расчёта. Здесь он выполняется в пуле:
+analysis_executor = 'thread' (по умолчанию; TA-Lib и NumPy отпускают GIL),
+'process' (отдельные процессы, без общего GIL) или 'none' (в event loop, как раньше);
+размер пула — analysis_workers.
+
+AnalysisStage связывает загрузку свечей и анализ: загруженные символы ставятся в
+ограниченную очередь и уходят в пул пакетами до analysis_batch_size символов, в
+работе не больше analysis_max_batches пакетов. Если анализ не успевает, очередь
+заполняется и загрузка ждёт — обратное давление на этап загрузки. Пакет собирается
+из того, что уже лежит в очереди, поэтому при малой нагрузке символ уходит в анализ
+сразу, а под нагрузкой пакеты растут и накладные расходы пула делятся на много символов.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from monitor import metrics
+from monitor.analyzer import analyze
+from monitor.logger import log, logger, forward_logging, forward_target
+from monitor.settings import thaw
+
+analysis_pool = None
+pool_kind = 'none'
+
+
+def _warmup():
+    return True
+
+
+def _analyze_batch(items, config):
+    """Точка входа в пуле: [(символ, свечи)] → [результат analyze]"""
+    return [analyze(df, config, symbol=symbol) for symbol, df in items]
+
+
+def analysis_enabled():
+    return analysis_pool is not None
+
+
+def start_analysis_pool(config):
+    """Запускает пул анализа по analysis_executor и analysis_workers"""
+    global analysis_pool, pool_kind
+    kind = config.get('analysis_executor', 'thread')
+    workers = config.get('analysis_workers', 2)
+    if analysis_pool is not None or kind == 'none' or workers <= 0:
+        return
+    if kind == 'process':
+        analysis_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=forward_logging, initargs=(forward_target(), logger.level))
+        for _ in range(workers):
+            analysis_pool.submit(_warmup)  # Импорт TA-Lib и pandas в воркерах до первого скана
+    else:
+        analysis_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analyze')
+    pool_kind = kind
+    log(f"Пул анализа запущен: {kind}, {workers} воркеров", level="info")
+
+
+def stop_analysis_pool():
+    global analysis_pool, pool_kind
+    if analysis_pool is not None:
+        analysis_pool.shutdown(wait=False, cancel_futures=True)
+        analysis_pool = None
+        pool_kind = 'none'
+        log("Пул анализа остановлен", level="info")
+
+
+async def run_analysis(func, *args, config):
+    """
+    func(*args, config) в пуле анализа или, без пула, в текущем потоке.
+    В процессы уходит изменяемая копия конфигурации: снимок ConfigService не сериализуется.
+    """
+    if analysis_pool is None:
+        return func(*args, config)
+    if pool_kind == 'process':
+        config = thaw(config)
+    return await asyncio.get_running_loop().run_in_executor(analysis_pool, func, *args, config)
+
+
+class AnalysisStage:
+    """
+    Этап анализа между загрузкой свечей и проверкой сигналов.
+    put() ставит символ в очередь (ждёт, если очередь полна); run() собирает пакеты,
+    анализирует их в пуле и вызывает on_result(symbol, df, result, frames) в event loop
+    по мере готовности; close() дожидается всех поставленных символов.
+    """
+
+    def __init__(self, config, on_result):
+        self.config = config
+        self.on_result = on_result
+        self.batch_size = max(1, config.get('analysis_batch_size', 16))
+        self.max_batches = max(1, config.get('analysis_max_batches', config.get('analysis_workers', 2) * 2))
+        self.queue = asyncio.Queue(maxsize=self.batch_size * self.max_batches)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    async def put(self, symbol, df, frames=None):
+        await self.queue.put((symbol, df, frames))
+
+    async def close(self):
+        await self.queue.put(None)
+        await self._task
+
+    async def run(self):
+        slots = asyncio.Semaphore(self.max_batches)
+        tasks = set()
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            await slots.acquire()
+            task = asyncio.create_task(self._analyze(batch, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+    async def _analyze(self, batch, slots):
+        try:
+            with metrics.analyze_batch_seconds.time():
+                results = await run_analysis(_analyze_batch, [(symbol, df) for symbol, df, _ in batch],
+                                             config=self.config)
+        except Exception as e:
+            log(f"Ошибка анализа пакета ({len(batch)} символов): {e!r}", level="error")
+            metrics.errors_total.inc(stage='analyze')
+            return
+        finally:
+            slots.release()
+        for (symbol, df, frames), result in zip(batch, results):
+            try:
+                await self.on_result(symbol, df, result, frames)
+            except Exception as e:
+                log(f"Ошибка обработки {symbol}: {str(e)}", level="error")
+                metrics.errors_total.inc(stage='process')
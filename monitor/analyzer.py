@@ -3,39 +3,254 @@ import numpy as np
 import talib
 from monitor.logger import log
 
+DEFAULT_INDICATORS = {
+    "price_change": True,
+    "rsi": True,
+    "macd": True,
+    "volume_surge": True,
+    "bollinger": True,
+    "adx": True,
+    "rsi_macd_divergence": True,
+    "candle_patterns": True,
+    "volume_pre_surge": True,
+    "ema_crossover": True,
+    "obv": True
+}
+
+# Дивергенция: два последних локальных экстремума close за DIVERGENCE_WINDOW баров;
+# экстремум — минимум/максимум среди PIVOT_ORDER баров с каждой стороны,
+# последний из них — на одной из PIVOT_RECENT самых поздних позиций, где экстремум уже подтверждён
+DIVERGENCE_WINDOW = 30
+PIVOT_ORDER = 2
+PIVOT_RECENT = 3
+OBV_PERIOD = 10  # Баров для наклона OBV
+OBV_SLOPE = 0.5  # Порог наклона OBV в средних объёмах бара за бар
+RAMP_BARS = 3  # Объём растёт RAMP_BARS баров подряд
+RAMP_BASE = 20  # ... и в среднем в RAMP_RATIO раз выше RAMP_BASE баров перед ростом
+RAMP_RATIO = 1.5
+PATTERN_BARS = DIVERGENCE_WINDOW  # Хвост свечей, которого хватает всем индикаторам ниже (CDLHAMMER — 11 баров)
+_SIDES = np.array([1.0, -1.0])[:, None, None]  # Минимумы и максимумы в divergence
+_DIRECTIONS = np.array([-1.0, 1.0, 1.0])[:, None, None] * _SIDES[:, 0]  # Цена против RSI и MACD: (3, 2, 1)
+_OBV_TIME = np.arange(OBV_PERIOD) - (OBV_PERIOD - 1) / 2
+_OBV_WEIGHTS = _OBV_TIME / (_OBV_TIME @ _OBV_TIME)  # Наклон МНК — скалярное произведение с этими весами
+
+
+def _columns(x):
+    """(T,) или (T, N) → (T, N): индикаторы ниже считаются по оси времени сразу для N символов"""
+    x = np.asarray(x, dtype=np.float64)
+    return x.reshape(len(x), -1)
+
+
+def divergence(close, rsi_values, macd_line):
+    """
+    Дивергенция цены с RSI и линией MACD на двух последних экстремумах close.
+    Бычья: цена обновляет минимум, а RSI и MACD в этих точках выше, чем на прошлом минимуме;
+    медвежья — то же на максимумах. Возвращает векторы (бычья, медвежья) длины N.
+    """
+    series = np.stack([_columns(x)[-DIVERGENCE_WINDOW:] for x in (close, rsi_values, macd_line)])
+    price = series[0] * _SIDES  # Максимумы ищутся как минимумы цены с обратным знаком: (2, T, N)
+    n = price.shape[1] - 2 * PIVOT_ORDER
+    center = price[:, PIVOT_ORDER:PIVOT_ORDER + n]
+    pivots = center <= price[:, :n]
+    for j in range(1, 2 * PIVOT_ORDER + 1):
+        if j != PIVOT_ORDER:
+            pivots &= center <= price[:, j:j + n]
+    last = n - 1 - pivots[:, ::-1].argmax(axis=1)
+    earlier = pivots & (np.arange(n)[:, None] < last[:, None])
+    prev = n - 1 - earlier[:, ::-1].argmax(axis=1)
+    found = pivots[:, -PIVOT_RECENT:].any(axis=1) & earlier.any(axis=1)
+    cols = np.arange(price.shape[2])
+    change = series[:, last + PIVOT_ORDER, cols] - series[:, prev + PIVOT_ORDER, cols]  # (3, 2, N)
+    return tuple(found & (change * _DIRECTIONS > 0).all(axis=0))
+
+
+def candle_patterns(open_, high, low, close):
+    """
+    CDLHAMMER и CDLSHOOTINGSTAR на последнем баре: векторы (hammer, shooting star) длины N.
+    Для одного символа (массивы (T,)) — сам TA-Lib, для (T, N) — его формулы с настройками
+    свечей по умолчанию.
+    """
+    if np.ndim(close) == 1:
+        o, h, l, c = (np.ascontiguousarray(x[-PATTERN_BARS:], dtype=np.float64) for x in (open_, high, low, close))
+        return talib.CDLHAMMER(o, h, l, c)[-1:] != 0, talib.CDLSHOOTINGSTAR(o, h, l, c)[-1:] != 0
+    o, h, l, c = (_columns(x)[-11:] for x in (open_, high, low, close))
+    body = np.abs(c - o)
+    hl = h - l
+    top, bottom = np.maximum(o, c), np.minimum(o, c)
+    upper, lower = h - top, bottom - l
+    body_short = body[:-1].sum(axis=0) / 10  # BodyShort: тело, 10 баров
+    very_short = 0.1 * hl[:-1].sum(axis=0) / 10  # ShadowVeryShort: диапазон, 10 баров, 0.1
+    near = 0.2 * hl[-7:-2].sum(axis=0) / 5  # Near для прошлого бара: диапазон, 5 баров, 0.2
+    small = body[-1] < body_short
+    hammer = small & (lower[-1] > body[-1]) & (upper[-1] < very_short) & (bottom[-1] <= l[-2] + near)
+    star = small & (upper[-1] > body[-1]) & (lower[-1] < very_short) & (top[-2] < bottom[-1])
+    return hammer, star
+
+
+def ema_cross(macd_line):
+    """Пересечение EMA12 и EMA26 на последнем баре: линия MACD — их разность, она меняет знак"""
+    line = _columns(macd_line)
+    return (line[-1] > 0) & (line[-2] <= 0), (line[-1] < 0) & (line[-2] >= 0)
+
+
+def obv_slope(close, volume):
+    """
+    Наклон OBV (МНК) за OBV_PERIOD баров в средних объёмах бара: от -1 до 1.
+    Наклон не зависит от начального значения OBV, поэтому хватает хвоста свечей.
+    """
+    close, volume = _columns(close)[-OBV_PERIOD - 1:], _columns(volume)[-OBV_PERIOD:]
+    obv = np.cumsum(np.sign(close[1:] - close[:-1]) * volume, axis=0)
+    slope = _OBV_WEIGHTS @ obv * OBV_PERIOD
+    total = volume.sum(axis=0)
+    return np.divide(slope, total, out=np.zeros_like(slope), where=total > 0)
+
+
+def volume_ramp(volume):
+    """Объём растёт RAMP_BARS баров подряд и в среднем в RAMP_RATIO раз выше базы перед ростом"""
+    volume = _columns(volume)[-RAMP_BARS - RAMP_BASE:]
+    ramp = volume[-RAMP_BARS - 1:]
+    rising = (ramp[1:] > ramp[:-1]).all(axis=0)
+    base = volume[:RAMP_BASE].sum(axis=0) / RAMP_BASE
+    return rising & (ramp[1:].sum(axis=0) / RAMP_BARS > RAMP_RATIO * base)
+
+
+def summarize(info, triggered, values, indicators, config, symbol="Unknown"):
+    """
+    Итог анализа по списку сработавших индикаторов: проверка минимума и обязательных,
+    тип сигнала (pump/dump), комментарий и отладочная строка.
+    Общая часть для analyze и пакетного движка monitor.batch.
+    """
+    price_change = values['price_change']
+    rsi = values['rsi']
+    macd_cross = values['macd_cross']
+    macd_bear = values['macd_bear']
+    vol_surge = values['vol_surge']
+    adx = values['adx']
+    bullish_divergence = values['bullish_divergence']
+    bearish_divergence = values['bearish_divergence']
+    bullish_candle = values['bullish_candle']
+    bearish_candle = values['bearish_candle']
+    volume_pre_surge = values['volume_pre_surge']
+    ema_cross_up = values['ema_cross_up']
+    ema_cross_down = values['ema_cross_down']
+    obv_rising = values['obv_rising']
+    obv_falling = values['obv_falling']
+
+    count_triggered = len(triggered)
+    total_indicators = sum(indicators.values())
+    info['count_triggered'] = count_triggered
+    info['total_indicators'] = total_indicators
+
+    # Проверка минимального количества и обязательных индикаторов
+    required = config.get('required_indicators', [])
+    min_ind = config.get('min_indicators', 1)
+    all_required = all(r in triggered for r in required)
+    is_signal = all_required and count_triggered >= min_ind
+
+    # Определение типа сигнала (pump/dump)
+    signal_type = ""
+    if is_signal:
+        if price_change > config['price_change_threshold']:
+            signal_type = "pump"
+        elif price_change < -config['price_change_threshold']:
+            signal_type = "dump"
+    info['type'] = signal_type
+
+    # Комментарий
+    comment_parts = []
+    if indicators.get('rsi', True):
+        comment_parts.append(f"RSI={rsi:.1f}" if not pd.isna(rsi) else "RSI=NaN")
+    if indicators.get('macd', True):
+        comment_parts.append(f"MACD={'бычий' if macd_cross else 'медвежий' if macd_bear else 'нейтральный'}")
+    if indicators.get('volume_surge', True):
+        comment_parts.append(f"объём x{vol_surge:.2f}" if not pd.isna(vol_surge) else "объём=NaN")
+    if indicators.get('adx', True):
+        comment_parts.append(f"ADX={adx:.1f}" if not pd.isna(adx) else "ADX=NaN")
+    if indicators.get('rsi_macd_divergence', True):
+        comment_parts.append(f"Дивергенция={'бычья' if bullish_divergence else 'медвежья' if bearish_divergence else 'нет'}")
+    if indicators.get('candle_patterns', True):
+        comment_parts.append(f"Свечной паттерн={'Hammer' if bullish_candle else 'Shooting Star' if bearish_candle else 'нет'}")
+    if indicators.get('volume_pre_surge', True):
+        comment_parts.append(f"Рост объёма={'да' if volume_pre_surge else 'нет'}")
+    if indicators.get('ema_crossover', True):
+        comment_parts.append(f"EMA Crossover={'бычий' if ema_cross_up else 'медвежий' if ema_cross_down else 'нет'}")
+    if indicators.get('obv', True):
+        comment_parts.append(f"OBV={'растёт' if obv_rising else 'падает' if obv_falling else 'стабилен'}")
+    info["comment"] = ", ".join(comment_parts) if comment_parts else "Нет активных индикаторов"
+
+    # Детали для логов
+    if not signal_type:
+        if 'debug' not in info:
+            info['debug'] = f"Нет сигнала для {symbol}"
+    else:
+        info['debug'] = f"Сигнал сгенерирован для {symbol}: {signal_type}, сработало {count_triggered} из {total_indicators}"
+
+    return bool(signal_type), info
+
+
 def analyze(df, config, symbol="Unknown"):
+    info, triggered, values = evaluate(df, config, symbol)
+    if triggered is None:
+        return False, info
+    indicators = config.get('indicators_enabled', DEFAULT_INDICATORS)
+    return summarize(info, triggered, values, indicators, config, symbol)
+
+
+def confirm(result, frames, config, symbol="Unknown"):
+    """
+    Подтверждение сигнала на старших таймфреймах по config['confirm_timeframes']
+    ({таймфрейм: [индикаторы]}): каждый перечисленный индикатор должен сработать
+    на свечах своего таймфрейма из frames, иначе сигнал снимается.
+    """
+    rules = config.get('confirm_timeframes') or {}
+    is_signal, info = result
+    if not is_signal or not rules:
+        return result
+    confirmed, failed = [], []
+    for timeframe, names in rules.items():
+        df = frames.get(timeframe)
+        triggered = None
+        if df is not None and not df.empty:
+            tf_config = {**config, 'indicators_enabled': {name: name in names for name in DEFAULT_INDICATORS}}
+            _, triggered, _ = evaluate(df, tf_config, symbol)
+        for name in names:
+            (confirmed if triggered is not None and name in triggered else failed).append(f"{name}@{timeframe}")
+    info['confirmed'] = confirmed
+    if failed:
+        info['type'] = ''
+        info['debug'] = f"Сигнал {symbol} не подтверждён на старших таймфреймах: {', '.join(failed)}"
+        return False, info
+    info['comment'] += f", подтверждено: {', '.join(confirmed)}"
+    return True, info
+
+
+def evaluate(df, config, symbol="Unknown"):
+    """
+    Индикаторы по свечам df: (info, список сработавших, значения для summarize).
+    Если свечей мало или в данных NaN — (info, None, None).
+    """
     info = {}
     if len(df) < 50:
         info['debug'] = f"Внимание: для анализа {symbol} доступно только {len(df)} свечей (менее 50)"
-        return False, info
+        return info, None, None
     elif len(df) < 200:
         info['debug'] = f"Внимание: для анализа {symbol} доступно {len(df)} свечей (менее 200, требуется для обычных монет)"
 
-    df = df.copy() if any(config.get('indicators_enabled', {}).values()) else df
-    df['close'] = df['close'].astype(float)
-    df['volume'] = df['volume'].astype(float)
-    df['high'] = df['high'].astype(float)
-    df['low'] = df['low'].astype(float)
+    # Столбцы как float64-массивы: для свечей из CandleBuffer это представления без копирования
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
 
     # Проверка данных на NaN
-    if df['close'].isna().any() or df['high'].isna().any() or df['low'].isna().any() or df['volume'].isna().any():
+    if np.isnan(open_).any() or np.isnan(close).any() or np.isnan(high).any() or np.isnan(low).any() or \
+            np.isnan(volume).any():
         log(f"Ошибка: DataFrame для {symbol} содержит NaN значения", level="error")
         info['debug'] = f"Ошибка: DataFrame содержит NaN значения"
-        return False, info
+        return info, None, None
 
-    indicators = config.get('indicators_enabled', {
-        "price_change": True,
-        "rsi": True,
-        "macd": True,
-        "volume_surge": True,
-        "bollinger": True,
-        "adx": True,
-        "rsi_macd_divergence": True,
-        "candle_patterns": True,
-        "volume_pre_surge": True,
-        "ema_crossover": True,
-        "obv": True
-    })
+    indicators = config.get('indicators_enabled', DEFAULT_INDICATORS)
 
     # Инициализация переменных
     rsi = np.nan
@@ -57,26 +272,29 @@ def analyze(df, config, symbol="Unknown"):
     obv_trend = np.nan
     obv_rising = False
     obv_falling = False
+    rsi_values = None
+    macd_line = None
 
-    price_change = (df['close'].iloc[-1] - df['close'].iloc[-2]) / df['close'].iloc[-2] * 100 if len(df) > 1 else 0
+    price_change = (close[-1] - close[-2]) / close[-2] * 100 if len(close) > 1 else 0
 
     # RSI (14)
     if indicators.get('rsi', True) or indicators.get('rsi_macd_divergence', True):
         try:
-            df['rsi'] = talib.RSI(df['close'], timeperiod=14)
-            rsi = df['rsi'].iloc[-1]
+            rsi_values = talib.RSI(close, timeperiod=14)
+            rsi = rsi_values[-1]
             info['rsi'] = rsi
         except Exception as e:
             log(f"Ошибка расчёта RSI для {symbol}: {e}", level="error")
 
-    # MACD
-    if indicators.get('macd', True) or indicators.get('rsi_macd_divergence', True):
+    # MACD; линия MACD — разность EMA12 и EMA26, она же нужна для EMA Crossover
+    if indicators.get('macd', True) or indicators.get('rsi_macd_divergence', True) or \
+            indicators.get('ema_crossover', True):
         try:
-            df['macd'], df['signal'], df['macd_hist'] = talib.MACD(df['close'], fastperiod=12, slowperiod=26, signalperiod=9)
-            macd = df['macd'].iloc[-1]
-            macd_prev = df['macd'].iloc[-2]
-            signal = df['signal'].iloc[-1]
-            signal_prev = df['signal'].iloc[-2]
+            macd_line, signal_line, _ = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
+            macd = macd_line[-1]
+            macd_prev = macd_line[-2]
+            signal = signal_line[-1]
+            signal_prev = signal_line[-2]
             macd_cross = (macd > signal) and (macd_prev <= signal_prev)
             macd_bear = (macd < signal) and (macd_prev >= signal_prev)
             info['macd'] = macd
@@ -86,12 +304,12 @@ def analyze(df, config, symbol="Unknown"):
     # Bollinger Bands
     if indicators.get('bollinger', True):
         try:
-            if len(df) >= 20:  # Проверяем, достаточно ли данных для Bollinger Bands
-                df['upper'], df['sma20'], df['lower'] = talib.BBANDS(df['close'], timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-                sma20 = df['sma20'].iloc[-1]
-                upper = df['upper'].iloc[-1]
-                lower = df['lower'].iloc[-1]
-                info['bollinger'] = 'upper' if df['close'].iloc[-1] > upper else 'lower' if df['close'].iloc[-1] < lower else 'inside'
+            if len(close) >= 20:  # Проверяем, достаточно ли данных для Bollinger Bands
+                upper_band, middle_band, lower_band = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+                sma20 = middle_band[-1]
+                upper = upper_band[-1]
+                lower = lower_band[-1]
+                info['bollinger'] = 'upper' if close[-1] > upper else 'lower' if close[-1] < lower else 'inside'
             else:
                 log(f"Недостаточно данных для Bollinger Bands для {symbol}: {len(df)} свечей", level="warning")
         except Exception as e:
@@ -100,8 +318,8 @@ def analyze(df, config, symbol="Unknown"):
     # Volume Surge
     if indicators.get('volume_surge', True):
         try:
-            vol_avg = df['volume'].rolling(window=20).mean().iloc[-1]
-            vol_surge = df['volume'].iloc[-1] / vol_avg if vol_avg != 0 else np.nan
+            vol_avg = volume[-20:].mean() if len(volume) >= 20 else np.nan
+            vol_surge = volume[-1] / vol_avg if vol_avg != 0 else np.nan
             info['volume_surge'] = vol_surge
         except Exception as e:
             log(f"Ошибка расчёта Volume Surge для {symbol}: {e}", level="error")
@@ -109,25 +327,55 @@ def analyze(df, config, symbol="Unknown"):
     # ADX
     if indicators.get('adx', True):
         try:
-            df['adx'] = talib.ADX(df['high'], df['low'], df['close'], timeperiod=14)
-            adx = df['adx'].iloc[-1]
+            adx = talib.ADX(high, low, close, timeperiod=14)[-1]
             info['adx'] = adx
         except Exception as e:
             log(f"Ошибка расчёта ADX для {symbol}: {e}", level="error")
 
-    # RSI-MACD Divergence
+    # RSI-MACD Divergence: по уже посчитанным рядам RSI и MACD
     if indicators.get('rsi_macd_divergence', True):
         try:
-            last_close = df['close'].iloc[-1]
-            prev_close = df['close'].iloc[-2]
-            last_rsi = rsi
-            prev_rsi = df['rsi'].iloc[-2]
-            # ... (оставшаяся часть кода для дивергенции)
-            # (здесь код обрезан в исходном файле, предполагается, что он остался без изменений)
+            bullish, bearish = divergence(close, rsi_values, macd_line)
+            bullish_divergence, bearish_divergence = bool(bullish[0]), bool(bearish[0])
+            info['rsi_macd_divergence'] = 'bullish' if bullish_divergence else 'bearish' if bearish_divergence else 'none'
         except Exception as e:
             log(f"Ошибка расчёта дивергенции RSI-MACD для {symbol}: {e}", level="error")
 
-    # ... (оставшаяся часть кода для других индикаторов, предполагается, что она осталась без изменений)
+    # Свечные паттерны: Hammer и Shooting Star на последней свече
+    if indicators.get('candle_patterns', True):
+        try:
+            hammer, star = candle_patterns(open_, high, low, close)
+            bullish_candle, bearish_candle = bool(hammer[0]), bool(star[0])
+            info['bullish_candle'], info['bearish_candle'] = bullish_candle, bearish_candle
+        except Exception as e:
+            log(f"Ошибка расчёта свечных паттернов для {symbol}: {e}", level="error")
+
+    # Рост объёма перед всплеском
+    if indicators.get('volume_pre_surge', True):
+        try:
+            volume_pre_surge = bool(volume_ramp(volume)[0])
+            info['volume_pre_surge'] = volume_pre_surge
+        except Exception as e:
+            log(f"Ошибка расчёта роста объёма для {symbol}: {e}", level="error")
+
+    # EMA Crossover (12/26)
+    if indicators.get('ema_crossover', True):
+        try:
+            cross_up, cross_down = ema_cross(macd_line)
+            ema_cross_up, ema_cross_down = bool(cross_up[0]), bool(cross_down[0])
+            info['ema_cross_up'], info['ema_cross_down'] = ema_cross_up, ema_cross_down
+        except Exception as e:
+            log(f"Ошибка расчёта EMA Crossover для {symbol}: {e}", level="error")
+
+    # OBV
+    if indicators.get('obv', True):
+        try:
+            obv_trend = float(obv_slope(close, volume)[0])
+            obv_rising = bool(obv_trend > OBV_SLOPE)
+            obv_falling = bool(obv_trend < -OBV_SLOPE)
+            info['obv_trend'] = obv_trend
+        except Exception as e:
+            log(f"Ошибка расчёта OBV для {symbol}: {e}", level="error")
 
     # Подсчёт сработавших индикаторов
     triggered = []
@@ -143,7 +391,7 @@ def analyze(df, config, symbol="Unknown"):
         triggered.append('bollinger')
     if indicators.get('adx', True) and not pd.isna(adx) and adx > 25:
         triggered.append('adx')
-    if indicators.get('rsi_macd_divergence', True) and info.get('rsi_macd_divergence') != 'none':
+    if indicators.get('rsi_macd_divergence', True) and (bullish_divergence or bearish_divergence):
         triggered.append('rsi_macd_divergence')
     if indicators.get('candle_patterns', True) and (bullish_candle or bearish_candle):
         triggered.append('candle_patterns')
@@ -154,53 +402,22 @@ def analyze(df, config, symbol="Unknown"):
     if indicators.get('obv', True) and (obv_rising or obv_falling):
         triggered.append('obv')
 
-    count_triggered = len(triggered)
-    total_indicators = sum(indicators.values())
-    info['count_triggered'] = count_triggered
-    info['total_indicators'] = total_indicators
-
-    # Проверка минимального количества и обязательных индикаторов
-    required = config.get('required_indicators', [])
-    min_ind = config.get('min_indicators', 1)
-    all_required = all(r in triggered for r in required)
-    is_signal = all_required and count_triggered >= min_ind
-
-    # Определение типа сигнала (pump/dump)
-    signal_type = ""
-    if is_signal:
-        if price_change > config['price_change_threshold']:
-            signal_type = "pump"
-        elif price_change < -config['price_change_threshold']:
-            signal_type = "dump"
-    info['type'] = signal_type
-
-    # Комментарий
-    comment_parts = []
-    if indicators.get('rsi', True):
-        comment_parts.append(f"RSI={rsi:.1f}" if not pd.isna(rsi) else "RSI=NaN")
-    if indicators.get('macd', True):
-        comment_parts.append(f"MACD={'бычий' if macd_cross else 'медвежий' if macd_bear else 'нейтральный'}")
-    if indicators.get('volume_surge', True):
-        comment_parts.append(f"объём x{vol_surge:.2f}" if not pd.isna(vol_surge) else "объём=NaN")
-    if indicators.get('adx', True):
-        comment_parts.append(f"ADX={adx:.1f}" if not pd.isna(adx) else "ADX=NaN")
-    if indicators.get('rsi_macd_divergence', True):
-        comment_parts.append(f"Дивергенция={'бычья' if bullish_divergence else 'медвежья' if bearish_divergence else 'нет'}")
-    if indicators.get('candle_patterns', True):
-        comment_parts.append(f"Свечной паттерн={'Hammer' if bullish_candle else 'Shooting Star' if bearish_candle else 'нет'}")
-    if indicators.get('volume_pre_surge', True):
-        comment_parts.append(f"Рост объёма={'да' if volume_pre_surge else 'нет'}")
-    if indicators.get('ema_crossover', True):
-        comment_parts.append(f"EMA Crossover={'бычий' if ema_cross_up else 'медвежий' if ema_cross_down else 'нет'}")
-    if indicators.get('obv', True):
-        comment_parts.append(f"OBV={'растёт' if obv_rising else 'падает' if obv_falling else 'стабилен'}")
-    info["comment"] = ", ".join(comment_parts) if comment_parts else "Нет активных индикаторов"
-
-    # Детали для логов
-    if not signal_type:
-        if 'debug' not in info:
-            info['debug'] = f"Нет сигнала для {symbol}"
-    else:
-        info['debug'] = f"Сигнал сгенерирован для {symbol}: {signal_type}, сработало {count_triggered} из {total_indicators}"
-
-    return bool(signal_type), info
\ No newline at end of file
+    values = {
+        'price_change': price_change,
+        'rsi': rsi,
+        'macd_cross': macd_cross,
+        'macd_bear': macd_bear,
+        'vol_surge': vol_surge,
+        'adx': adx,
+        'bullish_divergence': bullish_divergence,
+        'bearish_divergence': bearish_divergence,
+        'bullish_candle': bullish_candle,
+        'bearish_candle': bearish_candle,
+        'volume_pre_surge': volume_pre_surge,
+        'ema_cross_up': ema_cross_up,
+        'ema_cross_down': ema_cross_down,
+        'obv_trend': obv_trend,
+        'obv_rising': obv_rising,
+        'obv_falling': obv_falling
+    }
+    return info, triggered, values
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Бэктест конфигураций на записанной истории свечей.
+
+    python -m monitor.backtest record --days 30 [--symbols BTCUSDT ETHUSDT] [--timeframe 1m]
+    python -m monitor.backtest run --variant '{"min_indicators": 3}' --variant variants.json [--workers 8]
+
+Для каждого бара истории берётся окно из последних `window` свечей — как в живом
+боте, где analyze получает 200 последних свечей, — и проверяются условия сигнала.
+Окна одного символа строятся через sliding_window_view и считаются пакетом в
+monitor.batch (результат совпадает с analyze), символы распределяются по
+процессам. Индикаторы считаются один раз на окно, варианты конфигурации
+отличаются только проверкой условий. Отправка эмулирует дедупликацию бота:
+повторный сигнал по символу проходит, только если сработало больше индикаторов
+или прошёл SIGNAL_TTL с прошлой отправки.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from monitor.analyzer import DEFAULT_INDICATORS
+from monitor.batch import FULL_BARS, compute_batch, trigger_matrix, signal_vectors
+from monitor.candles import TIMEFRAME_MS
+from monitor.exchanges import resolve
+from monitor.fetcher import init_client, close_client, get_client, get_all_futures_tickers
+from monitor.history import HistoryStore
+from monitor.logger import log, logger, start_logging, forward_logging, forward_target
+from monitor.settings import load_config
+
+DEFAULT_HISTORY_DIR = os.path.join('data', 'history')
+DEFAULT_HORIZONS = (5, 15, 60)
+SIGNAL_TTL = 3600  # Как cleanup_signals в bot.py
+CHUNK = 2048
+
+
+def load_variants(specs, base):
+    """Варианты из JSON-строк или файлов (объект или список объектов) поверх базовой конфигурации"""
+    variants = []
+    for spec in specs or ['{}']:
+        if os.path.exists(spec):
+            with open(spec, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+        else:
+            overrides = json.loads(spec)
+        for override in overrides if isinstance(overrides, list) else [overrides]:
+            override = dict(override)
+            name = override.pop('name', None) or (json.dumps(override, ensure_ascii=False) if override else 'base')
+            variants.append((name, {**base, **override}))
+    return variants
+
+
+def _dedup(indices, counts, timestamps, ttl_ms):
+    """Какие сигналы бот отправил бы: новый символ, больше индикаторов или истёк TTL"""
+    sent = np.zeros(len(indices), dtype=bool)
+    prev_count, prev_time = 0, None
+    for k, (i, count) in enumerate(zip(indices, counts)):
+        ts = timestamps[i]
+        if prev_time is not None and ts - prev_time > ttl_ms:
+            prev_time = None
+        if prev_time is None or count > prev_count:
+            sent[k] = True
+            prev_count, prev_time = count, ts
+    return sent
+
+
+def replay_symbol(root, symbol, timeframe, start, end, variants, window=FULL_BARS,
+                  horizons=DEFAULT_HORIZONS, chunk=CHUNK, ttl=SIGNAL_TTL):
+    """
+    Прогон истории одного символа по всем вариантам.
+    Возвращает {имя варианта: {'signals', 'sent', 'pump', 'dump', 'returns': {h: массив}}},
+    где returns — доходности через h баров после отправленных сигналов с учётом направления (в %).
+    """
+    step = TIMEFRAME_MS[timeframe]
+    records = HistoryStore(root).read(symbol, timeframe,
+                                      None if start is None else start - (window - 1) * step, end)
+    n = len(records)
+    found = {name: ([], [], []) for name, _ in variants}
+    if n >= window:
+        ts = np.asarray(records['ts'])
+        close = np.asarray(records['close'])
+        for first in range(window - 1, n, chunk):
+            last = min(first + chunk, n)
+            lo = first - window + 1
+            windows = [sliding_window_view(np.asarray(records[col][lo:last]), window)
+                       for col in ('high', 'low', 'close', 'volume', 'open')]
+            values = compute_batch(*windows[:4], DEFAULT_INDICATORS, open_=windows[4])
+            # Окна с пропусками свечей живой бот бы не увидел
+            contiguous = ts[first:last] - ts[lo:last - window + 1] == (window - 1) * step
+            for name, config in variants:
+                indicators = config.get('indicators_enabled', DEFAULT_INDICATORS)
+                matrix = trigger_matrix(values, indicators, config)
+                count, signal_type = signal_vectors(matrix, values, config)
+                hit = np.flatnonzero((signal_type != 0) & contiguous)
+                found[name][0].append(hit + first)
+                found[name][1].append(count[hit])
+                found[name][2].append(signal_type[hit])
+    else:
+        ts = close = np.empty(0)
+
+    result = {}
+    for name, (idx, counts, types) in found.items():
+        idx = np.concatenate(idx) if idx else np.empty(0, dtype=np.int64)
+        counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+        types = np.concatenate(types) if types else np.empty(0, dtype=np.int64)
+        sent = _dedup(idx, counts, ts, ttl * 1000)
+        idx, types = idx[sent], types[sent]
+        returns = {}
+        for h in horizons:
+            ok = idx + h < n
+            returns[h] = (close[idx[ok] + h] / close[idx[ok]] - 1) * 100 * types[ok]
+        result[name] = {
+            'signals': int(len(sent)),
+            'sent': int(sent.sum()),
+            'pump': int((types == 1).sum()),
+            'dump': int((types == -1).sum()),
+            'returns': returns
+        }
+    return result
+
+
+def run_backtest(root, symbols, timeframe, variants, start=None, end=None, workers=None,
+                 window=FULL_BARS, horizons=DEFAULT_HORIZONS, chunk=CHUNK):
+    """Распределяет символы по процессам и сводит результаты по вариантам"""
+    totals = {name: {'signals': 0, 'sent': 0, 'pump': 0, 'dump': 0, 'symbols': 0,
+                     'returns': {h: [] for h in horizons}} for name, _ in variants}
+    with ProcessPoolExecutor(max_workers=workers, initializer=forward_logging,
+                             initargs=(forward_target(), logger.level)) as pool:
+        futures = {symbol: pool.submit(replay_symbol, root, symbol, timeframe, start, end, variants,
+                                       window, horizons, chunk) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                log(f"Ошибка бэктеста {symbol}: {e}", level="error")
+                continue
+            for name, stats in result.items():
+                total = totals[name]
+                for key in ('signals', 'sent', 'pump', 'dump'):
+                    total[key] += stats[key]
+                total['symbols'] += stats['sent'] > 0
+                for h, returns in stats['returns'].items():
+                    total['returns'][h].append(returns)
+    for total in totals.values():
+        total['returns'] = {h: np.concatenate(parts) if parts else np.empty(0)
+                            for h, parts in total['returns'].items()}
+    return totals
+
+
+def format_report(totals, horizons=DEFAULT_HORIZONS):
+    lines = []
+    header = f"{'вариант':<40}{'сигналы':>9}{'отправлено':>12}{'pump':>7}{'dump':>7}{'символов':>10}"
+    header += ''.join(f"{f'hit@{h}':>9}{f'ret@{h},%':>10}" for h in horizons)
+    lines.append(header)
+    for name, total in totals.items():
+        row = f"{name[:39]:<40}{total['signals']:>9}{total['sent']:>12}{total['pump']:>7}{total['dump']:>7}{total['symbols']:>10}"
+        for h in horizons:
+            returns = total['returns'][h]
+            if len(returns):
+                row += f"{(returns > 0).mean() * 100:>8.1f}%{returns.mean():>10.3f}"
+            else:
+                row += f"{'—':>9}{'—':>10}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+async def record_symbol(store, symbol, timeframe, start_ms, end_ms):
+    """Докачивает закрытые свечи symbol за [start_ms, end_ms) с его биржи страницами по max_kline_limit"""
+    step = TIMEFRAME_MS[timeframe]
+    exchange, native = resolve(symbol)
+    http = await get_client(exchange.name)
+    page = exchange.max_kline_limit
+    last = store.last_timestamp(symbol, timeframe)
+    cursor = max(start_ms, last + step) if last is not None else start_ms
+    end_ms = min(end_ms, int(time.time() * 1000) // step * step)  # Незакрытую свечу не пишем
+    written = 0
+    while cursor < end_ms:
+        page_end = min(end_ms, cursor + page * step) - 1
+        path, params = exchange.kline_request(native, timeframe, page, cursor, page_end)
+        status, data = await http.get(path, params=params, parse=exchange.parse_klines)
+        if status != 200 or not data or 'ts' not in data:
+            log(f"Ошибка загрузки истории {symbol}: HTTP {status}", level="error")
+            break
+        if len(data['ts']):
+            written += store.append(symbol, timeframe, data['ts'], data['ohlcv'])
+        cursor = page_end + 1
+    log(f"История {symbol} {timeframe}: записано {written} свечей", level="info")
+    return written
+
+
+async def record_history(store, symbols, timeframe, start_ms, end_ms, config):
+    """Докачка истории для списка символов через общий клиент и планировщик лимитов"""
+    await init_client(config)
+    try:
+        if not symbols:
+            symbols = await get_all_futures_tickers()
+
+        async def one(symbol):
+            try:
+                return await record_symbol(store, symbol, timeframe, start_ms, end_ms)
+            except Exception as e:
+                log(f"Ошибка записи истории {symbol}: {e}", level="error")
+                return 0
+
+        return sum(await asyncio.gather(*(one(symbol) for symbol in symbols)))
+    finally:
+        await close_client()
+
+
+def _parse_time(value):
+    """Дата ISO (2025-01-31) или миллисекунды → мс"""
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    return int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+def main():
+    start_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('--dir', default=DEFAULT_HISTORY_DIR, help='каталог истории')
+    parser.add_argument('--timeframe', help='по умолчанию — из config.json')
+    parser.add_argument('--symbols', nargs='*', help='по умолчанию — все (record: тикеры после volume_filter)')
+    parser.add_argument('--days', type=float, default=30, help='record: глубина истории в днях')
+    parser.add_argument('--start', help='начало периода (ISO-дата или мс)')
+    parser.add_argument('--end', help='конец периода (ISO-дата или мс)')
+    parser.add_argument('--variant', action='append', help='JSON-объект/список или путь к JSON-файлу')
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию — число CPU)')
+    parser.add_argument('--window', type=int, default=FULL_BARS, help='свечей в окне analyze')
+    parser.add_argument('--horizons', type=int, nargs='*', default=list(DEFAULT_HORIZONS),
+                        help='горизонты доходности в барах')
+    args = parser.parse_args()
+
+    config = asyncio.run(load_config())
+    timeframe = args.timeframe or config['timeframe']
+    store = HistoryStore(args.dir)
+    start, end = _parse_time(args.start), _parse_time(args.end)
+
+    if args.command == 'record':
+        end = end or int(time.time() * 1000)
+        start = start or end - int(args.days * 86_400_000)
+        written = asyncio.run(record_history(store, args.symbols, timeframe, start, end, config))
+        print(f"Записано свечей: {written}")
+        return
+
+    symbols = args.symbols or store.symbols(timeframe)
+    if not symbols:
+        print(f"Нет истории в {os.path.join(args.dir, timeframe)}; сначала выполните record")
+        return
+    variants = load_variants(args.variant, config)
+    started = time.perf_counter()
+    totals = run_backtest(args.dir, symbols, timeframe, variants, start, end, args.workers,
+                          args.window, tuple(args.horizons))
+    print(format_report(totals, tuple(args.horizons)))
+    print(f"\n{len(symbols)} символов, {len(variants)} вариантов за {time.perf_counter() - started:.1f} сек")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Пакетный (векторизованный) анализ сразу для N символов.
+
+Свечи подаются как 2-D массивы NumPy (символы × бары) одинаковой длины.
+Индикаторы считаются по оси времени одним проходом для всех символов сразу,
+поэтому цикл Python идёт по барам, а не по символам: стоимость цикла почти не
+зависит от размера вселенной. Формулы повторяют TA-Lib (RSI, MACD, BBANDS, ADX,
+CDLHAMMER, CDLSHOOTINGSTAR), дивергенция, OBV, EMA Crossover и рост объёма — общие
+с analyze функции monitor.analyzer по хвосту свечей; результат для каждого символа
+совпадает с monitor.analyzer.analyze.
+"""
+import numpy as np
+from monitor.analyzer import (analyze, summarize, DEFAULT_INDICATORS, OBV_SLOPE, candle_patterns, divergence,
+                              ema_cross, obv_slope, volume_ramp)
+from monitor.logger import log
+
+MIN_BARS = 50
+FULL_BARS = 200
+EPSILON = 1e-14  # TA_IS_ZERO
+
+# Порядок столбцов матрицы сработавших индикаторов
+TRIGGER_NAMES = list(DEFAULT_INDICATORS)
+
+BOLLINGER_INSIDE, BOLLINGER_UPPER, BOLLINGER_LOWER = 0, 1, 2
+BOLLINGER_MISSING = -1  # Полосы не посчитаны: как и в analyze, индикатор считается сработавшим, в info его нет
+BOLLINGER_LABELS = {BOLLINGER_INSIDE: 'inside', BOLLINGER_UPPER: 'upper', BOLLINGER_LOWER: 'lower'}
+
+
+def _ema_seeded(x, period, seed_idx):
+    """EMA по оси времени массива (T, N); старт — SMA окна, заканчивающегося на seed_idx (как в TA-Lib)"""
+    out = np.full(x.shape, np.nan)
+    k = 2.0 / (period + 1)
+    prev = x[seed_idx - period + 1:seed_idx + 1].sum(axis=0) / period
+    out[seed_idx] = prev
+    for t in range(seed_idx + 1, len(x)):
+        prev = (x[t] - prev) * k + prev
+        out[t] = prev
+    return out
+
+
+def rsi(close, period=14):
+    """RSI Уайлдера для массива (T, N)"""
+    out = np.full(close.shape, np.nan)
+    if len(close) <= period:
+        return out
+    diff = np.diff(close, axis=0)
+    gain = np.where(diff > 0, diff, 0.0)
+    loss = np.where(diff < 0, -diff, 0.0)
+    avg_gain = gain[:period].sum(axis=0) / period
+    avg_loss = loss[:period].sum(axis=0) / period
+
+    def value(g, l):
+        total = g + l
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(np.abs(total) < EPSILON, 0.0, 100.0 * (g / total))
+
+    out[period] = value(avg_gain, avg_loss)
+    for t in range(period + 1, len(close)):
+        avg_gain = (avg_gain * (period - 1) + gain[t - 1]) / period
+        avg_loss = (avg_loss * (period - 1) + loss[t - 1]) / period
+        out[t] = value(avg_gain, avg_loss)
+    return out
+
+
+def macd(close, fastperiod=12, slowperiod=26, signalperiod=9):
+    """MACD для массива (T, N): линия, сигнальная, гистограмма"""
+    seed = slowperiod - 1
+    start = seed + signalperiod - 1
+    nan = np.full(close.shape, np.nan)
+    if len(close) <= start:
+        return nan, nan.copy(), nan.copy()
+    line = _ema_seeded(close, fastperiod, seed) - _ema_seeded(close, slowperiod, seed)
+    signal = _ema_seeded(line, signalperiod, start)
+    line[:start] = np.nan
+    return line, signal, line - signal
+
+
+def bbands_last(close, period=20, nbdev=2.0):
+    """Полосы Боллинджера (SMA, популяционное σ) только для последнего бара: upper, middle, lower"""
+    window = close[-period:]
+    mean = window.sum(axis=0) / period
+    var = (window * window).sum(axis=0) / period - mean * mean
+    std = np.sqrt(np.where(var > 0, var, 0.0))
+    return mean + nbdev * std, mean, mean - nbdev * std
+
+
+def adx(high, low, close, period=14):
+    """ADX Уайлдера для массивов (T, N)"""
+    n_bars = len(close)
+    out = np.full(close.shape, np.nan)
+    if n_bars < 2 * period:
+        return out
+    diff_p = high[1:] - high[:-1]
+    diff_m = low[:-1] - low[1:]
+    minus_dm = np.where((diff_m > 0) & (diff_p < diff_m), diff_m, 0.0)
+    plus_dm = np.where((diff_p > 0) & (diff_p > diff_m), diff_p, 0.0)
+    prev_close = close[:-1]
+    tr = np.maximum(high[1:] - low[1:], np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+
+    s_minus = minus_dm[:period - 1].sum(axis=0)
+    s_plus = plus_dm[:period - 1].sum(axis=0)
+    s_tr = tr[:period - 1].sum(axis=0)
+
+    def dx(s_minus, s_plus, s_tr):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            minus_di = 100.0 * (s_minus / s_tr)
+            plus_di = 100.0 * (s_plus / s_tr)
+            total = minus_di + plus_di
+            value = 100.0 * (np.abs(minus_di - plus_di) / total)
+        valid = (np.abs(s_tr) >= EPSILON) & (np.abs(total) >= EPSILON)
+        return value, valid
+
+    sum_dx = np.zeros(close.shape[1:])
+    for i in range(period - 1, 2 * period - 1):
+        s_minus = s_minus - s_minus / period + minus_dm[i]
+        s_plus = s_plus - s_plus / period + plus_dm[i]
+        s_tr = s_tr - s_tr / period + tr[i]
+        value, valid = dx(s_minus, s_plus, s_tr)
+        sum_dx += np.where(valid, value, 0.0)
+    prev_adx = sum_dx / period
+    out[2 * period - 1] = prev_adx
+    for t in range(2 * period, n_bars):
+        i = t - 1
+        s_minus = s_minus - s_minus / period + minus_dm[i]
+        s_plus = s_plus - s_plus / period + plus_dm[i]
+        s_tr = s_tr - s_tr / period + tr[i]
+        value, valid = dx(s_minus, s_plus, s_tr)
+        prev_adx = np.where(valid, (prev_adx * (period - 1) + value) / period, prev_adx)
+        out[t] = prev_adx
+    return out
+
+
+def compute_batch(high, low, close, volume, indicators=None, open_=None):
+    """
+    Значения индикаторов на последнем баре для массивов (N, T).
+    Возвращает словарь векторов длины N (NaN/False, если индикатор выключен).
+    Без open_ свечные паттерны не проверяются.
+    """
+    indicators = DEFAULT_INDICATORS if indicators is None else indicators
+    h, l, c, v = (np.ascontiguousarray(np.asarray(a, dtype=np.float64).T) for a in (high, low, close, volume))
+    n_symbols = c.shape[1]
+    nan = np.full(n_symbols, np.nan)
+    false = np.zeros(n_symbols, dtype=bool)
+    values = {
+        'price_change': (c[-1] - c[-2]) / c[-2] * 100,
+        'rsi': nan, 'macd': nan, 'macd_cross': false, 'macd_bear': false,
+        'upper': nan, 'sma20': nan, 'lower': nan, 'bollinger': np.full(n_symbols, BOLLINGER_MISSING),
+        'vol_surge': nan, 'adx': nan,
+        'bullish_divergence': false, 'bearish_divergence': false,
+        'bullish_candle': false, 'bearish_candle': false, 'volume_pre_surge': false,
+        'ema_cross_up': false, 'ema_cross_down': false, 'obv_trend': nan, 'obv_rising': false, 'obv_falling': false
+    }
+
+    if indicators.get('rsi', True) or indicators.get('rsi_macd_divergence', True):
+        rsi_values = rsi(c)
+        values['rsi'] = rsi_values[-1]
+
+    if indicators.get('macd', True) or indicators.get('rsi_macd_divergence', True) or \
+            indicators.get('ema_crossover', True):
+        line, signal, _ = macd(c)
+        values['macd'] = line[-1]
+        values['macd_cross'] = (line[-1] > signal[-1]) & (line[-2] <= signal[-2])
+        values['macd_bear'] = (line[-1] < signal[-1]) & (line[-2] >= signal[-2])
+
+    if indicators.get('bollinger', True) and len(c) >= 20:
+        upper, middle, lower = bbands_last(c)
+        values['upper'], values['sma20'], values['lower'] = upper, middle, lower
+        values['bollinger'] = np.where(c[-1] > upper, BOLLINGER_UPPER,
+                                       np.where(c[-1] < lower, BOLLINGER_LOWER, BOLLINGER_INSIDE))
+
+    if indicators.get('volume_surge', True):
+        vol_avg = v[-20:].sum(axis=0) / 20 if len(v) >= 20 else nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values['vol_surge'] = np.where(vol_avg != 0, v[-1] / vol_avg, np.nan)
+
+    if indicators.get('adx', True):
+        values['adx'] = adx(h, l, c)[-1]
+
+    if indicators.get('rsi_macd_divergence', True):
+        values['bullish_divergence'], values['bearish_divergence'] = divergence(c, rsi_values, line)
+
+    if indicators.get('candle_patterns', True) and open_ is not None:
+        o = np.asarray(open_, dtype=np.float64).T
+        values['bullish_candle'], values['bearish_candle'] = candle_patterns(o, h, l, c)
+
+    if indicators.get('volume_pre_surge', True):
+        values['volume_pre_surge'] = volume_ramp(v)
+
+    if indicators.get('ema_crossover', True):
+        values['ema_cross_up'], values['ema_cross_down'] = ema_cross(line)
+
+    if indicators.get('obv', True):
+        values['obv_trend'] = slope = obv_slope(c, v)
+        values['obv_rising'], values['obv_falling'] = slope > OBV_SLOPE, slope < -OBV_SLOPE
+
+    return values
+
+
+def trigger_matrix(values, indicators, config):
+    """Матрица (N, len(TRIGGER_NAMES)) сработавших индикаторов"""
+    n_symbols = len(values['price_change'])
+    with np.errstate(invalid='ignore'):
+        conditions = {
+            'price_change': np.abs(values['price_change']) > config['price_change_threshold'],
+            'rsi': (values['rsi'] > 70) | (values['rsi'] < 30),
+            'macd': values['macd_cross'] | values['macd_bear'],
+            'volume_surge': values['vol_surge'] > 2,
+            'bollinger': values['bollinger'] != BOLLINGER_INSIDE,
+            'adx': values['adx'] > 25,
+            'rsi_macd_divergence': values['bullish_divergence'] | values['bearish_divergence'],
+            'candle_patterns': values['bullish_candle'] | values['bearish_candle'],
+            'volume_pre_surge': values['volume_pre_surge'],
+            'ema_crossover': values['ema_cross_up'] | values['ema_cross_down'],
+            'obv': values['obv_rising'] | values['obv_falling']
+        }
+    matrix = np.zeros((n_symbols, len(TRIGGER_NAMES)), dtype=bool)
+    for j, name in enumerate(TRIGGER_NAMES):
+        if indicators.get(name, True):
+            matrix[:, j] = conditions[name]
+    return matrix
+
+
+def signal_vectors(matrix, values, config):
+    """
+    Векторная проверка минимума/обязательных и тип сигнала.
+    Возвращает (count_triggered, signal_type), где signal_type: 1 — pump, -1 — dump, 0 — нет сигнала.
+    """
+    count = matrix.sum(axis=1)
+    is_signal = count >= config.get('min_indicators', 1)
+    for name in config.get('required_indicators', []):
+        if name in TRIGGER_NAMES:
+            is_signal &= matrix[:, TRIGGER_NAMES.index(name)]
+        else:
+            is_signal &= False
+    threshold = config['price_change_threshold']
+    price_change = values['price_change']
+    signal_type = np.where(price_change > threshold, 1, np.where(price_change < -threshold, -1, 0))
+    return count, np.where(is_signal, signal_type, 0)
+
+
+def analyze_batch(symbols, high, low, close, volume, config, open_=None):
+    """Пакетный аналог analyze: список (is_signal, info) в порядке symbols"""
+    n_bars = np.shape(close)[1]
+    if n_bars < MIN_BARS:
+        return [(False, {'debug': f"Внимание: для анализа {symbol} доступно только {n_bars} свечей (менее 50)"})
+                for symbol in symbols]
+    indicators = config.get('indicators_enabled', DEFAULT_INDICATORS)
+    values = compute_batch(high, low, close, volume, indicators, open_)
+    matrix = trigger_matrix(values, indicators, config)
+    return summarize_batch(symbols, values, matrix, [n_bars] * len(symbols), indicators, config)
+
+
+def summarize_batch(symbols, values, matrix, n_bars, indicators, config):
+    """Список (is_signal, info) по векторам значений и матрице сработавших индикаторов"""
+    results = []
+    for i, symbol in enumerate(symbols):
+        info = {}
+        if n_bars[i] < FULL_BARS:
+            info['debug'] = f"Внимание: для анализа {symbol} доступно {n_bars[i]} свечей (менее 200, требуется для обычных монет)"
+        if indicators.get('rsi', True) or indicators.get('rsi_macd_divergence', True):
+            info['rsi'] = values['rsi'][i]
+        if indicators.get('macd', True) or indicators.get('rsi_macd_divergence', True) or \
+                indicators.get('ema_crossover', True):
+            info['macd'] = values['macd'][i]
+        if values['bollinger'][i] != BOLLINGER_MISSING:
+            info['bollinger'] = BOLLINGER_LABELS[int(values['bollinger'][i])]
+        if indicators.get('volume_surge', True):
+            info['volume_surge'] = values['vol_surge'][i]
+        if indicators.get('adx', True):
+            info['adx'] = values['adx'][i]
+        if indicators.get('rsi_macd_divergence', True):
+            info['rsi_macd_divergence'] = ('bullish' if values['bullish_divergence'][i] else
+                                           'bearish' if values['bearish_divergence'][i] else 'none')
+        if indicators.get('candle_patterns', True):
+            info['bullish_candle'] = bool(values['bullish_candle'][i])
+            info['bearish_candle'] = bool(values['bearish_candle'][i])
+        if indicators.get('volume_pre_surge', True):
+            info['volume_pre_surge'] = bool(values['volume_pre_surge'][i])
+        if indicators.get('ema_crossover', True):
+            info['ema_cross_up'] = bool(values['ema_cross_up'][i])
+            info['ema_cross_down'] = bool(values['ema_cross_down'][i])
+        if indicators.get('obv', True):
+            info['obv_trend'] = float(values['obv_trend'][i])
+        row = {name: values[name][i] for name in (
+            'price_change', 'rsi', 'macd_cross', 'macd_bear', 'vol_surge', 'adx',
+            'bullish_divergence', 'bearish_divergence', 'bullish_candle', 'bearish_candle',
+            'volume_pre_surge', 'ema_cross_up', 'ema_cross_down', 'obv_rising', 'obv_falling')}
+        triggered = [name for j, name in enumerate(TRIGGER_NAMES) if matrix[i, j]]
+        results.append(summarize(info, triggered, row, indicators, config, symbol))
+    return results
+
+
+def analyze_frames(frames, config):
+    """
+    Анализ словаря {symbol: DataFrame}: кадры группируются по длине и считаются пакетами.
+    Кадры с NaN и ошибки пакета уходят в обычный analyze по символу.
+    """
+    results = {}
+    groups = {}
+    for symbol, df in frames.items():
+        groups.setdefault(len(df), []).append(symbol)
+    for n_bars, symbols in groups.items():
+        if n_bars < MIN_BARS:
+            for symbol in symbols:
+                results[symbol] = analyze(frames[symbol], config, symbol=symbol)
+            continue
+        try:
+            stacked = np.stack([frames[s][['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+                                for s in symbols])
+            has_nan = np.isnan(stacked).any(axis=(1, 2))
+            clean = [s for s, bad in zip(symbols, has_nan) if not bad]
+            for symbol in (s for s, bad in zip(symbols, has_nan) if bad):
+                results[symbol] = analyze(frames[symbol], config, symbol=symbol)
+            if clean:
+                data = stacked[~has_nan]
+                batch = analyze_batch(clean, data[:, :, 1], data[:, :, 2], data[:, :, 3], data[:, :, 4], config,
+                                      open_=data[:, :, 0])
+                results.update(zip(clean, batch))
+        except Exception as e:
+            log(f"Ошибка пакетного анализа ({len(symbols)} символов): {e}", level="error")
+            for symbol in symbols:
+                if symbol not in results:
+                    results[symbol] = analyze(frames[symbol], config, symbol=symbol)
+    return results
@@ -0,0 +1,197 @@
+import time
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+TIMEFRAME_MS = {'1m': 60_000, '5m': 300_000, '15m': 900_000, '1h': 3_600_000}
+
+
+def resample(ts, data, step):
+    """
+    Агрегирует свечи (ts по возрастанию, data shape (n, 5)) в свечи длиной step мс.
+    open — первая, high — максимум, low — минимум, close — последняя, volume — сумма.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    data = np.asarray(data, dtype=np.float64)
+    if len(ts) == 0:
+        return ts, data.reshape(0, len(COLUMNS))
+    buckets = ts - ts % step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    out = np.empty((len(starts), len(COLUMNS)), dtype=np.float64)
+    out[:, 0] = data[starts, 0]
+    out[:, 1] = np.maximum.reduceat(data[:, 1], starts)
+    out[:, 2] = np.minimum.reduceat(data[:, 2], starts)
+    out[:, 3] = data[ends, 3]
+    out[:, 4] = np.add.reduceat(data[:, 4], starts)
+    return buckets[starts], out
+
+
+class CandleBuffer:
+    """
+    Кольцевой буфер свечей одного символа на одном таймфрейме.
+    Хранит не более capacity свечей по возрастанию времени в непрерывных массивах
+    (двойной запас места, сдвиг при переполнении — амортизированно O(1) на свечу).
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._ts = np.empty(2 * capacity, dtype=np.int64)
+        self._data = np.empty((2 * capacity, len(COLUMNS)), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self._frame = None
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_timestamp(self):
+        return int(self._ts[self._end - 1]) if self._end > self._start else None
+
+    @property
+    def timestamps(self):
+        return self._ts[self._start:self._end]
+
+    @property
+    def values(self):
+        return self._data[self._start:self._end]
+
+    def clear(self):
+        self._start = self._end = 0
+        self._frame = None
+
+    def merge(self, ts, data):
+        """
+        Вливает свечи (ts по возрастанию, data shape (n, 5)).
+        Свеча с временем последней сохранённой заменяет её (незакрытая свеча),
+        более старые игнорируются, новые дописываются в конец.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        data = np.asarray(data, dtype=np.float64)
+        if len(ts) == 0:
+            return 0
+        last = self.last_timestamp
+        if last is not None:
+            mask = ts >= last
+            ts, data = ts[mask], data[mask]
+            if len(ts) == 0:
+                return 0
+            if ts[0] == last:
+                self._data[self._end - 1] = data[0]
+                ts, data = ts[1:], data[1:]
+        self._frame = None
+        n = len(ts)
+        if n == 0:
+            return 0
+        if n >= self.capacity:
+            ts, data = ts[-self.capacity:], data[-self.capacity:]
+            self._start = self._end = 0
+            n = self.capacity
+        if self._end + n > len(self._ts):
+            keep = min(len(self), self.capacity - n)
+            self._ts[:keep] = self._ts[self._end - keep:self._end]
+            self._data[:keep] = self._data[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._ts[self._end:self._end + n] = ts
+        self._data[self._end:self._end + n] = data
+        self._end += n
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+        return n
+
+    def frame(self):
+        """DataFrame для analyze; кешируется до следующего обновления буфера"""
+        if self._frame is None:
+            index = pd.DatetimeIndex(pd.to_datetime(self.timestamps, unit='ms'), name='timestamp')
+            self._frame = pd.DataFrame(self.values.copy(), index=index, columns=COLUMNS)
+        return self._frame
+
+
+class CandleStore:
+    """
+    Хранилище свечей в памяти по ключу (symbol, timeframe).
+    Если подключён archive (monitor.history.HistoryStore), закрытые свечи
+    сохраняются на диск через flush и подгружаются при старте через load.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.archive = None
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def get(self, symbol, timeframe):
+        return self._buffers.get((symbol, timeframe))
+
+    def buffer(self, symbol, timeframe, capacity=200):
+        buf = self._buffers.get((symbol, timeframe))
+        if buf is None or buf.capacity != capacity:
+            buf = CandleBuffer(capacity)
+            self._buffers[(symbol, timeframe)] = buf
+        return buf
+
+    def retain(self, symbols, timeframes):
+        """Удаляет буферы символов, выпавших из списка, и других таймфреймов (один или список)"""
+        symbols = set(symbols)
+        timeframes = {timeframes} if isinstance(timeframes, str) else set(timeframes)
+        stale = [key for key in self._buffers if key[1] not in timeframes or key[0] not in symbols]
+        for key in stale:
+            del self._buffers[key]
+        return len(stale)
+
+    def aggregate(self, symbol, base, timeframe):
+        """
+        Продолжает буфер timeframe свечами, собранными из буфера base того же символа.
+        Пересчитываются только свечи начиная с последней (возможно, незакрытой) свечи timeframe.
+        Возвращает буфер или None, если буфер timeframe пуст или не продолжается базовыми свечами без разрыва.
+        """
+        source = self.get(symbol, base)
+        buf = self.get(symbol, timeframe)
+        if source is None or not len(source) or buf is None or not len(buf):
+            return None
+        ts, values = source.timestamps, source.values
+        last = buf.last_timestamp
+        if ts[0] > last:
+            return None  # Начало последней свечи timeframe уже вытеснено из буфера base
+        lo = int(np.searchsorted(ts, last, side='left'))
+        buf.merge(*resample(ts[lo:], values[lo:], TIMEFRAME_MS[timeframe]))
+        return buf
+
+    def closed(self, now_ms=None):
+        """Копии закрытых свечей всех буферов: [(symbol, timeframe, ts, values)]"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        result = []
+        for (symbol, timeframe), buf in list(self._buffers.items()):
+            ts = buf.timestamps
+            closed = ts + TIMEFRAME_MS.get(timeframe, 60_000) <= now_ms
+            if closed.any():
+                result.append((symbol, timeframe, ts[closed], buf.values[closed]))
+        return result
+
+    def flush(self, now_ms=None):
+        """Дописывает в archive закрытые свечи, которых там ещё нет; возвращает число записанных"""
+        if self.archive is None:
+            return 0
+        return sum(self.archive.append(*item) for item in self.closed(now_ms))
+
+    def load(self, timeframe, capacity=200, now_ms=None):
+        """
+        Заполняет буферы последними свечами из archive.
+        Символы, чья история старше capacity свечей, пропускаются — их всё равно придётся загружать целиком.
+        """
+        if self.archive is None:
+            return 0
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        since = now_ms - capacity * TIMEFRAME_MS.get(timeframe, 60_000)
+        loaded = 0
+        for symbol in self.archive.symbols(timeframe):
+            records = self.archive.read(symbol, timeframe, start=since)
+            if not len(records):
+                continue
+            data = np.column_stack([records[name] for name in COLUMNS])
+            self.buffer(symbol, timeframe, capacity).merge(records['ts'], data)
+            loaded += 1
+        return loaded
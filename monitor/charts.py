@@ -1,11 +1,24 @@
+import asyncio
 import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 import mplfinance as mpf
-from monitor.logger import log
+from monitor import metrics
+from monitor.logger import log, logger, forward_logging, forward_target
+from monitor.fastchart import create_chart_fast
 import talib
 
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+chart_pool = None
+chart_queue_limit = 0
+chart_timeout = 20
+pending_charts = 0
+
 
 def create_chart(df_plot, symbol, timeframe):
     """
@@ -148,4 +161,92 @@ def create_chart(df_plot, symbol, timeframe):
     except Exception as e:
         log(f"КРИТИЧЕСКАЯ ОШИБКА в create_chart({symbol}): {e}", level="error")
         log(f"Traceback: {__import__('traceback').format_exc()}", level="error")
-        return None
\ No newline at end of file
+        return None
+
+
+CHART_BACKENDS = {
+    'mplfinance': create_chart,
+    'fast': create_chart_fast
+}
+
+
+def _init_worker(log_target, log_level):
+    """Инициализация процесса-рендерера: логи — основному процессу, matplotlib и mplfinance импортируются один раз"""
+    forward_logging(log_target, log_level)
+    matplotlib.use('Agg')
+    plt.figure().clear()
+    plt.close('all')
+
+
+def _warmup():
+    return True
+
+
+def get_renderer(backend):
+    """Функция построения графика по имени бэкенда из config['chart_backend']"""
+    renderer = CHART_BACKENDS.get(backend)
+    if renderer is None:
+        log(f"Неизвестный бэкенд графиков {backend}, используется mplfinance", level="warning")
+        renderer = create_chart
+    return renderer
+
+
+def _render_png(timestamps, ohlcv, symbol, timeframe, backend='mplfinance'):
+    """Точка входа в процессе пула: компактные массивы → PNG-байты"""
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit='ms'), name='timestamp')
+    df_plot = pd.DataFrame(ohlcv, index=index, columns=OHLCV_COLUMNS)
+    buf = get_renderer(backend)(df_plot, symbol, timeframe)
+    return buf.getvalue() if buf is not None else None
+
+
+def start_chart_pool(config):
+    """Запускает пул процессов для графиков и прогревает воркеры"""
+    global chart_pool, chart_queue_limit, chart_timeout
+    workers = config.get('chart_workers', 2)
+    if chart_pool is not None or workers <= 0:
+        return
+    chart_queue_limit = config.get('chart_queue_limit', workers * 2)
+    chart_timeout = config.get('chart_timeout', 20)
+    chart_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(forward_target(), logger.level))
+    for _ in range(workers):
+        chart_pool.submit(_warmup)
+    log(f"Пул графиков запущен: {workers} процессов, очередь до {chart_queue_limit}", level="info")
+
+
+def stop_chart_pool():
+    global chart_pool
+    if chart_pool is not None:
+        chart_pool.shutdown(wait=False, cancel_futures=True)
+        chart_pool = None
+        log("Пул графиков остановлен", level="info")
+
+
+async def render_chart(df_plot, symbol, timeframe, backend='mplfinance'):
+    """
+    Строит график вне event loop в пуле процессов.
+    Возвращает BytesIO с PNG или None — если пул перегружен, ответ не пришёл вовремя или произошла ошибка.
+    Без запущенного пула строит график в текущем процессе.
+    """
+    global pending_charts
+    if chart_pool is None:
+        with metrics.chart_seconds.time():
+            return get_renderer(backend)(df_plot, symbol, timeframe)
+    if pending_charts >= chart_queue_limit:
+        log(f"Пул графиков занят ({pending_charts} в очереди), {symbol} без графика", level="warning")
+        return None
+    timestamps = df_plot.index.values.astype('datetime64[ms]').astype(np.int64)
+    ohlcv = df_plot[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+    pending_charts += 1
+    try:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(chart_pool, _render_png, timestamps, ohlcv, symbol, timeframe, backend)
+        with metrics.chart_seconds.time():
+            png = await asyncio.wait_for(future, timeout=chart_timeout)
+    except Exception as e:
+        log(f"Ошибка построения графика {symbol} в пуле: {e!r}", level="error")
+        metrics.errors_total.inc(stage='chart')
+        return None
+    finally:
+        pending_charts -= 1
+    return io.BytesIO(png) if png else None
@@ -0,0 +1,269 @@
+"""
+Очередь исходящих сообщений Telegram.
+
+Сканирование только ставит сигнал в очередь и сразу продолжает работу; отправкой
+занимается отдельный воркер. Очередь ограничена и упорядочена по приоритету
+(больше сработавших индикаторов — раньше). Воркер соблюдает лимиты Telegram на
+чат (интервал между сообщениями и число сообщений в минуту), ждёт RetryAfter и
+объединяет сигналы, накопившиеся, пока чат ждёт лимита или идёт отправка, в альбом
+или сводку. Результат доставки каждого сообщения сообщается его on_done: True после
+отправки, False при вытеснении из очереди или неудачной отправке.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from telegram import InputMediaPhoto
+from telegram.error import RetryAfter, TimedOut, NetworkError
+from monitor import metrics
+from monitor.logger import log
+
+TEXT_LIMIT = 4096
+MEDIA_GROUP_LIMIT = 10
+
+
+class Delivery:
+    """
+    Одно сообщение: HTML-текст и задача построения графика (или None).
+    on_done(sent) вызывается один раз, когда судьба сообщения известна.
+    """
+
+    def __init__(self, symbol, chat_id, html, chart=None, priority=0, on_done=None):
+        self.symbol = symbol
+        self.chat_id = chat_id
+        self.html = html
+        self.chart = chart
+        self.priority = priority
+        self.on_done = on_done
+
+    def finish(self, sent):
+        callback, self.on_done = self.on_done, None
+        if callback is not None:
+            callback(sent)
+
+
+class DeliveryQueue:
+    """
+    Ограниченная очередь с приоритетом и одним воркером отправки.
+    При переполнении вытесняется сообщение с наименьшим приоритетом.
+    """
+
+    def __init__(self, bot, config=None):
+        config = config or {}
+        self.bot = bot
+        self.maxsize = config.get('delivery_queue_size', 100)
+        self.batch_window = config.get('delivery_batch_window', 0.0)
+        self.max_batch = min(config.get('delivery_max_batch', MEDIA_GROUP_LIMIT), MEDIA_GROUP_LIMIT)
+        self.min_interval = config.get('delivery_min_interval', 1.0)
+        self.per_minute = config.get('delivery_per_minute', 20)
+        self.max_retries = config.get('delivery_retries', 3)
+        self._heap = []  # (-priority, seq, Delivery)
+        self._seq = itertools.count()
+        self._event = asyncio.Event()
+        self._sent = {}  # {chat_id: deque времён отправки за последнюю минуту}
+        self._task = None
+        self._busy = False
+        self.dropped = 0
+        self.delivered = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, item):
+        """Ставит сообщение в очередь без ожидания; False — если оно вытеснено сразу"""
+        entry = (-item.priority, next(self._seq), item)
+        if len(self._heap) >= self.maxsize:
+            worst = max(self._heap)
+            if entry > worst:
+                self._drop(item)
+                return False
+            self._heap.remove(worst)
+            heapq.heapify(self._heap)
+            self._drop(worst[2])
+        heapq.heappush(self._heap, entry)
+        self._event.set()
+        return True
+
+    def _drop(self, item):
+        self.dropped += 1
+        metrics.errors_total.inc(stage='delivery_dropped')
+        if item.chart is not None:
+            item.chart.cancel()
+        item.finish(False)
+        log(f"Очередь Telegram переполнена, сигнал {item.symbol} отброшен", level="warning")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10):
+        """Дожидается отправки оставшихся сообщений не дольше timeout секунд"""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._heap or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._heap:
+            log(f"Не отправлено {len(self._heap)} сообщений при остановке", level="warning")
+            for _, _, item in self._heap:
+                item.finish(False)
+            self._heap.clear()
+
+    async def _next_batch(self):
+        """
+        Первое сообщение и сообщения того же чата. Если чат ещё ждёт лимита (или задан
+        batch_window), очередь копит сообщения это время; свободный чат не ждёт.
+        """
+        while not self._heap:
+            self._event.clear()
+            await self._event.wait()
+        if len(self._heap) < self.max_batch:
+            delay = max(self.batch_window, self._slot_delay(self._heap[0][2].chat_id, 1))
+            if delay > 0:
+                await asyncio.sleep(delay)
+        first = heapq.heappop(self._heap)[2]
+        batch, rest = [first], []
+        while self._heap and len(batch) < self.max_batch:
+            entry = heapq.heappop(self._heap)
+            (batch if entry[2].chat_id == first.chat_id else rest).append(entry[2])
+        for item in rest:
+            heapq.heappush(self._heap, (-item.priority, next(self._seq), item))
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            self._busy = True
+            try:
+                await self._deliver(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log(f"Ошибка воркера Telegram: {e!r}", level="error")
+                metrics.errors_total.inc(stage='telegram')
+            finally:
+                self._busy = False
+                for item in batch:
+                    item.finish(False)  # Не отправленные _send: ошибка сборки или отмена воркера
+
+    def _slot_delay(self, chat_id, cost):
+        """Сколько секунд ждать, пока в чат можно отправить cost сообщений"""
+        sent = self._sent.setdefault(chat_id, deque())
+        now = time.monotonic()
+        while sent and now - sent[0] >= 60:
+            sent.popleft()
+        delay = 0.0
+        if sent:
+            delay = sent[-1] + self.min_interval - now
+        if len(sent) + cost > self.per_minute and sent:
+            delay = max(delay, sent[max(0, len(sent) + cost - self.per_minute - 1)] + 60 - now)
+        return delay
+
+    async def _wait_slot(self, chat_id, cost):
+        """Ждёт, пока в чат можно отправить cost сообщений"""
+        while True:
+            delay = self._slot_delay(chat_id, cost)
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self._sent[chat_id].extend([time.monotonic()] * cost)
+
+    async def _deliver(self, batch):
+        charts = await asyncio.gather(*(item.chart for item in batch if item.chart is not None),
+                                      return_exceptions=True)
+        charts = iter(charts)
+        photos, texts = [], []
+        for item in batch:
+            chart = next(charts) if item.chart is not None else None
+            if isinstance(chart, BaseException):
+                chart = None
+            elif chart is not None:
+                chart = chart.getvalue()  # bytes, а не поток: при повторе отправки BytesIO уже прочитан
+            if chart is None:
+                texts.append(item)
+            else:
+                photos.append((item, chart))
+        if len(photos) == 1:
+            item, chart = photos[0]
+            await self._send(item.chat_id, [item], 'send_photo', photo=chart, caption=item.html, parse_mode="HTML")
+        elif photos:
+            await self._send(photos[0][0].chat_id, [item for item, _ in photos], 'send_media_group', media=[
+                InputMediaPhoto(chart, caption=item.html, parse_mode="HTML") for item, chart in photos
+            ])
+        if len(texts) == 1:
+            item = texts[0]
+            await self._send(item.chat_id, texts, 'send_message', text=item.html + "\n(График недоступен)",
+                             parse_mode="HTML")
+        elif texts:
+            # Сводка: сигналы без графиков одним сообщением, пока помещаются в лимит длины
+            chunk, length = [], 0
+            for item in texts + [None]:
+                if item is None or (chunk and length + len(item.html) + 2 > TEXT_LIMIT):
+                    await self._send(chunk[0].chat_id, chunk, 'send_message',
+                                     text="\n\n".join(i.html for i in chunk), parse_mode="HTML",
+                                     disable_web_page_preview=True)
+                    chunk, length = [], 0
+                if item is not None:
+                    chunk.append(item)
+                    length += len(item.html) + 2
+
+    async def _send(self, chat_id, items, method, **kwargs):
+        cost = len(items) if method == 'send_media_group' else 1
+        for attempt in range(self.max_retries + 1):
+            await self._wait_slot(chat_id, cost)
+            try:
+                with metrics.telegram_send_seconds.time():
+                    await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+                self.delivered += len(items)
+                for item in items:
+                    item.finish(True)
+                log(f"Отправлено в Telegram: {', '.join(item.symbol for item in items)}")
+                return True
+            except RetryAfter as e:
+                retry_after = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+                log(f"Flood control Telegram, пауза {retry_after} сек", level="warning")
+                metrics.errors_total.inc(stage='telegram_flood')
+                await asyncio.sleep(retry_after)
+            except (TimedOut, NetworkError) as e:
+                log(f"Сетевая ошибка Telegram ({attempt + 1}/{self.max_retries + 1}): {e}", level="warning")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                log(f"Ошибка отправки в Telegram ({', '.join(item.symbol for item in items)}): {e}", level="error")
+                break
+        metrics.errors_total.inc(stage='telegram')
+        for item in items:
+            item.finish(False)
+        return False
+
+
+queue = None
+
+
+def start_delivery(bot, config):
+    """Запускает очередь доставки при старте бота"""
+    global queue
+    if queue is None and config.get('delivery_queue', True):
+        queue = DeliveryQueue(bot, config)
+        queue.start()
+        log(f"Очередь Telegram запущена: до {queue.maxsize} сообщений", level="info")
+    return queue
+
+
+async def stop_delivery(timeout=10):
+    global queue
+    if queue is not None:
+        await queue.stop(timeout)
+        queue = None
+        log("Очередь Telegram остановлена", level="info")
+
+
+metrics.Gauge('pump_telegram_queue_depth', 'Сообщения в очереди Telegram', lambda: len(queue) if queue is not None else 0)
+metrics.Gauge('pump_telegram_dropped', 'Сообщения, вытесненные из очереди Telegram',
+              lambda: queue.dropped if queue is not None else 0)
@@ -0,0 +1,294 @@
+"""
+Адаптеры бирж: Bybit (linear), Binance USDⓈ-M и OKX (SWAP) за одним интерфейсом.
+
+Адаптер знает адреса и формат REST и WebSocket своей биржи и приводит ответы к общему
+виду: тикеры — словари с полями screener.TICKER_FIELDS в единицах Bybit, свечи —
+(ts, ohlcv) по возрастанию времени (monitor.klines), сообщения потока — список
+(start, [open, high, low, close, volume], закрыта).
+
+Символ внутри бота: BTCUSDT для Bybit (как и раньше) и binance:BTCUSDT, okx:BTCUSDT
+для остальных бирж. coin() убирает префикс биржи: по нему сигналы одной монеты
+с разных бирж считаются одним сигналом.
+"""
+import json
+from monitor.klines import loads, parse_klines, parse_binance_klines, parse_okx_klines
+from monitor.logger import log
+
+DEFAULT_EXCHANGE = 'bybit'
+NAN = float('nan')
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Exchange:
+    """Базовый адаптер; значения по умолчанию — для Bybit"""
+
+    name = DEFAULT_EXCHANGE
+    title = 'Bybit'
+    rest_url = ''
+    ws_url = ''
+    intervals = {}
+    max_kline_limit = 1000
+    subscribe_batch = 10  # Топиков в одном запросе подписки
+    throttle_statuses = (429,)
+    throttle_codes = ()
+    limits = {}  # Настройки RequestScheduler по умолчанию для биржи
+
+    def symbol(self, native):
+        """Символ биржи → символ бота"""
+        normalized = self.normalize(native)
+        return normalized if self.name == DEFAULT_EXCHANGE else f"{self.name}:{normalized}"
+
+    def normalize(self, native):
+        return native
+
+    def native(self, normalized):
+        return normalized
+
+    def throttled(self, status, data):
+        """Ответ означает превышение лимита: HTTP-статус или код ошибки биржи в теле"""
+        if status in self.throttle_statuses:
+            return True
+        if not isinstance(data, dict):
+            return False
+        try:
+            return int(data.get('retCode', data.get('code'))) in self.throttle_codes
+        except (TypeError, ValueError):
+            return False
+
+    def tickers_request(self):
+        raise NotImplementedError
+
+    def parse_tickers(self, data):
+        """Ответ тикеров → список {'symbol': символ бота, поля TICKER_FIELDS} по бессрочным USDT-контрактам"""
+        raise NotImplementedError
+
+    def kline_request(self, native, timeframe, limit, start=None, end=None):
+        """
+        (путь, параметры) запроса limit свечей, начиная со start (мс) включительно или последних;
+        end (мс, включительно) ограничивает страницу сверху — для докачки истории
+        """
+        raise NotImplementedError
+
+    parse_klines = staticmethod(parse_klines)
+
+    def subscribe_messages(self, natives, timeframe):
+        raise NotImplementedError
+
+    def ping_message(self):
+        """Сообщение keepalive или None, если биржа сама шлёт ping"""
+        return None
+
+    def parse_stream(self, raw):
+        """Сообщение потока → (символ биржи, [(start, [o, h, l, c, v], закрыта)]) или None"""
+        raise NotImplementedError
+
+    def tradingview_url(self, native):
+        return f"https://www.tradingview.com/chart/?symbol={self.title.upper()}:{native}.P"
+
+
+class Bybit(Exchange):
+    rest_url = "https://api.bybit.com/v5/market"
+    ws_url = "wss://stream.bybit.com/v5/public/linear"
+    intervals = {'1m': '1', '5m': '5', '15m': '15', '1h': '60'}
+    max_kline_limit = 1000
+    throttle_statuses = (403, 429)  # Bybit отвечает 403 при превышении лимита по IP
+    throttle_codes = (10006, 10018)
+
+    def tickers_request(self):
+        return "tickers", {"category": "linear"}
+
+    def parse_tickers(self, data):
+        if not isinstance(data, dict) or 'list' not in (data.get('result') or {}):
+            return None
+        return [item for item in data['result']['list']
+                if item['symbol'].endswith('USDT') or item['symbol'].endswith('USDTPERP')]
+
+    def kline_request(self, native, timeframe, limit, start=None, end=None):
+        params = {"category": "linear", "symbol": native, "interval": self.intervals.get(timeframe, '1'),
+                  "limit": min(limit, self.max_kline_limit)}
+        if start is not None:
+            params["start"] = start
+        if end is not None:
+            params["end"] = end
+        return "kline", params
+
+    def subscribe_messages(self, natives, timeframe):
+        topics = [f"kline.{self.intervals.get(timeframe, '1')}.{s}" for s in natives]
+        return [json.dumps({"op": "subscribe", "args": topics[i:i + self.subscribe_batch]})
+                for i in range(0, len(topics), self.subscribe_batch)]
+
+    def ping_message(self):
+        return json.dumps({"op": "ping"})
+
+    def parse_stream(self, raw):
+        msg = loads(raw)
+        topic = msg.get('topic')
+        if not topic:
+            if msg.get('op') == 'subscribe' and not msg.get('success', True):
+                log(f"Ошибка подписки WS Bybit: {msg.get('ret_msg')}", level="ERROR")
+            return None
+        candles = [(int(k['start']), [float(k['open']), float(k['high']), float(k['low']), float(k['close']),
+                                      float(k['volume'])], bool(k.get('confirm'))) for k in msg.get('data', [])]
+        return topic.rsplit('.', 1)[-1], candles
+
+
+class Binance(Exchange):
+    name = 'binance'
+    title = 'Binance'
+    rest_url = "https://fapi.binance.com/fapi/v1"
+    ws_url = "wss://fstream.binance.com/ws"
+    intervals = {'1m': '1m', '5m': '5m', '15m': '15m', '1h': '1h'}
+    max_kline_limit = 1500
+    subscribe_batch = 100
+    throttle_statuses = (418, 429)
+    throttle_codes = (-1003,)
+    limits = {'rate_limit_rps': 15, 'rate_limit_burst': 10}  # Вес klines до 500 свечей — 2 из 2400 в минуту
+
+    def tickers_request(self):
+        return "ticker/24hr", None
+
+    def parse_tickers(self, data):
+        if not isinstance(data, list):
+            return None
+        # Квартальные контракты (BTCUSDT_250627) отсекаются проверкой окончания
+        return [{'symbol': self.symbol(item['symbol']), 'lastPrice': item.get('lastPrice'), 'prevPrice1h': NAN,
+                 'price24hPcnt': _float(item.get('priceChangePercent')) / 100,
+                 'turnover24h': item.get('quoteVolume'), 'openInterest': NAN}
+                for item in data if item.get('symbol', '').endswith('USDT')]
+
+    def kline_request(self, native, timeframe, limit, start=None, end=None):
+        params = {"symbol": native, "interval": self.intervals.get(timeframe, '1m'),
+                  "limit": min(limit, self.max_kline_limit)}
+        if start is not None:
+            params["startTime"] = start
+        if end is not None:
+            params["endTime"] = end
+        return "klines", params
+
+    parse_klines = staticmethod(parse_binance_klines)
+
+    def subscribe_messages(self, natives, timeframe):
+        streams = [f"{s.lower()}@kline_{self.intervals.get(timeframe, '1m')}" for s in natives]
+        return [json.dumps({"method": "SUBSCRIBE", "params": streams[i:i + self.subscribe_batch], "id": i + 1})
+                for i in range(0, len(streams), self.subscribe_batch)]
+
+    def parse_stream(self, raw):
+        msg = loads(raw)
+        if msg.get('error'):
+            log(f"Ошибка подписки WS Binance: {msg['error']}", level="ERROR")
+            return None
+        if msg.get('e') != 'kline':
+            return None
+        k = msg['k']
+        return msg['s'], [(int(k['t']), [float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])],
+                           bool(k.get('x')))]
+
+
+class Okx(Exchange):
+    name = 'okx'
+    title = 'OKX'
+    rest_url = "https://www.okx.com/api/v5/market"
+    ws_url = "wss://ws.okx.com:8443/ws/v5/business"
+    intervals = {'1m': '1m', '5m': '5m', '15m': '15m', '1h': '1H'}
+    max_kline_limit = 300
+    subscribe_batch = 50
+    throttle_statuses = (429,)
+    throttle_codes = (50011, 50061)
+    limits = {'rate_limit_rps': 15, 'rate_limit_burst': 10}  # candles: 40 запросов за 2 сек с IP
+
+    def normalize(self, native):
+        return native[:-len('-SWAP')].replace('-', '') if native.endswith('-SWAP') else native.replace('-', '')
+
+    def native(self, normalized):
+        return f"{normalized[:-len('USDT')]}-USDT-SWAP"
+
+    def tickers_request(self):
+        return "tickers", {"instType": "SWAP"}
+
+    def parse_tickers(self, data):
+        if not isinstance(data, dict) or not isinstance(data.get('data'), list):
+            return None
+        items = []
+        for item in data['data']:
+            if not item.get('instId', '').endswith('-USDT-SWAP'):
+                continue
+            last, open24h = _float(item.get('last')), _float(item.get('open24h'))
+            items.append({'symbol': self.symbol(item['instId']), 'lastPrice': last, 'prevPrice1h': NAN,
+                          'price24hPcnt': last / open24h - 1 if open24h else NAN,
+                          'turnover24h': _float(item.get('volCcy24h')) * last,  # volCcy24h — в монетах
+                          'openInterest': NAN})
+        return items
+
+    def kline_request(self, native, timeframe, limit, start=None, end=None):
+        params = {"instId": native, "bar": self.intervals.get(timeframe, '1m'), "limit": min(limit, self.max_kline_limit)}
+        if start is not None:
+            params["before"] = start - 1  # before — свечи новее указанного времени, не включая его
+        if end is not None:
+            params["after"] = end + 1  # after — свечи старше указанного времени
+        return "candles", params
+
+    parse_klines = staticmethod(parse_okx_klines)
+
+    def subscribe_messages(self, natives, timeframe):
+        args = [{"channel": f"candle{self.intervals.get(timeframe, '1m')}", "instId": s} for s in natives]
+        return [json.dumps({"op": "subscribe", "args": args[i:i + self.subscribe_batch]})
+                for i in range(0, len(args), self.subscribe_batch)]
+
+    def ping_message(self):
+        return "ping"
+
+    def parse_stream(self, raw):
+        if raw == 'pong':
+            return None
+        msg = loads(raw)
+        if msg.get('event') == 'error':
+            log(f"Ошибка подписки WS OKX: {msg.get('msg')}", level="ERROR")
+            return None
+        if 'data' not in msg:
+            return None
+        return msg['arg']['instId'], [(int(k[0]), [float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[6])],
+                                       k[8] == '1') for k in msg['data']]
+
+    def tradingview_url(self, native):
+        return f"https://www.tradingview.com/chart/?symbol=OKX:{self.normalize(native)}.P"
+
+
+BYBIT = Bybit()
+BINANCE = Binance()
+OKX = Okx()
+EXCHANGES = {exchange.name: exchange for exchange in (BYBIT, BINANCE, OKX)}
+
+
+def get_exchange(name):
+    return EXCHANGES[name]
+
+
+def resolve(symbol):
+    """Символ бота → (адаптер биржи, символ на бирже)"""
+    name, _, normalized = symbol.rpartition(':')
+    exchange = EXCHANGES[name or DEFAULT_EXCHANGE]
+    return exchange, exchange.native(normalized)
+
+
+def coin(symbol):
+    """Символ без биржи: BTCUSDT для BTCUSDT, binance:BTCUSDT и okx:BTCUSDT"""
+    return symbol.rpartition(':')[2]
+
+
+def enabled(config):
+    """Адаптеры бирж из exchanges в конфигурации (по умолчанию только Bybit)"""
+    return [EXCHANGES[name] for name in config.get('exchanges', [DEFAULT_EXCHANGE])]
+
+
+def group_symbols(symbols):
+    """{биржа: [символы бота]}"""
+    groups = {}
+    for symbol in symbols:
+        groups.setdefault(resolve(symbol)[0].name, []).append(symbol)
+    return groups
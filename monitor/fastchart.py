@@ -0,0 +1,131 @@
+"""
+Быстрый рендерер графиков сигналов без mplfinance.
+
+Фигура с панелями (свечи + Фибо, MACD, объём) строится один раз на процесс и
+переиспользуется: при каждом вызове удаляются только данные прошлого графика,
+свечи и столбцы рисуются готовыми коллекциями matplotlib одним вызовом на панель.
+"""
+import io
+import numpy as np
+import talib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from monitor.logger import log
+
+UP_COLOR = '#26a69a'
+DOWN_COLOR = '#ef5350'
+FIB_RATIOS = [0.0, 0.236, 0.382, 0.5, 0.618, 1.0]
+FIB_LABELS = ['0%', '23.6%', '38.2%', '50%', '61.8%', '100%']
+
+_template = None
+
+
+def _build_template(figsize=(13, 8)):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(3, 1, height_ratios=[5, 1, 1.5], hspace=0.05,
+                            left=0.13, right=0.93, top=0.94, bottom=0.08)
+    ax_price = fig.add_subplot(grid[0])
+    ax_macd = fig.add_subplot(grid[1], sharex=ax_price)
+    ax_volume = fig.add_subplot(grid[2], sharex=ax_price)
+    for ax in (ax_price, ax_macd, ax_volume):
+        ax.yaxis.tick_right()
+        ax.yaxis.set_label_position('right')
+        ax.grid(True, color='#e6e6e6', linewidth=0.6)
+        ax.set_axisbelow(True)
+    for ax in (ax_price, ax_macd):
+        ax.tick_params(labelbottom=False)
+    ax_price.set_ylabel('Price (USDT)')
+    ax_macd.set_ylabel('MACD')
+    ax_volume.set_ylabel('Volume')
+    return fig, (ax_price, ax_macd, ax_volume)
+
+
+def _clear(axes):
+    for ax in axes:
+        for artist in list(ax.collections) + list(ax.lines) + list(ax.texts):
+            artist.remove()
+
+
+def _bars(x, bottom, top, width):
+    """Вершины прямоугольников (n, 4, 2) для PolyCollection"""
+    left, right = x - width / 2, x + width / 2
+    return np.stack([
+        np.column_stack([left, bottom]), np.column_stack([left, top]),
+        np.column_stack([right, top]), np.column_stack([right, bottom])
+    ], axis=1)
+
+
+def create_chart_fast(df_plot, symbol, timeframe, dpi=110):
+    """Свечи + Фибо + MACD + объём; возвращает BytesIO с PNG или None"""
+    global _template
+    try:
+        if len(df_plot) < 2:
+            log(f"Недостаточно данных для графика {symbol}", level="warning")
+            return None
+        if _template is None:
+            _template = _build_template()
+        fig, axes = _template
+        ax_price, ax_macd, ax_volume = axes
+        _clear(axes)
+
+        o, h, l, c, v = (df_plot[col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close', 'volume'))
+        n = len(c)
+        x = np.arange(n, dtype=np.float64)
+        up = c >= o
+        colors = np.where(up, UP_COLOR, DOWN_COLOR)
+
+        # === СВЕЧИ ===
+        wicks = np.stack([np.column_stack([x, l]), np.column_stack([x, h])], axis=1)
+        ax_price.add_collection(LineCollection(wicks, colors=colors, linewidths=0.8))
+        body_low, body_high = np.minimum(o, c), np.maximum(o, c)
+        body_high = np.where(body_high - body_low == 0, body_low + (h.max() - l.min()) * 1e-4, body_high)
+        ax_price.add_collection(PolyCollection(_bars(x, body_low, body_high, 0.6), facecolors=colors,
+                                               edgecolors=colors, linewidths=0.5))
+
+        # === УРОВНИ ФИБОНАЧЧИ ===
+        fib_high, fib_low = h.max(), l.min()
+        fib_diff = max(fib_high - fib_low, 1e-8)
+        fib_levels = [fib_high - r * fib_diff for r in FIB_RATIOS]
+        price_decimals = max(4, -int(np.log10(abs(fib_high) or 1)) + 2) if fib_high > 0 else 8
+        ax_price.hlines(fib_levels, -1, n, colors='purple', linestyles='--', linewidths=1.2, alpha=0.85)
+        for level, perc in zip(fib_levels, FIB_LABELS):
+            ax_price.text(-0.02, level, f"{perc} — {level:.{price_decimals}f}", fontsize=8.5, color='purple',
+                          fontweight='bold', va='center', ha='right', transform=ax_price.get_yaxis_transform(),
+                          bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.85,
+                                    edgecolor='purple', linewidth=0.5))
+        pad = fib_diff * 0.05
+        ax_price.set_ylim(fib_low - pad, fib_high + pad)
+        ax_price.set_xlim(-1, n)
+        ax_price.set_title(f"{symbol} ({timeframe})")
+
+        # === MACD ===
+        macd_line, signal_line, macd_hist = talib.MACD(c, fastperiod=12, slowperiod=26, signalperiod=9)
+        valid = ~np.isnan(macd_hist)
+        if valid.any():
+            ax_macd.plot(x, macd_line, color='#1f77b4', linewidth=1.0)
+            ax_macd.plot(x, signal_line, color='#ff7f0e', linestyle='--', linewidth=1.0)
+            hist = np.where(valid, macd_hist, 0.0)
+            ax_macd.add_collection(PolyCollection(_bars(x, np.zeros(n), hist, 0.7), facecolors='gray', alpha=0.6))
+            span = np.nanmax(np.abs(np.concatenate([macd_line[valid], signal_line[valid], hist])))
+            ax_macd.set_ylim(-span * 1.1 or -1, span * 1.1 or 1)
+
+        # === ОБЪЁМ ===
+        ax_volume.add_collection(PolyCollection(_bars(x, np.zeros(n), v, 0.6), facecolors=colors, alpha=0.8))
+        ax_volume.set_ylim(0, v.max() * 1.1 or 1)
+
+        # === ПОДПИСИ ВРЕМЕНИ ===
+        ticks = np.linspace(0, n - 1, min(n, 8)).astype(int)
+        ax_volume.set_xticks(ticks)
+        ax_volume.set_xticklabels(df_plot.index[ticks].strftime('%d %H:%M'), fontsize=8)
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi)
+        buf.seek(0)
+        return buf
+    except Exception as e:
+        log(f"КРИТИЧЕСКАЯ ОШИБКА в create_chart_fast({symbol}): {e}", level="error")
+        log(f"Traceback: {__import__('traceback').format_exc()}", level="error")
+        _template = None
+        return None
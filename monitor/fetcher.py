@@ -1,66 +1,291 @@
+import asyncio
+import time
 import aiohttp
 import pandas as pd
+from monitor.candles import CandleStore, COLUMNS, TIMEFRAME_MS
+from monitor import metrics
+from monitor.exchanges import BYBIT, enabled, get_exchange, resolve
+from monitor.history import HistoryStore
+from monitor.klines import loads
 from monitor.logger import log
-from monitor.settings import load_config
+from monitor.ratelimit import RequestScheduler
+from monitor.screener import TickerSnapshot
+from monitor.settings import data_path, get_config
+
+MAX_KLINE_LIMIT = BYBIT.max_kline_limit
+INTERVAL_MAP = BYBIT.intervals
+
+candle_store = CandleStore()
+last_snapshot = None
+
+
+class FetcherClient:
+    """
+    Долгоживущий HTTP-клиент с общим пулом соединений к одной бирже (по умолчанию Bybit).
+    У каждой биржи свой планировщик лимитов: настройки rate_limit_* из конфигурации,
+    поверх них — значения адаптера и exchange_limits[биржа]. exchange_urls[биржа]
+    заменяет адрес REST API (тестовая сеть, прокси, локальный stub).
+    """
+
+    def __init__(self, config=None, exchange=BYBIT):
+        config = config or {}
+        self.exchange = exchange
+        self.rest_url = (config.get('exchange_urls') or {}).get(exchange.name)
+        self.pool_size = config.get('http_pool_size', 100)
+        self.pool_per_host = config.get('http_pool_per_host', 50)
+        self.dns_ttl = config.get('http_dns_ttl', 300)
+        self.keepalive = config.get('http_keepalive', 30)
+        self.timeout = aiohttp.ClientTimeout(
+            total=config.get('http_timeout', 15),
+            connect=config.get('http_connect_timeout', 5),
+            sock_read=config.get('http_read_timeout', 10)
+        )
+        limits = {**config, **exchange.limits, **(config.get('exchange_limits') or {}).get(exchange.name, {})}
+        self.scheduler = RequestScheduler(limits, exchange.throttled, exchange.title)
+        self.session = None
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive,
+            enable_cleanup_closed=True
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        log(f"HTTP-сессия {self.exchange.title} создана: пул {self.pool_size}, на хост {self.pool_per_host}", level="info")
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            log(f"HTTP-сессия {self.exchange.title} закрыта", level="info")
+        self.session = None
+
+    async def get(self, path, params=None, parse=loads):
+        """
+        GET-запрос к рыночному API биржи через планировщик лимитов, возвращает (status, data).
+        parse разбирает тело ответа (bytes); по умолчанию — JSON-декодер, для свечей — exchange.parse_klines.
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        async def send():
+            async with self.session.get(f"{self.rest_url or self.exchange.rest_url}/{path}", params=params) as resp:
+                data = None
+                if resp.status == 200:
+                    body = await resp.read()
+                    with metrics.json_parse_seconds.time():
+                        data = parse(body)
+                return resp.status, resp.headers, data
+
+        return await self.scheduler.request(send)
+
+
+clients = {}  # {биржа: FetcherClient}
+
+
+async def init_client(config=None):
+    """Создаёт клиенты бирж из exchanges при старте бота; возвращает клиент Bybit (или первой биржи)"""
+    config = config or {}
+    for exchange in enabled(config):
+        if exchange.name not in clients:
+            clients[exchange.name] = FetcherClient(config, exchange)
+        await clients[exchange.name].start()
+    return clients.get(BYBIT.name) or next(iter(clients.values()))
+
+
+async def close_client():
+    """Закрывает клиенты всех бирж при остановке бота"""
+    for http in clients.values():
+        await http.close()
+    clients.clear()
+
+
+async def get_client(exchange=BYBIT.name):
+    http = clients.get(exchange)
+    if http is None:
+        http = clients[exchange] = FetcherClient(None, get_exchange(exchange))
+        await http.start()
+    return http
+
+
+async def load_candle_archive(config):
+    """
+    Подключает дисковый архив свечей (candle_store_dir) к кешу и заполняет буферы из него.
+    После рестарта fetch_ohlcv догружает только свечи, вышедшие с момента остановки.
+    По умолчанию архив лежит на постоянном томе (/data/candles), если он смонтирован;
+    candle_store_dir: null отключает архив.
+    """
+    path = config.get('candle_store_dir', data_path('candles'))
+    if not path or not config.get('kline_cache', True):
+        return 0
+    candle_store.archive = HistoryStore(path)
+    loaded = 0
+    for timeframe in [config['timeframe'], *(config.get('confirm_timeframes') or {})]:
+        loaded += await asyncio.to_thread(candle_store.load, timeframe, config.get('candle_history', 200))
+    log(f"Загружено {loaded} буферов свечей из {path}", level="info")
+    return loaded
+
+
+async def flush_candle_archive():
+    """Сохраняет закрытые свечи кеша в архив; запись на диск — в отдельном потоке"""
+    archive = candle_store.archive
+    if archive is None:
+        return 0
+    pending = candle_store.closed()  # Копии снимаются в цикле событий, пока буферы не меняются
+
+    def write():
+        return sum(archive.append(*item) for item in pending)
+
+    try:
+        written = await asyncio.to_thread(write)
+    except Exception as e:
+        log(f"Ошибка сохранения свечей: {str(e)}", level="error")
+        metrics.errors_total.inc(stage='archive')
+        return 0
+    log(f"Сохранено {written} закрытых свечей", level="debug")
+    return written
+
+
+def _scheduler_metric(name):
+    return lambda: clients[BYBIT.name].scheduler.metrics()[name] if BYBIT.name in clients else 0
+
+
+metrics.Gauge('pump_bybit_queue_depth', 'Запросы в очереди планировщика Bybit', _scheduler_metric('queue_depth'))
+metrics.Gauge('pump_bybit_in_flight', 'Запросы к Bybit в процессе', _scheduler_metric('in_flight'))
+metrics.Gauge('pump_bybit_concurrency', 'Текущий лимит параллельности AIMD', _scheduler_metric('concurrency'))
+metrics.Gauge('pump_bybit_throttle_events', 'События троттлинга Bybit с момента старта', _scheduler_metric('throttle_events'))
+metrics.Gauge('pump_bybit_retries', 'Повторы запросов к Bybit с момента старта', _scheduler_metric('retries'))
+
+
+async def fetch_exchange_tickers(exchange, volume_filter):
+    """Тикеры одной биржи с оборотом не ниже volume_filter в общем формате"""
+    http = await get_client(exchange.name)
+    path, params = exchange.tickers_request()
+    status, data = await http.get(path, params=params)
+    if status != 200:
+        log(f"Ошибка получения тикеров {exchange.title}: HTTP {status}", level="error")
+        metrics.errors_total.inc(stage='tickers')
+        return []
+    items = exchange.parse_tickers(data)
+    if items is None:
+        log(f"Некорректные данные тикеров {exchange.title}", level="error")
+        return []
+    return [item for item in items if float(item.get('turnover24h') or 0) >= volume_filter]
 
-BYBIT_API = "https://api.bybit.com/v5/market"
 
 async def get_all_futures_tickers():
-    config = await load_config()
+    """Символы всех включённых бирж после фильтра по обороту; биржи опрашиваются параллельно"""
+    global last_snapshot
+    config = await get_config()
     volume_filter = config.get('volume_filter', 5_000_000.0)
     try:
-        async with aiohttp.ClientSession() as session:
-            params = {"category": "linear"}
-            async with session.get(f"{BYBIT_API}/tickers", params=params) as resp:
-                if resp.status != 200:
-                    log(f"Ошибка получения тикеров: HTTP {resp.status}", level="error")
-                    return []
-                data = await resp.json()
-                if 'result' not in data or 'list' not in data['result']:
-                    log(f"Некорректные данные тикеров", level="error")
-                    return []
-                tickers = []
-                for item in data['result']['list']:
-                    symbol = item['symbol']
-                    if not (symbol.endswith('USDT') or symbol.endswith('USDTPERP')):
-                        continue
-                    turnover = float(item.get('turnover24h', 0))
-                    if turnover >= volume_filter:
-                        tickers.append(symbol)
-                log(f"Получено {len(tickers)} тикеров после фильтра", level="info")
-                return tickers
+        exchanges = enabled(config)
+        for exchange in exchanges:
+            await get_client(exchange.name)
+        with metrics.tickers_fetch_seconds.time():
+            results = await asyncio.gather(*(fetch_exchange_tickers(x, volume_filter) for x in exchanges),
+                                           return_exceptions=True)
+        items = []
+        for exchange, result in zip(exchanges, results):
+            if isinstance(result, Exception):
+                log(f"Ошибка получения тикеров {exchange.title}: {str(result)}", level="error")
+                metrics.errors_total.inc(stage='tickers')
+                continue
+            items.extend(result)
+        last_snapshot = TickerSnapshot.from_items(items)
+        tickers = [item['symbol'] for item in items]
+        log(f"Получено {len(tickers)} тикеров после фильтра", level="info")
+        return tickers
     except Exception as e:
         log(f"Ошибка получения тикеров: {str(e)}", level="error")
+        metrics.errors_total.inc(stage='tickers')
         return []
 
-async def fetch_ohlcv_bybit(symbol, timeframe='1m', limit=200):
-    interval_map = {'1m': '1', '5m': '5', '15m': '15', '1h': '60'}
-    interval = interval_map.get(timeframe, '1')
+
+async def fetch_tickers_snapshot(max_age=5):
+    """Колоночный снимок тикеров; повторно использует снимок не старше max_age секунд"""
+    if last_snapshot is None or time.time() - last_snapshot.timestamp > max_age:
+        await get_all_futures_tickers()
+    return last_snapshot
+
+async def fetch_ohlcv(symbol, timeframe='1m', limit=200, use_cache=True):
+    """
+    Свечи symbol по возрастанию времени с биржи символа (exchanges.resolve).
+    С кешем первый вызов загружает limit свечей, последующие — только новые,
+    начиная с последней сохранённой (она перезаписывается, т.к. могла быть не закрыта).
+    """
     try:
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "category": "linear",
-                "symbol": symbol,
-                "interval": interval,
-                "limit": limit
-            }
-            async with session.get(f"{BYBIT_API}/kline", params=params) as resp:
-                if resp.status != 200:
-                    log(f"Ошибка получения OHLCV для {symbol}: HTTP {resp.status}", level="error")
-                    return pd.DataFrame()
-                data = await resp.json()
-                if 'result' not in data or 'list' not in data['result']:
-                    log(f"Некорректные данные OHLCV для {symbol}", level="warning")
-                    return pd.DataFrame()
-                klines = data['result']['list']
-                if not klines:
-                    return pd.DataFrame()
-                df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover'])
-                df['timestamp'] = pd.to_datetime(df['timestamp'].astype(int), unit='ms')
-                df.set_index('timestamp', inplace=True)
-                df = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-                log(f"Получены {len(df)} свечей для {symbol}", level="debug")
-                return df[::-1]  # Reverse to ascending time
+        exchange, native = resolve(symbol)
+        http = await get_client(exchange.name)
+        start, request_limit = None, limit
+        buf = candle_store.buffer(symbol, timeframe, capacity=limit) if use_cache else None
+        last_ts = buf.last_timestamp if buf is not None else None
+        if last_ts is not None:
+            step = TIMEFRAME_MS.get(timeframe, 60_000)
+            missing = int(time.time() * 1000 - last_ts) // step + 2
+            if missing < min(limit, exchange.max_kline_limit):
+                start, request_limit = last_ts, missing
+            else:
+                buf.clear()
+                last_ts = None
+        path, params = exchange.kline_request(native, timeframe, request_limit, start)
+        with metrics.kline_fetch_seconds.time():
+            status, data = await http.get(path, params=params, parse=exchange.parse_klines)
+        if status != 200:
+            log(f"Ошибка получения OHLCV для {symbol}: HTTP {status}", level="error")
+            metrics.errors_total.inc(stage='klines')
+            return pd.DataFrame()
+        if 'ts' not in data:
+            log(f"Некорректные данные OHLCV для {symbol}: {data.get('retMsg', '')}", level="warning")
+            return pd.DataFrame()
+        ts, ohlcv = data['ts'], data['ohlcv']
+        if not len(ts):
+            return buf.frame() if buf is not None and len(buf) else pd.DataFrame()
+        if buf is None:
+            index = pd.DatetimeIndex(pd.to_datetime(ts, unit='ms'), name='timestamp')
+            df = pd.DataFrame(ohlcv, index=index, columns=COLUMNS)
+            log("Получены %d свечей для %s", len(df), symbol, level="debug")
+            return df
+        if last_ts is not None and ts[0] > last_ts:
+            # Разрыв между кешем и ответом — перезагружаем историю целиком
+            log("Разрыв в кеше свечей %s, полная перезагрузка", symbol, level="debug")
+            buf.clear()
+            return await fetch_ohlcv(symbol, timeframe, limit, use_cache)
+        added = buf.merge(ts, ohlcv)
+        log("Получены %d свечей для %s, новых: %d", len(ts), symbol, added, level="debug")
+        return buf.frame()
     except Exception as e:
         log(f"Ошибка получения OHLCV для {symbol}: {str(e)}", level="error")
-        return pd.DataFrame()
\ No newline at end of file
+        metrics.errors_total.inc(stage='klines')
+        return pd.DataFrame()
+
+
+
+async def fetch_timeframes(symbol, base, timeframes, limit=200, fetch_base=True):
+    """
+    Свечи symbol на base и старших timeframes: {таймфрейм: DataFrame}.
+    Через REST регулярно обновляется только base, старшие таймфреймы собираются из него
+    локально; отдельно они загружаются лишь при первом обращении или после разрыва.
+    """
+    if fetch_base:
+        df = await fetch_ohlcv(symbol, base, limit=limit, use_cache=True)
+    else:
+        buf = candle_store.get(symbol, base)
+        df = buf.frame() if buf is not None and len(buf) else pd.DataFrame()
+    frames = {base: df}
+    if df.empty:
+        return frames
+    for timeframe in timeframes:
+        if timeframe == base:
+            continue
+        buf = candle_store.aggregate(symbol, base, timeframe)
+        if buf is None:
+            log("Загрузка %s для %s через REST", timeframe, symbol, level="debug")
+            frames[timeframe] = await fetch_ohlcv(symbol, timeframe, limit=limit, use_cache=True)
+        else:
+            frames[timeframe] = buf.frame()
+    return frames
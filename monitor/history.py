@@ -0,0 +1,81 @@
+"""
+История свечей на диске для бэктеста.
+
+Один файл на (таймфрейм, символ): {root}/{timeframe}/{SYMBOL}.bin — плоский массив
+записей RECORD_DTYPE по возрастанию времени, только дозапись в конец. Файл
+читается через np.memmap, поэтому месяцы минутных свечей не загружаются в
+память целиком: срез по времени находится бинарным поиском по столбцу ts.
+Префикс биржи в имени файла пишется через @ (binance@BTCUSDT.bin): двоеточие
+недопустимо в именах файлов Windows.
+"""
+import os
+import numpy as np
+from monitor.candles import COLUMNS
+
+RECORD_DTYPE = np.dtype([('ts', '<i8')] + [(name, '<f8') for name in COLUMNS])
+
+
+class HistoryStore:
+    """Append-only хранилище свечей в каталоге root"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, symbol, timeframe):
+        return os.path.join(self.root, timeframe, f"{symbol.replace(':', '@')}.bin")
+
+    def symbols(self, timeframe):
+        directory = os.path.join(self.root, timeframe)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-4].replace('@', ':') for name in os.listdir(directory) if name.endswith('.bin'))
+
+    def open(self, symbol, timeframe):
+        """Весь файл как memmap записей (пустой массив, если файла нет)"""
+        path = self.path(symbol, timeframe)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def last_timestamp(self, symbol, timeframe):
+        path = self.path(symbol, timeframe)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < RECORD_DTYPE.itemsize:
+            return None
+        with open(path, 'rb') as f:
+            f.seek(size - size % RECORD_DTYPE.itemsize - RECORD_DTYPE.itemsize)
+            return int(np.frombuffer(f.read(RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)['ts'][0])
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        """Записи с start <= ts < end (мс) — срез memmap без копирования"""
+        records = self.open(symbol, timeframe)
+        ts = records['ts']
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(ts, end, side='left'))
+        return records[lo:hi]
+
+    def append(self, symbol, timeframe, ts, data):
+        """Дописывает свечи новее последней сохранённой; возвращает число записанных"""
+        ts = np.asarray(ts, dtype=np.int64)
+        data = np.asarray(data, dtype=np.float64)
+        last = self.last_timestamp(symbol, timeframe)
+        if last is not None:
+            mask = ts > last
+            ts, data = ts[mask], data[mask]
+        if len(ts) == 0:
+            return 0
+        records = np.empty(len(ts), dtype=RECORD_DTYPE)
+        records['ts'] = ts
+        for i, name in enumerate(COLUMNS):
+            records[name] = data[:, i]
+        path = self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            size = f.tell()
+            if size % RECORD_DTYPE.itemsize:
+                f.truncate(size - size % RECORD_DTYPE.itemsize)  # Обрезаем недописанную запись
+            f.write(records.tobytes())
+        return len(records)
+
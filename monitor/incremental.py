@@ -0,0 +1,358 @@
+"""
+Инкрементальные индикаторы: состояние RSI, MACD, BBANDS, ADX и среднего объёма
+на символ и таймфрейм обновляется за O(1) на каждую новую или изменённую свечу.
+
+Каждый индикатор хранит состояние только по закрытым свечам (commit), а значение
+на текущей незакрытой свече вычисляет из него без записи (peek). Поэтому правка
+открытой свечи — это просто повторный peek с новыми ценами, а её закрытие —
+commit. Формулы и начальные значения повторяют TA-Lib и monitor.batch; на 200
+свечах результат совпадает с TA-Lib в пределах накопленной погрешности.
+
+Дивергенция, свечные паттерны, EMA Crossover, OBV и рост объёма смотрят лишь на
+последние PATTERN_BARS свечей: состояние хранит их хвост вместе с RSI и линией MACD
+закрытых свечей, и значения считаются общими функциями monitor.analyzer.
+"""
+from collections import deque
+import numpy as np
+from monitor.batch import (EPSILON, MIN_BARS, BOLLINGER_INSIDE, BOLLINGER_UPPER, BOLLINGER_LOWER, BOLLINGER_MISSING,
+                           trigger_matrix, summarize_batch)
+from monitor.analyzer import (DEFAULT_INDICATORS, OBV_SLOPE, PATTERN_BARS, candle_patterns, divergence, ema_cross,
+                              obv_slope, volume_ramp)
+from monitor.logger import log
+
+NAN = float('nan')
+
+
+class Ema:
+    """EMA с затравкой SMA первых period значений; первые skip значений пропускаются (MACD в TA-Lib)"""
+
+    def __init__(self, period, skip=0):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.skip = skip
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def peek(self, x):
+        if self.value is not None:
+            return (x - self.value) * self.k + self.value
+        if self.count + 1 == self.skip + self.period:
+            return (self.total + x) / self.period
+        return None
+
+    def commit(self, x):
+        value = self.peek(x)
+        self.count += 1
+        if self.value is None and self.count > self.skip:
+            self.total += x
+        self.value = value
+        return value
+
+
+class Rsi:
+    """RSI Уайлдера"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None
+        self.count = 0  # Число изменений цены
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def _next(self, x):
+        diff = x - self.prev
+        gain, loss = (diff, 0.0) if diff > 0 else (0.0, -diff if diff < 0 else 0.0)
+        if self.count + 1 < self.period:
+            return self.avg_gain + gain, self.avg_loss + loss, None
+        if self.count + 1 == self.period:
+            g, l = (self.avg_gain + gain) / self.period, (self.avg_loss + loss) / self.period
+        else:
+            g = (self.avg_gain * (self.period - 1) + gain) / self.period
+            l = (self.avg_loss * (self.period - 1) + loss) / self.period
+        total = g + l
+        return g, l, 0.0 if abs(total) < EPSILON else 100.0 * (g / total)
+
+    def peek(self, x):
+        return None if self.prev is None else self._next(x)[2]
+
+    def commit(self, x):
+        value = None
+        if self.prev is not None:
+            self.avg_gain, self.avg_loss, value = self._next(x)
+            self.count += 1
+        self.prev = x
+        return value
+
+
+class Macd:
+    """MACD(12, 26, 9) как в TA-Lib: быстрая EMA стартует на баре slow - fast"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = Ema(fast, skip=slow - fast)
+        self.slow = Ema(slow)
+        self.signal = Ema(signal)
+
+    def _line(self, fast, slow):
+        return None if fast is None or slow is None else fast - slow
+
+    def peek(self, x):
+        line = self._line(self.fast.peek(x), self.slow.peek(x))
+        signal = self.signal.peek(line) if line is not None else None
+        return (line, signal) if signal is not None else (None, None)
+
+    def commit(self, x):
+        line = self._line(self.fast.commit(x), self.slow.commit(x))
+        signal = self.signal.commit(line) if line is not None else None
+        return (line, signal) if signal is not None else (None, None)
+
+
+class Window:
+    """Скользящее окно: сумма и сумма квадратов последних period значений"""
+
+    RESYNC = 1000  # Пересчёт сумм с нуля против накопления ошибки округления
+
+    def __init__(self, period):
+        self.period = period
+        self.values = deque(maxlen=period - 1)  # Закрытые значения; последнее место — под текущую свечу
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.commits = 0
+
+    def peek(self, x):
+        """(среднее, дисперсия) окна с x на месте текущей свечи или None, пока окно не заполнено"""
+        if len(self.values) < self.period - 1:
+            return None
+        mean = (self.total + x) / self.period
+        return mean, (self.total_sq + x * x) / self.period - mean * mean
+
+    def commit(self, x):
+        value = self.peek(x)
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        self.commits += 1
+        if self.commits % self.RESYNC == 0:
+            self.total = sum(self.values)
+            self.total_sq = sum(v * v for v in self.values)
+        return value
+
+
+class Adx:
+    """ADX Уайлдера (14) как в TA-Lib"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None  # (high, low, close) прошлой свечи
+        self.count = 0  # Число обработанных приращений
+        self.s_minus = self.s_plus = self.s_tr = 0.0
+        self.sum_dx = 0.0
+        self.value = None
+
+    def _next(self, high, low, close):
+        p = self.period
+        prev_high, prev_low, prev_close = self.prev
+        diff_p, diff_m = high - prev_high, prev_low - low
+        minus_dm = diff_m if diff_m > 0 and diff_p < diff_m else 0.0
+        plus_dm = diff_p if diff_p > 0 and diff_p > diff_m else 0.0
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        i = self.count
+        if i < p - 1:
+            return self.s_minus + minus_dm, self.s_plus + plus_dm, self.s_tr + tr, self.sum_dx, None
+        s_minus = self.s_minus - self.s_minus / p + minus_dm
+        s_plus = self.s_plus - self.s_plus / p + plus_dm
+        s_tr = self.s_tr - self.s_tr / p + tr
+        dx = None
+        if abs(s_tr) >= EPSILON:
+            minus_di, plus_di = 100.0 * (s_minus / s_tr), 100.0 * (s_plus / s_tr)
+            total = minus_di + plus_di
+            if abs(total) >= EPSILON:
+                dx = 100.0 * (abs(minus_di - plus_di) / total)
+        if i < 2 * p - 1:
+            sum_dx = self.sum_dx + (dx if dx is not None else 0.0)
+            return s_minus, s_plus, s_tr, sum_dx, sum_dx / p if i == 2 * p - 2 else None
+        value = (self.value * (p - 1) + dx) / p if dx is not None else self.value
+        return s_minus, s_plus, s_tr, self.sum_dx, value
+
+    def peek(self, high, low, close):
+        return None if self.prev is None else self._next(high, low, close)[4]
+
+    def commit(self, high, low, close):
+        if self.prev is not None:
+            self.s_minus, self.s_plus, self.s_tr, self.sum_dx, value = self._next(high, low, close)
+            self.count += 1
+            if value is not None:
+                self.value = value
+        self.prev = (high, low, close)
+        return self.value
+
+
+class IndicatorState:
+    """
+    Индикаторы одного символа на одном таймфрейме.
+    update(ts, candle) — свеча с тем же временем, что текущая, заменяет её, более новая
+    закрывает текущую и становится новой текущей, более старая игнорируется.
+    """
+
+    def __init__(self):
+        self.rsi = Rsi(14)
+        self.macd = Macd(12, 26, 9)
+        self.bbands = Window(20)
+        self.volume = Window(20)
+        self.adx = Adx(14)
+        self.ts = None
+        self.bar = None  # Текущая (последняя) свеча: open, high, low, close, volume
+        self.bars = 0
+        self.prev_close = None
+        self.prev_macd = (None, None)
+        self.tail = deque(maxlen=PATTERN_BARS - 1)  # Закрытые свечи: open, high, low, close, volume, RSI, MACD
+
+    def _commit(self, bar):
+        _, high, low, close, volume = bar
+        rsi = self.rsi.commit(close)
+        self.prev_macd = self.macd.commit(close)
+        self.bbands.commit(close)
+        self.volume.commit(volume)
+        self.adx.commit(high, low, close)
+        self.prev_close = close
+        self.tail.append((*bar, _num(rsi), _num(self.prev_macd[0])))
+
+    def update(self, ts, bar):
+        ts = int(ts)
+        if self.ts is not None and ts < self.ts:
+            return False
+        if self.ts is not None and ts > self.ts:
+            self._commit(self.bar)
+        if self.ts != ts:
+            self.bars += 1
+        self.ts = ts
+        self.bar = tuple(float(x) for x in bar)
+        return True
+
+    def values(self, indicators=DEFAULT_INDICATORS):
+        """Значения на текущей свече в формате monitor.batch.compute_batch для одного символа"""
+        _, high, low, close, volume = self.bar
+        prev = self.prev_close
+        line, signal = self.macd.peek(close)
+        prev_line, prev_signal = self.prev_macd
+        values = {
+            'price_change': (close - prev) / prev * 100 if prev else 0.0,
+            'rsi': _num(self.rsi.peek(close)),
+            'macd': _num(line),
+            'macd_cross': line is not None and prev_line is not None and line > signal and prev_line <= prev_signal,
+            'macd_bear': line is not None and prev_line is not None and line < signal and prev_line >= prev_signal,
+            'upper': NAN, 'sma20': NAN, 'lower': NAN, 'bollinger': BOLLINGER_MISSING,
+            'vol_surge': NAN,
+            'adx': _num(self.adx.peek(high, low, close)),
+        }
+        window = self.bbands.peek(close)
+        if window is not None:
+            mean, var = window
+            std = var ** 0.5 if var > 0 else 0.0
+            upper, lower = mean + 2.0 * std, mean - 2.0 * std
+            values.update(upper=upper, sma20=mean, lower=lower,
+                          bollinger=BOLLINGER_UPPER if close > upper else BOLLINGER_LOWER if close < lower else BOLLINGER_INSIDE)
+        window = self.volume.peek(volume)
+        if window is not None and window[0] != 0:
+            values['vol_surge'] = volume / window[0]
+        values.update(self._patterns(indicators, values['rsi'], values['macd']))
+        return values
+
+    def _patterns(self, indicators, rsi, line):
+        """Индикаторы по хвосту свечей; пока хвост не заполнен — не сработали"""
+        flags = dict.fromkeys(('bullish_divergence', 'bearish_divergence', 'bullish_candle', 'bearish_candle',
+                               'volume_pre_surge', 'ema_cross_up', 'ema_cross_down', 'obv_rising', 'obv_falling'),
+                              False)
+        flags['obv_trend'] = NAN
+        if len(self.tail) < self.tail.maxlen:
+            return flags
+        o, h, l, c, v, rsi_values, macd_line = np.array([*self.tail, (*self.bar, rsi, line)]).T
+        if indicators.get('rsi_macd_divergence', True):
+            bullish, bearish = divergence(c, rsi_values, macd_line)
+            flags.update(bullish_divergence=bool(bullish[0]), bearish_divergence=bool(bearish[0]))
+        if indicators.get('candle_patterns', True):
+            hammer, star = candle_patterns(o, h, l, c)
+            flags.update(bullish_candle=bool(hammer[0]), bearish_candle=bool(star[0]))
+        if indicators.get('volume_pre_surge', True):
+            flags['volume_pre_surge'] = bool(volume_ramp(v)[0])
+        if indicators.get('ema_crossover', True):
+            up, down = ema_cross(macd_line)
+            flags.update(ema_cross_up=bool(up[0]), ema_cross_down=bool(down[0]))
+        if indicators.get('obv', True):
+            slope = obv_slope(c, v)[0]
+            flags.update(obv_trend=float(slope), obv_rising=bool(slope > OBV_SLOPE),
+                         obv_falling=bool(slope < -OBV_SLOPE))
+        return flags
+
+
+def _num(value):
+    return NAN if value is None else value
+
+
+class IncrementalEngine:
+    """Состояния индикаторов по ключу (symbol, timeframe), синхронизируемые с буферами CandleStore"""
+
+    def __init__(self):
+        self._states = {}
+
+    def __len__(self):
+        return len(self._states)
+
+    def retain(self, symbols, timeframes):
+        symbols = set(symbols)
+        timeframes = {timeframes} if isinstance(timeframes, str) else set(timeframes)
+        for key in [key for key in self._states if key[1] not in timeframes or key[0] not in symbols]:
+            del self._states[key]
+
+    def sync(self, symbol, timeframe, buf, until=None):
+        """
+        Доводит состояние до буфера свечей: обычно это одна-две последние свечи.
+        При разрыве (буфер перезагружен или пропущены свечи) состояние строится заново по всему буферу.
+        until — только свечи, открытые раньше этого времени (мс).
+        """
+        ts, values = _window(buf, until)
+        state = self._states.get((symbol, timeframe))
+        lo = 0
+        if state is not None:
+            lo = int(np.searchsorted(ts, state.ts, side='left'))
+            if lo == len(ts) or ts[lo] != state.ts:
+                state = None
+        if state is None:
+            state = IndicatorState()
+            self._states[(symbol, timeframe)] = state
+            lo = 0
+        for t, row in zip(ts[lo:], values[lo:]):
+            state.update(t, row)
+        return state
+
+    def analyze(self, symbol, timeframe, buf, config, until=None):
+        """Аналог analyze по буферу свечей: (is_signal, info)"""
+        if np.isnan(_window(buf, until)[1]).any():
+            # Как и analyze: свечи с NaN не считаются, состояние до них не доводится
+            log(f"Ошибка: DataFrame для {symbol} содержит NaN значения", level="error")
+            return False, {'debug': "Ошибка: DataFrame содержит NaN значения"}
+        state = self.sync(symbol, timeframe, buf, until)
+        if state.bars < MIN_BARS:
+            return False, {'debug': f"Внимание: для анализа {symbol} доступно только {state.bars} свечей (менее 50)"}
+        indicators = config.get('indicators_enabled', DEFAULT_INDICATORS)
+        values = _vectors([state.values(indicators)])
+        matrix = trigger_matrix(values, indicators, config)
+        return summarize_batch([symbol], values, matrix, [state.bars], indicators, config)[0]
+
+
+def _window(buf, until):
+    """Метки времени и свечи буфера, открытые раньше until (мс)"""
+    ts, values = buf.timestamps, buf.values
+    if until is not None:
+        hi = int(np.searchsorted(ts, until, side='left'))
+        ts, values = ts[:hi], values[:hi]
+    return ts, values
+
+
+def _vectors(rows):
+    """Список словарей значений → словарь векторов, как в compute_batch"""
+    return {name: np.array([row[name] for row in rows]) for name in rows[0]}
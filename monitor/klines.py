@@ -0,0 +1,127 @@
+"""
+Разбор ответов бирж со свечами прямо в массивы NumPy.
+
+loads — JSON-декодер: orjson или msgspec, если установлены, иначе стандартный json.
+parse_klines (Bybit), parse_binance_klines и parse_okx_klines разбирают ответ без
+промежуточных объектов Python: строки списка свечей вырезаются из тела ответа и
+читаются одним np.fromstring в непрерывный float64-массив, который затем приводится
+к общему виду — ts (int64) и ohlcv (n, 5) по возрастанию времени. Если тело имеет
+неожиданный вид, используется обычный JSON-разбор.
+"""
+import json
+import re
+import numpy as np
+
+try:
+    import orjson
+    loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    try:
+        import msgspec
+        loads = msgspec.json.decode
+        JSON_BACKEND = 'msgspec'
+    except ImportError:
+        loads = json.loads
+        JSON_BACKEND = 'json'
+
+KLINE_FIELDS = 7  # Bybit: start, open, high, low, close, volume, turnover
+BINANCE_FIELDS = 12  # openTime, open, high, low, close, volume, closeTime, quoteVolume, trades, ...
+OKX_FIELDS = 9  # ts, open, high, low, close, vol (контракты), volCcy (монеты), volCcyQuote, confirm
+OKX_COLUMNS = (1, 2, 3, 4, 6)  # Объём в монетах, как у Bybit и Binance
+_LIST = b'"list":['
+_DATA = b'"data":['
+_RET_CODE = re.compile(rb'"retCode"\s*:\s*(-?\d+)')
+_RET_MSG = re.compile(rb'"retMsg"\s*:\s*"([^"]*)"')
+_OKX_CODE = re.compile(rb'"code"\s*:\s*"?(-?\d+)')
+_OKX_MSG = re.compile(rb'"msg"\s*:\s*"([^"]*)"')
+
+
+def kline_arrays(rows, width=KLINE_FIELDS, columns=(1, 2, 3, 4, 5), descending=True):
+    """Строки свечей → (ts int64, ohlcv float64 shape (n, 5)) по возрастанию времени"""
+    data = np.asarray(rows, dtype=np.float64).reshape(-1, width)
+    if descending:
+        data = data[::-1]
+    return data[:, 0].astype(np.int64), np.ascontiguousarray(data[:, list(columns)])
+
+
+def _fast_rows(body, start, end, width):
+    """Строки свечей body[start:end] без внешних скобок → плоский float64-массив или None"""
+    text = body[start:end].translate(None, b'[]" ').decode('ascii')
+    if not text:
+        return np.empty(0)
+    try:
+        values = np.fromstring(text, dtype=np.float64, sep=',')
+    except ValueError:
+        return None
+    if len(values) % width or len(values) != text.count(',') + 1:
+        return None  # Нечисловое поле или другая ширина строки
+    return values
+
+
+def _parse_list(body, marker, code_re, msg_re, fallback, width, columns=(1, 2, 3, 4, 5)):
+    """Общий разбор ответа вида {код, сообщение, ...marker[строки свечей по убыванию времени]...}"""
+    start = body.find(marker)
+    if start < 0 or body.find(marker, start + 1) >= 0:
+        return fallback(body)
+    code = code_re.search(body, 0, start)  # Код и сообщение биржа ставит перед списком
+    message = msg_re.search(body, 0, start)
+    if code is None:
+        return fallback(body)
+    parsed = {'retCode': int(code.group(1)),
+              'retMsg': message.group(1).decode('utf-8', 'replace') if message else ''}
+    start += len(marker)
+    end = start if body[start:start + 1] == b']' else body.find(b']]', start)
+    values = _fast_rows(body, start, end, width) if end >= 0 else None
+    if values is None:
+        return fallback(body)
+    parsed['ts'], parsed['ohlcv'] = kline_arrays(values, width, columns)
+    return parsed
+
+
+def _bybit_json(body):
+    payload = loads(body)
+    if not isinstance(payload, dict):
+        return {'retCode': None, 'retMsg': ''}
+    parsed = {'retCode': payload.get('retCode'), 'retMsg': payload.get('retMsg', '')}
+    result = payload.get('result')
+    if isinstance(result, dict) and 'list' in result:
+        parsed['ts'], parsed['ohlcv'] = kline_arrays(result['list'] or np.empty((0, KLINE_FIELDS)))
+    return parsed
+
+
+def _okx_json(body):
+    payload = loads(body)
+    if not isinstance(payload, dict):
+        return {'retCode': None, 'retMsg': ''}
+    parsed = {'retCode': int(payload.get('code', -1)), 'retMsg': payload.get('msg', '')}
+    if isinstance(payload.get('data'), list):
+        parsed['ts'], parsed['ohlcv'] = kline_arrays(payload['data'] or np.empty((0, OKX_FIELDS)),
+                                                     OKX_FIELDS, OKX_COLUMNS)
+    return parsed
+
+
+def parse_klines(body):
+    """
+    Ответ Bybit /v5/market/kline → {'retCode', 'retMsg', 'ts', 'ohlcv'}.
+    ts и ohlcv отсутствуют, если в ответе нет списка свечей (ошибка API).
+    """
+    return _parse_list(body, _LIST, _RET_CODE, _RET_MSG, _bybit_json, KLINE_FIELDS)
+
+
+def parse_okx_klines(body):
+    """Ответ OKX /api/v5/market/candles → {'retCode', 'retMsg', 'ts', 'ohlcv'}"""
+    return _parse_list(body, _DATA, _OKX_CODE, _OKX_MSG, _okx_json, OKX_FIELDS, OKX_COLUMNS)
+
+
+def parse_binance_klines(body):
+    """Ответ Binance /fapi/v1/klines (массив свечей по возрастанию) → {'retCode', 'retMsg', 'ts', 'ohlcv'}"""
+    body = body.strip()
+    if body[:1] != b'[':
+        payload = loads(body)  # Ошибка API: {"code": ..., "msg": ...}
+        return {'retCode': payload.get('code'), 'retMsg': payload.get('msg', '')}
+    values = _fast_rows(body, 1, len(body) - 1, BINANCE_FIELDS)
+    if values is None:
+        values = loads(body) or np.empty((0, BINANCE_FIELDS))
+    ts, ohlcv = kline_arrays(values, BINANCE_FIELDS, descending=False)
+    return {'retCode': 0, 'retMsg': '', 'ts': ts, 'ohlcv': ohlcv}
@@ -1,29 +1,171 @@
+"""
+Логирование без ввода-вывода в event loop.
+
+log() только кладёт запись в очередь (QueueHandler); файл и консоль пишет фоновый
+поток QueueListener. Сообщение форматируется лениво, уже в этом потоке:
+log("Получено %d свечей для %s", n, symbol, level="DEBUG") ничего не стоит, если
+DEBUG выключен, поэтому аргументы должны быть неизменяемыми значениями.
+
+Поток записи запускает start_logging() — только основной процесс (start_bot, утилиты
+командной строки); до запуска записи копятся в очереди. Импорт модуля ничего не
+запускает, поэтому процессы-воркеры не открывают свой bot.log: в процессах-воркерах
+шардинга и пулов процессов (графики, анализ, бэктест) forward_logging передаёт записи
+основному процессу — пулам очередь для этого даёт forward_target().
+
+configure_logging(config) применяет log_level, log_format ('text' или 'json' —
+JSON-строки в bot.log) и log_debug_every: DEBUG-записи пишутся только в каждом
+N-м цикле сканирования (begin_cycle отмечает начало цикла).
+"""
+import atexit
+import io
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import multiprocessing
+import queue
 import sys
-import io
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
 
 # Настройка логгера
 logger = logging.getLogger("TradingBot")
 logger.setLevel(logging.INFO)  # Default level, будет изменен в bot.py
+logger.propagate = False
 
-handler = RotatingFileHandler("bot.log", maxBytes=10_000_000, backupCount=5, encoding='utf-8')
 formatter = logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: время, уровень, номер цикла, сообщение"""
+
+    def format(self, record):
+        entry = {"ts": self.formatTime(record), "level": record.levelname,
+                 "cycle": getattr(record, "cycle", None), "msg": record.getMessage()}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: запись уходит в очередь как есть"""
+
+    def prepare(self, record):
+        return record
+
+
+class ForwardHandler(QueueHandler):
+    """Процесс-воркер: запись с уже отформатированным сообщением уходит координатору как ('log', запись)"""
+
+    def enqueue(self, record):
+        self.queue.put_nowait(('log', record))
+
+
+# delay: файл открывается при первой записи — процессы-воркеры его не держат открытым
+handler = RotatingFileHandler("bot.log", maxBytes=10_000_000, backupCount=5, encoding='utf-8', delay=True)
 handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 console_handler = logging.StreamHandler(stream=io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace'))
 console_handler.setFormatter(formatter)
 console_handler.setLevel(logging.INFO)
-logger.addHandler(console_handler)
-
-def log(msg, level="INFO"):
-    level = level.upper()
-    if level == "ERROR":
-        logger.error(msg)
-    elif level == "WARNING":
-        logger.warning(msg)
-    elif level == "DEBUG":
-        logger.debug(msg)
-    else:
-        logger.info(msg)
\ No newline at end of file
+
+_queue = queue.SimpleQueue()
+logger.addHandler(DeferredQueueHandler(_queue))
+listener = QueueListener(_queue, handler, console_handler, respect_handler_level=True)
+_running = False
+
+_forward_queue = None  # Очередь записей из процессов пулов (forward_target)
+_forward_thread = None
+
+_cycle = 0
+_debug_every = 1
+_debug_enabled = True  # DEBUG в текущем цикле попадает в выборку
+
+
+def log(msg, *args, level="INFO"):
+    level = LEVELS.get(level.upper(), logging.INFO)
+    if not logger.isEnabledFor(level) or (level == logging.DEBUG and not _debug_enabled):
+        return
+    logger.log(level, msg, *args, extra={"cycle": _cycle})
+
+
+def begin_cycle():
+    """Начало цикла сканирования: номер цикла в записях и выборка DEBUG по log_debug_every"""
+    global _cycle, _debug_enabled
+    _cycle += 1
+    _debug_enabled = _cycle % _debug_every == 0
+
+
+def set_level(level_name):
+    """Применяет уровень логирования из конфигурации к логгеру и его обработчикам"""
+    level = getattr(logging, str(level_name).upper(), logging.INFO)
+    logger.setLevel(level)
+    for h in (handler, console_handler):
+        h.setLevel(level)
+
+
+def configure_logging(config):
+    """Уровень, формат файла и выборка DEBUG из конфигурации"""
+    global _debug_every, _debug_enabled
+    set_level(config.get('log_level', 'INFO'))
+    handler.setFormatter(JsonFormatter() if config.get('log_format', 'text') == 'json' else formatter)
+    _debug_every = max(int(config.get('log_debug_every', 1)), 1)
+    _debug_enabled = _cycle % _debug_every == 0
+
+
+def start_logging():
+    """Запускает поток записи в файл и консоль; повторный вызов безопасен"""
+    global _running
+    if not _running:
+        _running = True
+        listener.start()
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток записи; повторный вызов безопасен"""
+    global _running, _forward_queue, _forward_thread
+    if _forward_thread is not None:
+        _forward_queue.put(None)
+        _forward_thread.join(timeout=1)
+        _forward_queue = _forward_thread = None
+    if _running:
+        _running = False
+        listener.stop()
+
+
+def forward_logging(target, level=None):
+    """
+    Процесс-воркер: вместо своего файла и консоли записи уходят в очередь target
+    (multiprocessing), их пишет основной процесс. level — уровень основного процесса
+    (инициализатор пула), воркеры шардинга берут его из своей конфигурации.
+    """
+    stop_logging()
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+    logger.addHandler(ForwardHandler(target))
+    if level is not None:
+        logger.setLevel(level)
+
+
+def _receive(source):
+    while True:
+        message = source.get()
+        if message is None:
+            return
+        logger.handle(message[1])
+
+
+def forward_target():
+    """
+    Очередь для forward_logging в инициализаторе пула процессов: записи воркеров
+    из неё пишет этот процесс своими обработчиками. Очередь и поток приёма — одни на процесс.
+    """
+    global _forward_queue, _forward_thread
+    if _forward_thread is None:
+        _forward_queue = multiprocessing.get_context('spawn').Queue()
+        _forward_thread = threading.Thread(target=_receive, args=(_forward_queue,), name='log-forward', daemon=True)
+        _forward_thread.start()
+    return _forward_queue
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,180 @@
+"""
+Метрики конвейера сканирования в формате Prometheus.
+
+Гистограммы по этапам (тикеры, свечи, разбор JSON, analyze, график, Telegram),
+счётчики ошибок/пустых кадров/сигналов, лаг event loop и необязательный
+HTTP-эндпоинт /metrics. В режиме шардинга воркеры передают накопленные счётчики
+и гистограммы координатору (collect/merge), gauge остаются метриками процесса координатора.
+"""
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from aiohttp import web
+from monitor.logger import log
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self):
+        values, self.values = self.values, {}
+        return values
+
+    def merge(self, values):
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in (self.values or {(): 0}).items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Значение задаётся set() или вычисляется функцией при каждом запросе /metrics"""
+
+    def __init__(self, name, help_text, func=None):
+        self.name, self.help = name, help_text
+        self.func = func
+        self.value = 0.0
+        _registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        value = self.func() if self.func is not None else self.value
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        _registry.append(self)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def collect(self):
+        state = self.counts, self.sum, self.count
+        self.counts, self.sum, self.count = [0] * (len(self.buckets) + 1), 0.0, 0
+        return state
+
+    def merge(self, state):
+        counts, total, count = state
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+tickers_fetch_seconds = Histogram('pump_tickers_fetch_seconds', 'Загрузка /v5/market/tickers')
+kline_fetch_seconds = Histogram('pump_kline_fetch_seconds', 'Загрузка свечей одного символа')
+json_parse_seconds = Histogram('pump_json_parse_seconds', 'Разбор JSON-ответа Bybit',
+                               buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+analyze_symbol_seconds = Histogram('pump_analyze_symbol_seconds', 'analyze одного символа')
+analyze_batch_seconds = Histogram('pump_analyze_batch_seconds', 'Пакетный analyze набора символов')
+chart_seconds = Histogram('pump_chart_render_seconds', 'Построение графика сигнала')
+telegram_send_seconds = Histogram('pump_telegram_send_seconds', 'Отправка сообщения в Telegram')
+cycle_seconds = Histogram('pump_cycle_seconds', 'Полный цикл run_monitor')
+loop_lag_seconds = Histogram('pump_event_loop_lag_seconds', 'Задержка event loop',
+                             buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+errors_total = Counter('pump_errors_total', 'Ошибки по этапам')
+empty_frames_total = Counter('pump_empty_frames_total', 'Пустые DataFrame после загрузки свечей')
+signals_total = Counter('pump_signals_total', 'Сгенерированные сигналы')
+symbols_total = Counter('pump_symbols_processed_total', 'Обработанные символы')
+loop_lag_max = Gauge('pump_event_loop_lag_max_seconds', 'Максимальный лаг event loop с момента старта')
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def collect():
+    """Счётчики и гистограммы, накопленные с прошлого вызова, по именам; сами метрики обнуляются"""
+    return {metric.name: metric.collect() for metric in _registry
+            if isinstance(metric, (Counter, Histogram)) and (metric.values if isinstance(metric, Counter) else metric.count)}
+
+
+def merge(snapshot):
+    """Добавляет к метрикам процесса результат collect() другого процесса"""
+    by_name = {metric.name: metric for metric in _registry}
+    for name, state in snapshot.items():
+        if name in by_name:
+            by_name[name].merge(state)
+
+
+async def monitor_loop_lag(interval=0.5):
+    """Фоновая задача: насколько позже запланированного просыпается event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        loop_lag_seconds.observe(lag)
+        if lag > loop_lag_max.value:
+            loop_lag_max.set(lag)
+
+
+async def start_metrics_server(config):
+    """Запускает HTTP /metrics, если metrics_enabled; возвращает runner для остановки"""
+    if not config.get('metrics_enabled', False):
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    host, port = config.get('metrics_host', '0.0.0.0'), config.get('metrics_port', 80)
+    await web.TCPSite(runner, host, port).start()
+    log(f"Метрики доступны на http://{host}:{port}/metrics", level="INFO")
+    return runner
@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+import aiohttp
+from monitor.exchanges import BYBIT
+from monitor.logger import log
+
+
+class RequestScheduler:
+    """
+    Планировщик REST-запросов к бирже (по умолчанию Bybit; признак троттлинга задаёт throttled).
+    Token bucket ограничивает частоту, адаптивный лимит параллельности меняется по AIMD:
+    +1 после каждых `concurrency` успешных ответов, вдвое меньше при троттлинге — не чаще
+    одного раза за событие перегрузки: ответы запросов, ушедших до снижения, и сигналы
+    до сброса лимита (или throttle_window секунд) считаются тем же событием.
+    Учитывает заголовки X-Bapi-Limit-Status / X-Bapi-Limit-Reset-Timestamp
+    и повторяет запросы с экспоненциальной задержкой и джиттером.
+    """
+
+    def __init__(self, config=None, throttled=None, name='Bybit'):
+        config = config or {}
+        self.name = name
+        self.throttled = throttled or BYBIT.throttled  # (status, data) → ответ означает превышение лимита
+        share = config.get('rate_limit_share', 1.0)  # Доля лимита по IP: воркеры шардинга делят его поровну
+        self.rate = config.get('rate_limit_rps', 50) * share
+        self.burst = max(1.0, config.get('rate_limit_burst', 20) * share)
+        self.min_concurrency = config.get('min_concurrency', 4)
+        self.max_concurrency = config.get('max_concurrency', 64)
+        self.concurrency = config.get('initial_concurrency', 25)
+        self.max_retries = config.get('request_retries', 3)
+        self.backoff_base = config.get('backoff_base', 0.5)
+        self.backoff_max = config.get('backoff_max', 10)
+        self.low_watermark = config.get('rate_limit_low_watermark', 0.1)
+        self.throttle_window = config.get('throttle_window', 1.0)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._pause_until = 0.0
+        self._throttle_until = 0.0  # До этого момента троттлинг — продолжение текущего события
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = None
+        self.queue_depth = 0
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttle_events = 0
+
+    def metrics(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'in_flight': self._in_flight,
+            'concurrency': self.concurrency,
+            'tokens': round(self._tokens, 2),
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'throttle_events': self.throttle_events
+        }
+
+    async def _acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        self.queue_depth += 1
+        try:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._in_flight < self.concurrency)
+                self._in_flight += 1
+        finally:
+            self.queue_depth -= 1
+        try:
+            await self._take_token()
+        except BaseException:  # Отмена во время ожидания токена или паузы не должна занять слот навсегда
+            await self._release()
+            raise
+
+    async def _release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._pause_until:
+                await asyncio.sleep(self._pause_until - now)
+                continue
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _on_success(self):
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self._successes = 0
+            if self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+
+    def _on_throttle(self):
+        now = time.monotonic()
+        self._successes = 0
+        if now < self._throttle_until:
+            return
+        self._throttle_until = max(now + self.throttle_window, self._pause_until)
+        self.throttle_events += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        log(f"Троттлинг {self.name}: параллельность снижена до {self.concurrency}", level="warning")
+
+    def _observe(self, headers):
+        """
+        Разбор X-Bapi-Limit-*; при почти исчерпанном лимите — пауза до сброса окна.
+        Это запас, а не отказ биржи: параллельность не снижается, событие троттлинга не считается.
+        """
+        try:
+            remaining = headers.get('X-Bapi-Limit-Status')
+            limit = headers.get('X-Bapi-Limit')
+            if remaining is None or limit is None:
+                return
+            remaining, limit = int(remaining), int(limit)
+            if limit > 0 and remaining <= limit * self.low_watermark:
+                reset_ms = headers.get('X-Bapi-Limit-Reset-Timestamp')
+                pause = max(0.0, int(reset_ms) / 1000 - time.time()) if reset_ms else 1.0
+                self._pause_until = max(self._pause_until, time.monotonic() + min(pause, self.backoff_max))
+        except (TypeError, ValueError):
+            pass
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    async def request(self, send):
+        """
+        Выполняет send() → (status, headers, data) с учётом лимитов и повторов.
+        Возвращает (status, data) последней попытки.
+        """
+        status, data = None, None
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            try:
+                self.requests += 1
+                status, headers, data = await send()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.errors += 1
+                status, headers, data = None, {}, None
+                error = e
+            else:
+                error = None
+            finally:
+                await self._release()
+            self._observe(headers)
+            throttled = self.throttled(status, data)
+            if status == 200 and not throttled:
+                self._on_success()
+                return status, data
+            if throttled:
+                self._on_throttle()
+            elif error is None and status is not None and status < 500:
+                return status, data  # Ошибка клиента — повтор не поможет
+            if attempt == self.max_retries:
+                if error is not None:
+                    raise error
+                break
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+        return status, data
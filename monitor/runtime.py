@@ -0,0 +1,185 @@
+"""
+Среда выполнения бота: один event loop владеет HTTP-клиентом, Telegram-приложением,
+потоком свечей и периодическими задачами.
+
+Периодические задачи (сканирование, обновление потока) — циклы внутри Runtime, а не
+задания планировщика: следующий запуск начинается не раньше окончания предыдущего и
+ставится на границу расписания (для 60 с — закрытие минутной свечи), поэтому запуски
+не перекрываются, а время старта не зависит от момента запуска процесса. Если задача
+не уложилась до следующей границы, она пропускается и учитывается в
+pump_scan_overruns_total.
+
+Расписания: interval_schedule — границы фиксированного интервала, candle_schedule —
+закрытие свечей рабочего таймфрейма с небольшой задержкой (биржа успевает закрыть
+свечу), hot_schedule — промежуточные сканы между закрытиями.
+
+SIGTERM/SIGINT прекращают новые запуски; идущая задача дорабатывает не дольше
+drain_timeout секунд, затем ресурсы закрываются в порядке, обратном открытию.
+Повторный сигнал прерывает ожидание.
+"""
+import asyncio
+import contextlib
+import math
+import signal
+import time
+from monitor import metrics
+from monitor.candles import TIMEFRAME_MS
+from monitor.logger import log
+
+scan_overruns_total = metrics.Counter('pump_scan_overruns_total', 'Пропущенные запуски периодических задач из-за долгого цикла')
+
+
+def next_boundary(now, interval, offset=0.0):
+    """Ближайший момент k * interval + offset (секунды эпохи) строго позже now"""
+    return (math.floor((now - offset) / interval) + 1) * interval + offset
+
+
+def interval_schedule(interval):
+    """Расписание по границам interval секунд (не чаще раза в секунду); interval — число или функция"""
+    return lambda now: next_boundary(now, max(interval() if callable(interval) else interval, 1))
+
+
+def candle_schedule(timeframe, delay):
+    """Расписание по закрытию свечей: через delay() секунд после начала каждой свечи timeframe()"""
+    return lambda now: next_boundary(now, TIMEFRAME_MS[timeframe()] / 1000, delay())
+
+
+def hot_schedule(interval, timeframe, delay):
+    """
+    Сканы внутри свечи каждые interval() секунд со сдвигом delay(), кроме моментов,
+    совпадающих с закрытием свечи timeframe(): их занимает основной скан
+    """
+    def schedule(now):
+        step, offset = max(int(interval()), 1), delay()
+        boundary = math.floor((now - offset) / step) * step + step
+        if boundary * 1000 % TIMEFRAME_MS[timeframe()] == 0:
+            boundary += step
+        return boundary + offset
+    return schedule
+
+
+class Runtime:
+    """
+    Владелец ресурсов и фоновых задач бота.
+    Ресурсы регистрируются в stack (contextlib.AsyncExitStack) по мере открытия,
+    фоновые задачи — через spawn (служебные) и every (периодические).
+    """
+
+    def __init__(self, drain_timeout=30):
+        self.drain_timeout = drain_timeout
+        self.stack = contextlib.AsyncExitStack()
+        self._stopping = None
+        self._services = set()  # Служебные задачи: отменяются сразу при остановке
+        self._jobs = set()  # Периодические задачи: идущий запуск дорабатывает до drain_timeout
+        self._signals = []
+
+    @property
+    def stopping(self):
+        return self._stopping is not None and self._stopping.is_set()
+
+    def stop(self, reason=""):
+        """Начинает остановку; повторный вызов отменяет задачи, не дожидаясь их завершения"""
+        if self.stopping:
+            log("Повторный сигнал остановки: незавершённые задачи отменяются", level="WARNING")
+            for task in self._jobs:
+                task.cancel()
+            return
+        log(f"Остановка бота{': ' + reason if reason else ''}", level="INFO")
+        self._stopping.set()
+
+    def spawn(self, coro, name):
+        """Служебная задача до остановки бота; её падение останавливает бот"""
+        return self._track(asyncio.create_task(coro, name=name), self._services)
+
+    def every(self, name, schedule, job, immediate=False):
+        """
+        Запускает корутину job() в моменты schedule(now) → следующий запуск (time.time()).
+        Запуски идут строго по очереди; immediate — первый запуск сразу.
+        """
+        return self._track(asyncio.create_task(self._periodic(name, schedule, job, immediate), name=name), self._jobs)
+
+    def _track(self, task, group):
+        group.add(task)
+        task.add_done_callback(lambda t: self._on_done(t, group))
+        return task
+
+    def _on_done(self, task, group):
+        group.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        log(f"Задача {task.get_name()} завершилась с ошибкой: {task.exception()!r}", level="ERROR")
+        metrics.errors_total.inc(stage='runtime')
+        self.stop(f"сбой задачи {task.get_name()}")
+
+    async def sleep_until(self, deadline):
+        """Ждёт момента deadline (time.time()); False — если раньше началась остановка"""
+        delay = deadline - time.time()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        return not self.stopping
+
+    async def _periodic(self, name, schedule, job, immediate):
+        start_at = time.time() if immediate else schedule(time.time())
+        while await self.sleep_until(start_at):
+            started = time.time()
+            try:
+                await job()
+            except Exception as e:
+                log(f"Ошибка задачи {name}: {e!r}", level="ERROR")
+                metrics.errors_total.inc(stage=name)
+            finished = time.time()
+            start_at = schedule(finished)
+            if schedule(started) < finished:
+                scan_overruns_total.inc(job=name)
+                log(f"Задача {name} длилась {finished - started:.1f} сек и пропустила запуск, "
+                    f"следующий в {time.strftime('%H:%M:%S', time.gmtime(start_at))} UTC", level="WARNING")
+
+    def _install_signals(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop, sig.name)
+                self._signals.append(sig)
+            except (NotImplementedError, RuntimeError):
+                # Windows: обработчик сигнала вызывается вне event loop
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(self.stop, signal.Signals(signum).name))
+
+    def _remove_signals(self):
+        loop = asyncio.get_running_loop()
+        for sig in self._signals:
+            loop.remove_signal_handler(sig)
+        self._signals.clear()
+
+    async def _drain(self):
+        for task in list(self._services):
+            task.cancel()
+        if self._jobs:
+            log(f"Ожидание завершения текущих задач (до {self.drain_timeout} сек)", level="INFO")
+            done, pending = await asyncio.wait(list(self._jobs), timeout=self.drain_timeout)
+            for task in pending:
+                log(f"Задача {task.get_name()} не завершилась за {self.drain_timeout} сек, отмена", level="WARNING")
+                task.cancel()
+        await asyncio.gather(*self._services, *self._jobs, return_exceptions=True)
+
+    async def run(self, setup):
+        """
+        Выполняет setup(runtime) — открытие ресурсов и запуск задач — и работает до сигнала
+        остановки или падения фоновой задачи; затем дожидается задач и закрывает ресурсы.
+        """
+        self._stopping = asyncio.Event()
+        self._install_signals()
+        try:
+            async with self.stack:
+                try:
+                    await setup(self)
+                    await self._stopping.wait()
+                finally:
+                    if not self.stopping:
+                        self._stopping.set()
+                    await self._drain()
+        finally:
+            self._remove_signals()
+        log("Бот остановлен", level="INFO")
@@ -0,0 +1,125 @@
+"""
+Быстрый предварительный отбор символов по снимку /v5/market/tickers.
+
+Снимок хранится колонками NumPy. Между соседними снимками считаются изменения
+цены, оборота и открытого интереса для всех символов сразу; дорогую загрузку
+свечей и analyze проходят только символы, превысившие порог, плюс символы,
+которые давно не сканировались полностью (медленный полный проход).
+"""
+import math
+import time
+import numpy as np
+from monitor.logger import log
+
+TICKER_FIELDS = ['lastPrice', 'prevPrice1h', 'price24hPcnt', 'turnover24h', 'openInterest']
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TickerSnapshot:
+    """Снимок тикеров: отсортированный массив символов и столбцы float64"""
+
+    def __init__(self, symbols, columns, timestamp=None):
+        order = np.argsort(symbols)
+        self.symbols = np.asarray(symbols)[order]
+        self.columns = {name: np.asarray(values, dtype=np.float64)[order] for name, values in columns.items()}
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_items(cls, items, timestamp=None):
+        """Из списка result.list ответа Bybit"""
+        symbols = [item['symbol'] for item in items]
+        rows = np.array([[_to_float(item.get(field)) for field in TICKER_FIELDS] for item in items],
+                        dtype=np.float64).reshape(len(items), len(TICKER_FIELDS))
+        return cls(symbols, {field: rows[:, i] for i, field in enumerate(TICKER_FIELDS)}, timestamp)
+
+    def subset(self, symbols):
+        """Снимок только по указанным символам"""
+        mask = np.isin(self.symbols, list(symbols))
+        return TickerSnapshot(self.symbols[mask], {k: v[mask] for k, v in self.columns.items()}, self.timestamp)
+
+    def align(self, other):
+        """Индексы строк other для символов self и маска найденных"""
+        if not len(other):
+            return np.zeros(len(self), dtype=np.int64), np.zeros(len(self), dtype=bool)
+        idx = np.searchsorted(other.symbols, self.symbols)
+        idx = np.minimum(idx, len(other) - 1)
+        return idx, other.symbols[idx] == self.symbols
+
+
+def _pct_change(current, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - previous) / previous * 100
+    return np.where(np.isfinite(change), change, 0.0)
+
+
+class TickerScreener:
+    """
+    Отбор символов для полного анализа.
+    Символ «горячий», если с прошлого снимка цена изменилась больше prefilter_price_pct,
+    24h-оборот вырос больше prefilter_turnover_pct или OI изменился больше prefilter_oi_pct (в %).
+    Остальные символы проходят полный анализ не реже раза в prefilter_full_scan_interval секунд.
+    """
+
+    def __init__(self, config=None):
+        self.previous = None
+        self.last_scan = {}
+        self.configure(config or {})
+
+    def configure(self, config):
+        self.price_pct = config.get('prefilter_price_pct', 0.3)
+        self.turnover_pct = config.get('prefilter_turnover_pct', 0.5)
+        self.oi_pct = config.get('prefilter_oi_pct', 1.0)
+        self.full_scan_interval = config.get('prefilter_full_scan_interval', 600)
+
+    def deltas(self, snapshot):
+        """Изменения цены, оборота и OI относительно прошлого снимка (в %) и маска известных символов"""
+        if self.previous is None:
+            zeros = np.zeros(len(snapshot))
+            return zeros, zeros, zeros, np.zeros(len(snapshot), dtype=bool)
+        idx, found = snapshot.align(self.previous)
+        prev = self.previous
+        price = np.where(found, _pct_change(snapshot['lastPrice'], prev['lastPrice'][idx]), 0.0)
+        turnover = np.where(found, _pct_change(snapshot['turnover24h'], prev['turnover24h'][idx]), 0.0)
+        oi = np.where(found, _pct_change(snapshot['openInterest'], prev['openInterest'][idx]), 0.0)
+        return price, turnover, oi, found
+
+    def select(self, snapshot, now=None):
+        """Список символов для загрузки свечей и analyze в этом цикле"""
+        now = time.time() if now is None else now
+        price, turnover, oi, found = self.deltas(snapshot)
+        hot = found & ((np.abs(price) >= self.price_pct) | (turnover >= self.turnover_pct) | (np.abs(oi) >= self.oi_pct))
+
+        last_scan = np.array([self.last_scan.get(s, -np.inf) for s in snapshot.symbols], dtype=np.float64)
+        never = np.isinf(last_scan)
+        overdue = ~hot & ~never & (now - last_scan >= self.full_scan_interval)
+        # Плановые полные проходы распределяются по циклам, а не все в одном
+        elapsed = now - self.previous.timestamp if self.previous is not None else self.full_scan_interval
+        budget = math.ceil(len(snapshot) * max(elapsed, 1) / max(self.full_scan_interval, 1))
+        overdue_idx = np.flatnonzero(overdue)
+        if len(overdue_idx) > budget:
+            overdue_idx = overdue_idx[np.argsort(last_scan[overdue_idx])[:budget]]
+        selected = hot | never
+        selected[overdue_idx] = True
+
+        symbols = snapshot.symbols[selected].tolist()
+        for symbol in symbols:
+            self.last_scan[symbol] = now
+        active = set(snapshot.symbols.tolist())
+        for symbol in [s for s in self.last_scan if s not in active]:
+            del self.last_scan[symbol]
+        self.previous = snapshot
+        log(f"Префильтр: {int(hot.sum())} горячих, {int(never.sum())} новых, {len(overdue_idx)} плановых "
+            f"из {len(snapshot)}", level="INFO")
+        return symbols
@@ -1,57 +1,230 @@
+import asyncio
+import copy
 import json
 import os
+from types import MappingProxyType
+from monitor.exchanges import EXCHANGES
 from monitor.logger import log
 import aiofiles  # Исправлен импорт
 
 CONFIG_PATH = "config.json"
+DATA_DIR = "/data"  # Постоянный том Amvera (persistenceMount в amvera.yml)
+
+TIMEFRAMES = ['1m', '5m', '15m', '1h']
+
+DEFAULT_CONFIG = {
+    "telegram_token": "",
+    "chat_id": "",
+    "timeframe": "1m",
+    "volume_filter": 5000000.0,
+    "price_change_threshold": 0.5,
+    "bot_status": True,
+    "indicators_enabled": {
+        "price_change": True,
+        "rsi": True,
+        "macd": True,
+        "volume_surge": True,
+        "bollinger": True,
+        "adx": True,
+        "rsi_macd_divergence": True,
+        "candle_patterns": True,
+        "volume_pre_surge": True,
+        "ema_crossover": True,
+        "obv": True
+    },
+    "min_indicators": 1,
+    "required_indicators": [],
+    "cache_tickers": True,
+    "cache_duration": 300,
+    "log_level": "INFO"
+}
+
+
+def data_path(name):
+    """Путь name на постоянном томе, если он смонтирован, иначе None"""
+    return os.path.join(DATA_DIR, name) if os.path.isdir(DATA_DIR) else None
+
+
+def freeze(value):
+    """Неизменяемая копия конфигурации: dict → MappingProxyType, list → tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Изменяемая копия замороженной конфигурации"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return copy.deepcopy(value)
+
+
+def validate_config(config):
+    """Проверяет типы и диапазоны; отсутствующие ключи дополняются значениями по умолчанию"""
+    if not isinstance(config, dict):
+        raise ValueError("Конфигурация должна быть JSON-объектом")
+    result = copy.deepcopy(DEFAULT_CONFIG)
+    result.update(config)
+    if result['timeframe'] not in TIMEFRAMES:
+        raise ValueError(f"Неверный таймфрейм: {result['timeframe']}")
+    for key in ('volume_filter', 'price_change_threshold', 'cache_duration'):
+        if isinstance(result[key], bool) or not isinstance(result[key], (int, float)) or result[key] < 0:
+            raise ValueError(f"{key} должен быть неотрицательным числом")
+    if isinstance(result['min_indicators'], bool) or not isinstance(result['min_indicators'], int) or result['min_indicators'] < 1:
+        raise ValueError("min_indicators должен быть целым числом >= 1")
+    if not isinstance(result['indicators_enabled'], dict) or \
+            not all(isinstance(v, bool) for v in result['indicators_enabled'].values()):
+        raise ValueError("indicators_enabled должен быть объектом {индикатор: true/false}")
+    if not isinstance(result['required_indicators'], list) or \
+            not all(isinstance(v, str) for v in result['required_indicators']):
+        raise ValueError("required_indicators должен быть списком имён индикаторов")
+    for key in ('scan_interval', 'shutdown_timeout'):
+        value = result.get(key, 1)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"{key} должен быть положительным числом")
+    if result.get('scan_schedule', 'interval') not in ('interval', 'candle_close'):
+        raise ValueError("scan_schedule должен быть 'interval' или 'candle_close'")
+    if result.get('log_format', 'text') not in ('text', 'json'):
+        raise ValueError("log_format должен быть 'text' или 'json'")
+    if isinstance(result.get('log_debug_every', 1), bool) or not isinstance(result.get('log_debug_every', 1), int) or \
+            result.get('log_debug_every', 1) < 1:
+        raise ValueError("log_debug_every должен быть целым числом >= 1")
+    for key in ('scan_close_delay_ms', 'hot_scan_interval'):
+        value = result.get(key, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{key} должен быть неотрицательным числом")
+    if result.get('analysis_executor', 'thread') not in ('none', 'thread', 'process'):
+        raise ValueError("analysis_executor должен быть 'none', 'thread' или 'process'")
+    for key, minimum in (('analysis_workers', 0), ('analysis_batch_size', 1), ('analysis_max_batches', 1)):
+        value = result.get(key, minimum)
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise ValueError(f"{key} должен быть целым числом >= {minimum}")
+    workers = result.get('shard_workers', 0)
+    if isinstance(workers, bool) or not isinstance(workers, int) or workers < 0:
+        raise ValueError("shard_workers должен быть целым неотрицательным числом")
+    exchanges = result.get('exchanges', ['bybit'])
+    if not isinstance(exchanges, list) or not exchanges or not all(name in EXCHANGES for name in exchanges):
+        raise ValueError(f"exchanges должен быть непустым списком из {', '.join(EXCHANGES)}")
+    limits = result.get('exchange_limits') or {}
+    if not isinstance(limits, dict) or not all(name in EXCHANGES and isinstance(v, dict) for name, v in limits.items()):
+        raise ValueError("exchange_limits должен быть объектом {биржа: {настройка лимита: значение}}")
+    urls = result.get('exchange_urls') or {}
+    if not isinstance(urls, dict) or not all(name in EXCHANGES and isinstance(v, str) for name, v in urls.items()):
+        raise ValueError("exchange_urls должен быть объектом {биржа: адрес REST API}")
+    confirm = result.get('confirm_timeframes') or {}
+    if not isinstance(confirm, dict) or \
+            not all(isinstance(v, list) and all(isinstance(n, str) for n in v) for v in confirm.values()):
+        raise ValueError("confirm_timeframes должен быть объектом {таймфрейм: [индикаторы]}")
+    base = TIMEFRAMES.index(result['timeframe'])
+    for timeframe in confirm:
+        if timeframe not in TIMEFRAMES or TIMEFRAMES.index(timeframe) <= base:
+            raise ValueError(f"confirm_timeframes: {timeframe} должен быть старше таймфрейма {result['timeframe']}")
+    return result
+
+
+class ConfigService:
+    """
+    Конфигурация в памяти в виде неизменяемого снимка.
+    Файл перечитывается только при смене mtime/inode/размера или после save;
+    подписчики получают (new, old) при каждом изменении снимка.
+    """
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self.snapshot = None
+        self._stamp = None
+        self._subscribers = []
+        self._lock = asyncio.Lock()
+
+    def subscribe(self, callback):
+        """callback(new, old) — обычная функция или корутина"""
+        self._subscribers.append(callback)
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    async def get(self):
+        """Актуальный снимок; диск читается только если файл изменился"""
+        try:
+            stamp = self._file_stamp()
+        except FileNotFoundError:
+            stamp = None
+        if self.snapshot is not None and stamp == self._stamp:
+            return self.snapshot
+        async with self._lock:
+            if stamp is None:
+                log(f"Файл {self.path} не найден, создаётся новый", level="WARNING")
+                await self.save(copy.deepcopy(DEFAULT_CONFIG))
+                return self.snapshot
+            if self.snapshot is not None and stamp == self._stamp:
+                return self.snapshot
+            try:
+                async with aiofiles.open(self.path, 'r', encoding='utf-8') as f:
+                    content = await f.read()
+                config = validate_config(json.loads(content))
+            except Exception as e:
+                log(f"Ошибка загрузки конфигурации: {str(e)}", level="ERROR")
+                if self.snapshot is None:
+                    raise
+                self._stamp = stamp  # Не перечитываем битый файл до следующего изменения
+                return self.snapshot
+            self._stamp = stamp
+            masked = {**config, 'telegram_token': '***' if config.get('telegram_token') else ''}
+            log("Конфигурация загружена: %s", masked, level="DEBUG")
+            await self._publish(freeze(config))
+            return self.snapshot
+
+    async def save(self, config):
+        """Атомарная запись: временный файл + rename, затем обновление снимка"""
+        config = validate_config(thaw(config))
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = os.path.join(directory, f".{os.path.basename(self.path)}.{os.getpid()}.tmp")
+        try:
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(config, indent=4, ensure_ascii=False))
+                await f.flush()
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._stamp = self._file_stamp()
+        await self._publish(freeze(config))
+
+    async def _publish(self, snapshot):
+        old, self.snapshot = self.snapshot, snapshot
+        if old is None or thaw(old) == thaw(snapshot):
+            return
+        for callback in self._subscribers:
+            try:
+                result = callback(snapshot, old)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                log(f"Ошибка подписчика конфигурации: {str(e)}", level="ERROR")
+
+
+config_service = ConfigService()
+
+
+async def get_config():
+    """Неизменяемый снимок конфигурации для горячего пути"""
+    return await config_service.get()
+
 
 async def load_config():
-    """Загружает конфигурацию из config.json"""
-    try:
-        if not os.path.exists(CONFIG_PATH):
-            log(f"Файл {CONFIG_PATH} не найден, создаётся новый", level="WARNING")
-            default_config = {
-                "telegram_token": "",
-                "chat_id": "",
-                "timeframe": "1m",
-                "volume_filter": 5000000.0,
-                "price_change_threshold": 0.5,
-                "bot_status": True,
-                "indicators_enabled": {
-                    "price_change": True,
-                    "rsi": True,
-                    "macd": True,
-                    "volume_surge": True,
-                    "bollinger": True,
-                    "adx": True,
-                    "rsi_macd_divergence": True,
-                    "candle_patterns": True,
-                    "volume_pre_surge": True,
-                    "ema_crossover": True,
-                    "obv": True
-                },
-                "min_indicators": 1,
-                "required_indicators": [],
-                "cache_tickers": True,
-                "cache_duration": 300,
-                "log_level": "INFO"
-            }
-            await save_config(default_config)
-            return default_config
-        async with aiofiles.open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-            content = await f.read()
-            config = json.loads(content)
-            log(f"Конфигурация загружена: {config}", level="INFO")
-            return config
-    except Exception as e:
-        log(f"Ошибка загрузки конфигурации: {str(e)}", level="ERROR")
-        raise
+    """Загружает конфигурацию из config.json (изменяемая копия снимка)"""
+    return thaw(await config_service.get())
+
 
 async def save_config(config):
     """Сохраняет конфигурацию в config.json"""
     try:
-        async with aiofiles.open(CONFIG_PATH, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(config, indent=4, ensure_ascii=False))
+        await config_service.save(config)
         log(f"Конфигурация сохранена в {CONFIG_PATH}", level="INFO")
     except PermissionError:
         log(f"Ошибка: Нет прав для записи в {CONFIG_PATH}", level="ERROR")
@@ -78,4 +251,4 @@ def human_readable_number(number):
         return f"{number / 1_000_000:.1f}M"
     elif number >= 1_000:
         return f"{number / 1_000:.1f}K"
-    return str(number)
\ No newline at end of file
+    return str(number)
@@ -0,0 +1,214 @@
+"""
+Шардинг вселенной символов по процессам-воркерам.
+
+Координатор (основной процесс бота) получает тикеры, делит их между shard_workers
+процессами по консистентному хешу монеты и собирает сигналы обратно через очереди
+multiprocessing; проверка повторов и отправка в Telegram остаются в одной точке —
+в координаторе. Каждый воркер — отдельный процесс со своим event loop, HTTP-клиентами,
+буферами свечей и инкрементальными индикаторами, поэтому загрузка и analyze
+масштабируются по ядрам.
+
+Консистентный хеш держит символ на одном и том же воркере от цикла к циклу (кеш
+свечей остаётся тёплым), а при смене числа воркеров переезжает лишь около 1/N
+символов. Все биржи одной монеты попадают на один воркер.
+
+Сообщения воркера в очереди результатов: ('signal', цикл, символ, df, info),
+('done', цикл, воркер, обработано, горячие символы), ('ready', 0, воркер) после
+запуска, ('metrics', цикл, metrics.collect()) перед 'done' и при остановке — счётчики
+и гистограммы воркера добавляются к метрикам координатора, — и ('log', запись) — логи
+воркеров пишет координатор (monitor.logger.forward_logging). Gauge (лаг event loop,
+очередь планировщика бирж) отражают только процесс координатора.
+"""
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import signal
+import threading
+from monitor import metrics
+from monitor.exchanges import coin
+from monitor.logger import log, logger, forward_logging
+
+REPLICAS = 100  # Виртуальных точек на воркер: размеры частей отличаются от среднего не больше чем на ~10%
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Консистентное хеширование ключей на узлы; хеш не зависит от PYTHONHASHSEED"""
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        points = sorted((_hash(f"{node}:{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key):
+        return self._nodes[bisect.bisect(self._keys, _hash(key)) % len(self._keys)]
+
+    def partition(self, symbols, key=coin):
+        """{узел: [символы]} с сохранением порядка символов"""
+        parts = {}
+        for symbol in symbols:
+            parts.setdefault(self.node(key(symbol)), []).append(symbol)
+        return parts
+
+
+def worker_process(target, index, workers, jobs, results, config_path):
+    """Точка входа процесса-воркера: логи — координатору, дальше свой event loop с target"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C получает вся группа процессов; воркер останавливает координатор
+    forward_logging(results)
+    asyncio.run(target(index, workers, jobs, results, config_path))
+
+
+class ShardPool:
+    """
+    Процессы-воркеры и обмен с ними.
+    target(index, workers, jobs, results, config_path) — корутина цикла воркера
+    (должна импортироваться по имени); on_signal(symbol, df, info) — корутина
+    координатора, которая дедуплицирует и отправляет сигнал.
+    """
+
+    def __init__(self, workers, target, on_signal, config_path=None):
+        self.workers = workers
+        self.target = target
+        self.on_signal = on_signal
+        self.config_path = config_path
+        self.ring = HashRing(range(workers))
+        self._ctx = multiprocessing.get_context('spawn')  # Одинаково в Linux и Windows, без копии состояния бота
+        self._results = self._ctx.Queue()
+        self._jobs = [None] * workers
+        self._processes = [None] * workers
+        self._cycles = itertools.count(1)
+        self._waiting = {}  # {цикл: состояние сбора результатов}
+        self._deliveries = set()
+        self._reader = None
+        self._loop = None
+        self._ready = set()
+        self._all_ready = None
+
+    def _spawn(self, index):
+        self._jobs[index] = self._ctx.Queue()
+        process = self._ctx.Process(target=worker_process, name=f"shard-{index}", daemon=True,
+                                    args=(self.target, index, self.workers, self._jobs[index], self._results,
+                                          self.config_path))
+        process.start()
+        self._processes[index] = process
+
+    async def start(self, timeout=60):
+        """Запускает воркеры и ждёт до timeout секунд, пока они загрузятся (импорт, HTTP-клиенты, архив свечей)"""
+        self._loop = asyncio.get_running_loop()
+        self._all_ready = asyncio.Event()
+        for index in range(self.workers):
+            self._spawn(index)
+        self._reader = threading.Thread(target=self._read, name='shard-results', daemon=True)
+        self._reader.start()
+        try:
+            await asyncio.wait_for(self._all_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            log(f"Готовы {len(self._ready)} из {self.workers} воркеров за {timeout} сек", level="WARNING")
+        log(f"Шардинг: {self.workers} процессов-воркеров", level="INFO")
+
+    def _read(self):
+        """Поток чтения очереди результатов: логи пишутся сразу, остальное передаётся в event loop"""
+        while True:
+            message = self._results.get()
+            if message is None:
+                return
+            if message[0] == 'log':
+                logger.handle(message[1])
+            else:
+                self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message):
+        kind, cycle = message[0], message[1]
+        state = self._waiting.get(cycle)
+        if kind == 'signal':
+            _, _, symbol, df, info = message
+            metrics.signals_total.inc(type=info.get('type', ''))
+            task = asyncio.create_task(self._deliver(symbol, df, info))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            if state is not None:
+                state['signals'] += 1
+                state['deliveries'].append(task)
+        elif kind == 'metrics':
+            metrics.merge(message[2])
+        elif kind == 'ready':
+            self._ready.add(message[2])
+            if len(self._ready) == self.workers:
+                self._all_ready.set()
+        elif kind == 'done' and state is not None:
+            _, _, index, total, hot = message
+            self._finish(state, index, total, hot)
+
+    async def _deliver(self, symbol, df, info):
+        try:
+            await self.on_signal(symbol, df, info)
+        except Exception as e:
+            log(f"Ошибка отправки сигнала {symbol}: {str(e)}", level="ERROR")
+            metrics.errors_total.inc(stage='signal')
+
+    def _finish(self, state, index, total, hot):
+        if index not in state['pending']:
+            return
+        state['pending'].discard(index)
+        state['total'] += total
+        state['hot'].extend(hot)
+        if not state['pending'] and not state['future'].done():
+            state['future'].set_result(None)
+
+    async def scan(self, symbols, cutoff=None, universe=None):
+        """
+        Скан символов воркерами; возвращает (обработано, сигналов, горячие символы) после
+        того, как все воркеры закончили, а их сигналы переданы в on_signal.
+        universe — все активные символы при полном скане: каждый воркер получает свою часть,
+        чтобы освободить буферы ушедших символов; None — частичный скан (горячие символы)
+        """
+        cycle = next(self._cycles)
+        parts = self.ring.partition(symbols)
+        shares = self.ring.partition(universe) if universe is not None else {}
+        if universe is not None:
+            parts = {index: parts.get(index, []) for index in range(self.workers)}
+        state = {'future': self._loop.create_future(), 'pending': set(parts), 'total': 0, 'signals': 0,
+                 'hot': [], 'deliveries': []}
+        self._waiting[cycle] = state
+        try:
+            for index, part in parts.items():
+                self._jobs[index].put((cycle, part, shares.get(index, []) if universe is not None else None, cutoff))
+            log("Шардинг: %s", {index: len(part) for index, part in sorted(parts.items())}, level="DEBUG")
+            while state['pending']:
+                await asyncio.wait({state['future']}, timeout=1)
+                for index in list(state['pending']):
+                    if not self._processes[index].is_alive():
+                        log(f"Воркер shard-{index} завершился (код {self._processes[index].exitcode}), "
+                            f"перезапуск; его символы пропущены в этом цикле", level="ERROR")
+                        metrics.errors_total.inc(stage='shard')
+                        self._spawn(index)
+                        self._finish(state, index, 0, [])
+            await asyncio.gather(*state['deliveries'], return_exceptions=True)
+        finally:
+            del self._waiting[cycle]
+        return state['total'], state['signals'], state['hot']
+
+    async def stop(self, timeout=10):
+        """Просит воркеры завершиться, ждёт до timeout секунд, затем завершает оставшиеся принудительно"""
+        for jobs in self._jobs:
+            if jobs is not None:
+                jobs.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                log(f"Воркер {process.name} не завершился за {timeout} сек, принудительная остановка", level="WARNING")
+                process.terminate()
+                await loop.run_in_executor(None, process.join, 1)
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        if self._reader is not None:
+            self._results.put(None)
+            await loop.run_in_executor(None, self._reader.join)
+        log("Воркеры шардинга остановлены", level="INFO")
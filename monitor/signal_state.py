@@ -0,0 +1,155 @@
+"""
+Состояние дедупликации сигналов.
+
+Сигнал символа отправляется, если символа нет в состоянии или сработало больше
+индикаторов, чем в прошлый раз; запись живёт ttl секунд. Дополнительно
+cooldown запрещает повтор того же типа (pump/dump) по символу раньше, чем через
+cooldown секунд. Истёкшие записи вытесняются через кучу сроков, а не полным
+обходом словаря. Состояние сохраняется в JSON-файл (по умолчанию /data/signals.json
+на постоянном томе, если он смонтирован) и переживает рестарт и передеплой.
+"""
+import heapq
+import itertools
+import json
+import os
+import time
+from monitor.logger import log
+from monitor.settings import data_path
+
+DEFAULT_TTL = 3600
+
+
+class SignalState:
+    """
+    Проверка и фиксация отправки сигналов.
+    claim — атомарная проверка-и-запись (без await внутри), release откатывает
+    захват, если отправка не удалась.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, cooldown=0, path=None):
+        self.ttl = ttl
+        self.cooldown = cooldown
+        self.path = path
+        self._signals = {}  # {symbol: {'count': count_triggered, 'time': ts, 'type': type}}
+        self._sent = {}  # {(symbol, type): ts последней отправки}
+        self._heap = []  # (срок, seq, ключ, ts записи)
+        self._seq = itertools.count()
+        self._pending = {}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._signals)
+
+    def __contains__(self, symbol):
+        return symbol in self._signals
+
+    def configure(self, config):
+        self.ttl = config.get('signal_ttl', DEFAULT_TTL)
+        self.cooldown = config.get('signal_cooldown', 0)
+        self.path = config.get('signal_state_path', data_path('signals.json')) or None
+
+    def _push(self, key, stamp, lifetime):
+        heapq.heappush(self._heap, (stamp + lifetime, next(self._seq), key, stamp))
+
+    def evict(self, now=None):
+        """Удаляет истёкшие записи; возвращает число удалённых сигналов"""
+        now = time.time() if now is None else now
+        removed = 0
+        while self._heap and self._heap[0][0] < now:
+            _, _, key, stamp = heapq.heappop(self._heap)
+            if isinstance(key, tuple):
+                if self._sent.get(key) == stamp:
+                    del self._sent[key]
+            else:
+                entry = self._signals.get(key)
+                if entry is not None and entry['time'] == stamp:
+                    del self._signals[key]
+                    removed += 1
+        if removed:
+            self.dirty = True
+        return removed
+
+    def claim(self, symbol, signal_type, count, now=None):
+        """Решает, отправлять ли сигнал, и сразу фиксирует его; True — отправлять"""
+        now = time.time() if now is None else now
+        prev = self._signals.get(symbol)
+        if prev is not None and now - prev['time'] > self.ttl:
+            prev = None
+        if prev is not None and count <= prev['count']:
+            return False
+        key = (symbol, signal_type)
+        last = self._sent.get(key)
+        if last is not None and now - last < self.cooldown:
+            return False
+        if symbol in self._pending:
+            return False  # Сигнал по символу уже отправляется
+        self._pending[symbol] = (self._signals.get(symbol), {key: last})
+        self._signals[symbol] = {'count': count, 'time': now, 'type': signal_type}
+        self._sent[key] = now
+        self._push(symbol, now, self.ttl)
+        if self.cooldown:
+            self._push(key, now, self.cooldown)
+        return True
+
+    def commit(self, symbol):
+        """Отправка удалась — захват становится постоянным"""
+        if self._pending.pop(symbol, None) is not None:
+            self.dirty = True
+
+    def release(self, symbol):
+        """Отправка не удалась — восстанавливает состояние до claim"""
+        pending = self._pending.pop(symbol, None)
+        if pending is None:
+            return
+        prev, sent = pending
+        if prev is None:
+            self._signals.pop(symbol, None)
+        else:
+            self._signals[symbol] = prev
+        for key, last in sent.items():
+            if last is None:
+                self._sent.pop(key, None)
+            else:
+                self._sent[key] = last
+
+    def load(self, now=None):
+        """Читает снимок из path, пропуская истёкшие записи; возвращает число сигналов"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        now = time.time() if now is None else now
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            log(f"Ошибка загрузки состояния сигналов: {str(e)}", level="ERROR")
+            return 0
+        for symbol, entry in data.get('signals', {}).items():
+            if now - entry['time'] <= self.ttl:
+                self._signals[symbol] = {'count': entry['count'], 'time': entry['time'], 'type': entry.get('type', '')}
+                self._push(symbol, entry['time'], self.ttl)
+        for symbol, signal_type, stamp in data.get('sent', []):
+            if now - stamp < self.cooldown:
+                self._sent[(symbol, signal_type)] = stamp
+                self._push((symbol, signal_type), stamp, self.cooldown)
+        return len(self._signals)
+
+    def save(self):
+        """Атомарно записывает снимок в path (временный файл + rename), если были изменения"""
+        if not self.path or not self.dirty:
+            return False
+        data = {
+            'signals': self._signals,
+            'sent': [[symbol, signal_type, stamp] for (symbol, signal_type), stamp in self._sent.items()],
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{os.path.basename(self.path)}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.dirty = False
+        return True
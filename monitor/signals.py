@@ -1,6 +1,11 @@
+import asyncio
 import telegram
+from monitor import metrics
 from monitor.logger import log
-from monitor.charts import create_chart
+from monitor.charts import render_chart
+from monitor import delivery
+from monitor.exchanges import coin, resolve
+from monitor.analyzer import OBV_SLOPE, RAMP_BARS, RAMP_BASE, RAMP_RATIO
 
 bot_instance = None
 
@@ -10,7 +15,13 @@ async def get_bot(token):
         bot_instance = telegram.Bot(token=token)
     return bot_instance
 
-async def send_signal(symbol, df, info, config):
+async def send_signal(symbol, df, info, config, on_done=None):
+    """
+    Отправляет сигнал. При запущенной очереди доставки только ставит его в очередь
+    (график строится в фоне) и возвращает False, если сигнал сразу вытеснен.
+    on_done(sent) получает итог доставки: True после отправки в Telegram, False,
+    если сообщение вытеснено из очереди или не отправлено.
+    """
     try:
         log(f"Начало отправки сигнала для {symbol}")
         bot = await get_bot(config['telegram_token'])
@@ -30,11 +41,12 @@ async def send_signal(symbol, df, info, config):
         else:
             icon, label = "⚪", "СИГНАЛ"
 
-        tradingview_url = f"https://www.tradingview.com/chart/?symbol=BYBIT:{symbol.replace('/', '').replace(':', '')}.P"
+        exchange, native = resolve(symbol)
+        tradingview_url = exchange.tradingview_url(native)
 
         html = (
             f"<b>{icon} {label}</b> | <b>{tf_change:.2f}% на момент сигнала</b>\n"
-            f"Монета: <code>{symbol}</code>\n"
+            f"Монета: <code>{coin(symbol)}</code> ({exchange.title})\n"
             f"Цена сейчас: <b>{last_close:.8f} USDT</b>\n"
             f"{count_str}\n"
             f"\nИндикаторы (подтверждение):\n"
@@ -55,27 +67,42 @@ async def send_signal(symbol, df, info, config):
             candle = "Hammer" if info.get('bullish_candle') else "Shooting Star" if info.get('bearish_candle') else "нет"
             html += f"• Свечной паттерн: <b>{candle}</b>\n"
         if "volume_pre_surge" in info:
-            html += f"• Рост объёма: <b>{'да' if info['volume_pre_surge'] else 'нет'}</b> (20-50%)\n"
+            html += f"• Рост объёма: <b>{'да' if info['volume_pre_surge'] else 'нет'}</b> ({RAMP_BARS} бара подряд, x{RAMP_RATIO} к {RAMP_BASE} барам)\n"
         if "ema_cross_up" in info or "ema_cross_down" in info:
             ema_cross = "бычий" if info.get('ema_cross_up') else "медвежий" if info.get('ema_cross_down') else "нет"
             html += f"• EMA Crossover: <b>{ema_cross}</b> (EMA12/EMA26)\n"
         if "obv_trend" in info:
-            obv = "растёт" if info['obv_trend'] > 0 else "падает" if info['obv_trend'] < 0 else "стабилен"
+            obv = "растёт" if info['obv_trend'] > OBV_SLOPE else "падает" if info['obv_trend'] < -OBV_SLOPE else "стабилен"
             html += f"• OBV: <b>{obv}</b> (объёмный тренд)\n"
         html += (
             f"\n{info['comment']}\n\n"
             f"<a href=\"{tradingview_url}\">Открыть график на TradingView</a>"
         )
 
-        chart_buf = create_chart(df, symbol, config['timeframe'])
+        backend = config.get('chart_backend', 'mplfinance')
+        if delivery.queue is not None:
+            chart = asyncio.create_task(render_chart(df, symbol, config['timeframe'], backend))
+            item = delivery.Delivery(symbol, config['chat_id'], html, chart, priority=count_triggered,
+                                     on_done=on_done)
+            queued = delivery.queue.put(item)
+            if queued:
+                log(f"[{symbol}] Сигнал в очереди: {label} | {tf_change:.2f}% | {last_close}. Детали: {info['debug']}")
+            return queued
+
+        chart_buf = await render_chart(df, symbol, config['timeframe'], backend)
         log(f"Отправка сообщения в чат {config['chat_id']}...")
-        if chart_buf is None:
-            log(f"График не создан для {symbol}", level="warning")
-            await bot.send_message(chat_id=config['chat_id'], text=html + "\n(График недоступен)", parse_mode="HTML")
-        else:
-            await bot.send_photo(chat_id=config['chat_id'], photo=chart_buf, caption=html, parse_mode="HTML")
+        with metrics.telegram_send_seconds.time():
+            if chart_buf is None:
+                log(f"График не создан для {symbol}", level="warning")
+                await bot.send_message(chat_id=config['chat_id'], text=html + "\n(График недоступен)", parse_mode="HTML")
+            else:
+                await bot.send_photo(chat_id=config['chat_id'], photo=chart_buf, caption=html, parse_mode="HTML")
         log(f"Сообщение успешно отправлено для {symbol}")
         log(f"[{symbol}] Сигнал отправлен: {label} | {tf_change:.2f}% | {last_close}. Детали: {info['debug']}")
+        if on_done is not None:
+            on_done(True)
+        return True
     except Exception as e:
         log(f"Ошибка отправки сигнала для {symbol}: {e}")
+        metrics.errors_total.inc(stage='telegram')
         raise
\ No newline at end of file
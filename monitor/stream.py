@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+import websockets
+from monitor.candles import TIMEFRAME_MS
+from monitor.exchanges import BYBIT, resolve
+from monitor.fetcher import candle_store, fetch_ohlcv
+from monitor.logger import log
+
+
+class KlineStream:
+    """
+    Потоковое получение свечей одной биржи через её публичные kline-каналы
+    (формат подписки и сообщений — в адаптере monitor.exchanges).
+    Символы делятся между несколькими соединениями; после (пере)подключения
+    пропущенные свечи догружаются через REST-фетчер, затем каждое обновление
+    свечи вливается в candle_store и передаётся в on_candle(symbol, confirmed).
+    """
+
+    def __init__(self, symbols, timeframe, on_candle, config=None, exchange=BYBIT, url=None):
+        config = config or {}
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.exchange = exchange
+        self.on_candle = on_candle
+        self.url = url or exchange.ws_url
+        self.limit = config.get('candle_history', 200)
+        self.per_connection = config.get('stream_symbols_per_connection', 100)
+        self.ping_interval = config.get('stream_ping_interval', 20)
+        self.max_reconnect_delay = config.get('stream_max_reconnect_delay', 60)
+        self.backfill_concurrency = config.get('stream_backfill_concurrency', 10)
+        self.trigger = config.get('stream_trigger', 'update')
+        self.min_interval = config.get('stream_min_interval', 1.0)
+        self._chunks = {}  # {номер соединения: символы}
+        self._tasks = {}  # {номер соединения: задача}
+        self._fills = set()  # Догрузки разрывов
+        self._handlers = {}
+        self._pending = {}
+        self._last_run = {}
+        self._gaps = set()
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._chunks = {idx: self.symbols[i:i + self.per_connection]
+                        for idx, i in enumerate(range(0, len(self.symbols), self.per_connection))}
+        for idx in self._chunks:
+            self._connect(idx)
+        log(f"Стрим свечей {self.exchange.title} {self.timeframe}: {len(self.symbols)} символов, "
+            f"{len(self._chunks)} соединений", level="INFO")
+
+    async def stop(self):
+        self._stopping = True
+        tasks = list(self._tasks.values()) + list(self._handlers.values()) + list(self._fills)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._chunks.clear()
+        self._fills.clear()
+        self._gaps.clear()
+        self._handlers.clear()
+        self._pending.clear()
+        log(f"Стрим свечей {self.exchange.title} остановлен", level="INFO")
+
+    def _connect(self, idx):
+        self._tasks[idx] = asyncio.create_task(self._run_connection(idx, self._chunks[idx]))
+
+    async def update_symbols(self, symbols):
+        """
+        Приводит подписки к новому списку символов. Переподключаются только соединения,
+        в которых список изменился: ушедшие символы удаляются из своих соединений, новые
+        занимают свободные места, остаток — в новые соединения.
+        """
+        symbols = list(symbols)
+        wanted = set(symbols)
+        if wanted == set(self.symbols):
+            return False
+        changed = set()
+        for idx, chunk in self._chunks.items():
+            kept = [s for s in chunk if s in wanted]
+            if len(kept) != len(chunk):
+                self._chunks[idx] = kept
+                changed.add(idx)
+        placed = {s for chunk in self._chunks.values() for s in chunk}
+        added = [s for s in symbols if s not in placed]
+        for idx, chunk in sorted(self._chunks.items()):
+            room = self.per_connection - len(chunk)
+            if added and room > 0:
+                self._chunks[idx] = chunk + added[:room]
+                added = added[room:]
+                changed.add(idx)
+        idx = max(self._chunks, default=-1) + 1
+        while added:
+            self._chunks[idx], added = added[:self.per_connection], added[self.per_connection:]
+            changed.add(idx)
+            idx += 1
+        self.symbols = symbols
+        for idx in sorted(changed):
+            task = self._tasks.pop(idx, None)
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            if self._chunks[idx]:
+                self._connect(idx)
+            else:
+                del self._chunks[idx]
+        log(f"Стрим свечей {self.exchange.title}: переподписано соединений {len(changed)} из {len(self._chunks)}",
+            level="INFO")
+        return True
+
+    async def _run_connection(self, idx, symbols):
+        delay = 1
+        while not self._stopping:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, close_timeout=5) as ws:
+                    await self._subscribe(ws, symbols)
+                    log(f"WS {self.exchange.title} #{idx}: подписка на {len(symbols)} символов", level="INFO")
+                    await self._backfill(symbols)
+                    delay = 1
+                    ping = self.exchange.ping_message()
+                    pinger = asyncio.create_task(self._ping(ws, ping)) if ping is not None else None
+                    try:
+                        async for raw in ws:
+                            self._handle_message(raw)
+                    finally:
+                        if pinger is not None:
+                            pinger.cancel()
+                log(f"WS {self.exchange.title} #{idx}: соединение закрыто сервером", level="WARNING")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log(f"WS {self.exchange.title} #{idx}: ошибка соединения: {e}", level="WARNING")
+            if self._stopping:
+                break
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _subscribe(self, ws, symbols):
+        for message in self.exchange.subscribe_messages([resolve(s)[1] for s in symbols], self.timeframe):
+            await ws.send(message)
+
+    async def _ping(self, ws, message):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send(message)
+
+    async def _backfill(self, symbols):
+        """Догружает историю через REST: полная загрузка при первом старте, иначе только разрыв"""
+        semaphore = asyncio.Semaphore(self.backfill_concurrency)
+
+        async def fill(symbol):
+            async with semaphore:
+                await fetch_ohlcv(symbol, self.timeframe, limit=self.limit, use_cache=True)
+
+        start = time.time()
+        await asyncio.gather(*(fill(s) for s in symbols), return_exceptions=True)
+        log(f"Догрузка {len(symbols)} символов через REST за {time.time() - start:.2f} сек", level="DEBUG")
+
+    async def _fill_gap(self, symbol):
+        try:
+            await self._backfill([symbol])
+        finally:
+            self._gaps.discard(symbol)
+
+    def _handle_message(self, raw):
+        parsed = self.exchange.parse_stream(raw)
+        if parsed is None:
+            return
+        native, candles = parsed
+        symbol = self.exchange.symbol(native)
+        buf = candle_store.get(symbol, self.timeframe)
+        if buf is None or not len(buf):
+            return  # История ещё не загружена, свеча придёт с догрузкой
+        step = TIMEFRAME_MS.get(self.timeframe, 60_000)
+        confirmed = False
+        for start, values, closed in candles:
+            if start > buf.last_timestamp + step:
+                if symbol not in self._gaps:
+                    log("Разрыв в потоке свечей %s, догрузка через REST", symbol, level="DEBUG")
+                    self._gaps.add(symbol)
+                    task = asyncio.create_task(self._fill_gap(symbol))
+                    self._fills.add(task)
+                    task.add_done_callback(self._fills.discard)
+                return
+            buf.merge([start], [values])
+            confirmed = confirmed or closed
+        self._dispatch(symbol, confirmed)
+
+    def _dispatch(self, symbol, confirmed):
+        """Запускает on_candle без наложения вызовов для одного символа"""
+        if self.trigger == 'close' and not confirmed:
+            return
+        if symbol in self._handlers:
+            self._pending[symbol] = self._pending.get(symbol, False) or confirmed
+            return
+        if not confirmed and time.monotonic() - self._last_run.get(symbol, 0) < self.min_interval:
+            return
+        self._handlers[symbol] = asyncio.create_task(self._run_handler(symbol, confirmed))
+
+    async def _run_handler(self, symbol, confirmed):
+        try:
+            while True:
+                self._last_run[symbol] = time.monotonic()
+                try:
+                    await self.on_candle(symbol, confirmed)
+                except Exception as e:
+                    log(f"Ошибка обработки потока {symbol}: {e}", level="ERROR")
+                if symbol not in self._pending:
+                    break
+                confirmed = self._pending.pop(symbol)
+        finally:
+            self._handlers.pop(symbol, None)